@@ -0,0 +1,76 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+import db
+
+ADMIN_STATS_SNAPSHOT = "admin_stats"
+
+
+class AdminStatsSnapshot:
+    """
+    Serves /admin_stats from a stored snapshot of the global counters and leaderboards.
+    The aggregate queries only run on refresh, concurrently.
+    """
+
+    def __init__(self, db_call: Callable, refresh_interval_seconds: float = 300.0, limit: int = 10):
+        self.db_call = db_call
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.limit = limit
+        self._snapshot: Optional[dict] = None
+        self._refresh_lock = asyncio.Lock()
+
+    def _is_fresh(self, snapshot: Optional[dict]) -> bool:
+        if not snapshot:
+            return False
+        age = time.time() - float(snapshot.get("computed_at") or 0)
+        return age < self.refresh_interval_seconds
+
+    async def refresh(self) -> dict:
+        async with self._refresh_lock:
+            if self._is_fresh(self._snapshot):
+                return self._snapshot
+            users_total, votes_total, top_voters, top_targets = await asyncio.gather(
+                self.db_call(db.count_users),
+                self.db_call(db.count_votes),
+                self.db_call(db.top_voters, self.limit),
+                self.db_call(db.top_targets, self.limit),
+            )
+            snapshot = {
+                "users_total": users_total,
+                "votes_total": votes_total,
+                "top_voters": [list(item) for item in top_voters],
+                "top_targets": [list(item) for item in top_targets],
+                "computed_at": time.time(),
+            }
+            await self.db_call(db.save_stats_snapshot, ADMIN_STATS_SNAPSHOT, snapshot)
+            self._snapshot = snapshot
+            return snapshot
+
+    async def get(self) -> dict:
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = await self.db_call(db.get_stats_snapshot, ADMIN_STATS_SNAPSHOT)
+            if snapshot is None:
+                return await self.refresh()
+            self._snapshot = snapshot
+        if not self._is_fresh(snapshot) and not self._refresh_lock.locked():
+            asyncio.create_task(self.refresh())
+        return snapshot
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as exc:
+                logging.warning("Admin stats refresh failed: %s", exc)
+            await asyncio.sleep(self.refresh_interval_seconds)
+
+
+def format_computed_at(snapshot: dict) -> str:
+    ts = float(snapshot.get("computed_at") or 0)
+    if ts <= 0:
+        return "неизвестно"
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
@@ -0,0 +1,308 @@
+"""
+Answer axes and the rules derived from them.
+
+Every feedback answer is one of two options on an axis. AXES is the single registry:
+vote columns, SQL aggregates, feedback normalization and the profile rules are all
+generated from it. Aggregated answers travel as a count vector with two slots per axis
+(left option, right option), in AXES order.
+"""
+
+from typing import Callable, Mapping, Optional, Sequence
+
+
+class Axis:
+    __slots__ = ("name", "left", "right", "default", "index")
+
+    def __init__(self, name: str, left: str, right: str, default: str, index: int):
+        self.name = name
+        self.left = left
+        self.right = right
+        self.default = default
+        self.index = index
+
+    @property
+    def options(self) -> tuple[str, str]:
+        return self.left, self.right
+
+    def normalize(self, value: object) -> str:
+        value = str(value or "")
+        return value if value in (self.left, self.right) else self.default
+
+
+# (name, left option, right option, default). Order is the votes column order; append new axes at the end,
+# db.init_db adds their columns on the next start.
+_AXIS_SPECS = (
+    ("tone", "easy", "serious", "serious"),
+    ("speed", "fast", "slow", "slow"),
+    ("contact_format", "text", "live", "text"),
+    ("caution", "true", "false", "false"),
+    ("initiative", "self", "wait", "wait"),
+    ("start_context", "topic", "direct", "topic"),
+    ("attention_reaction", "likes", "careful", "careful"),
+    ("frequency", "often", "rare", "rare"),
+    ("comm_format", "informal", "reserved", "reserved"),
+    ("emotion_tone", "warm", "neutral", "neutral"),
+    ("feedback_style", "direct", "soft", "soft"),
+    ("uncertainty", "low", "high", "high"),
+)
+AXES = tuple(Axis(name, left, right, default, index) for index, (name, left, right, default) in enumerate(_AXIS_SPECS))
+AXIS_BY_NAME = {axis.name: axis for axis in AXES}
+AXIS_NAMES = tuple(axis.name for axis in AXES)
+COUNT_VECTOR_SIZE = 2 * len(AXES)
+# votes.answers_mask is a BIGINT with one bit per count vector slot. The sign bit is always set:
+# it tells these masks from ones written before the slot layout (db.py rewrites those in the background).
+ANSWERS_MASK_BITS = 63
+ANSWERS_MASK_SLOTS = -(1 << ANSWERS_MASK_BITS)
+if COUNT_VECTOR_SIZE > ANSWERS_MASK_BITS:
+    raise ValueError(f"{len(AXES)} axes do not fit votes.answers_mask ({ANSWERS_MASK_BITS} bits)")
+
+
+def slot(ref: str) -> int:
+    """Count vector position of "axis.option"."""
+    name, _, option = ref.partition(".")
+    axis = AXIS_BY_NAME[name]
+    if option not in axis.options:
+        raise ValueError(f"{option!r} is not an option of axis {name!r}")
+    return 2 * axis.index + (0 if option == axis.left else 1)
+
+
+def normalize_answers(raw: Mapping[str, object]) -> dict[str, str]:
+    """Every axis present, unknown or missing values replaced by the axis default."""
+    return {axis.name: axis.normalize(raw.get(axis.name)) for axis in AXES}
+
+
+def answer_values(answers: Optional[Mapping[str, object]]) -> tuple[str, ...]:
+    """Normalized answers in column order, for SQL parameters."""
+    answers = answers or {}
+    return tuple(axis.normalize(answers.get(axis.name)) for axis in AXES)
+
+
+def encode_answers(values: Sequence[str]) -> int:
+    """
+    Pack answers (in AXES order) into the votes.answers_mask bitmask: bit k set = count vector
+    slot k was picked, plus the ANSWERS_MASK_SLOTS sign bit. A value that is neither option of
+    its axis sets no bit.
+    """
+    mask = ANSWERS_MASK_SLOTS
+    for axis, value in zip(AXES, values):
+        if value in axis.options:
+            mask |= 1 << (2 * axis.index + (0 if value == axis.left else 1))
+    return mask
+
+
+def decode_answers(mask: int) -> dict[str, str]:
+    """Answers packed in mask; axes without an answer are left out."""
+    return {
+        axis.name: option
+        for axis in AXES
+        for side, option in enumerate(axis.options)
+        if (mask >> (2 * axis.index + side)) & 1
+    }
+
+
+def mask_vector(mask: int) -> list[int]:
+    """Count vector of a single vote."""
+    return [(mask >> position) & 1 for position in range(COUNT_VECTOR_SIZE)]
+
+
+def counts_to_dimensions(counts: Sequence[int]) -> dict[str, dict[str, int]]:
+    return {axis.name: {axis.left: counts[2 * axis.index], axis.right: counts[2 * axis.index + 1]} for axis in AXES}
+
+
+class DerivedAxis:
+    """
+    Two opposed sums of count slots. The pick is first_pick when the first sum is at least the
+    second (ties go to the first side), so list the side that should win ties first.
+    """
+
+    __slots__ = ("name", "first", "second", "first_pick", "second_pick")
+
+    def __init__(self, name: str, first: tuple[str, ...], second: tuple[str, ...], first_pick: str, second_pick: str):
+        self.name = name
+        self.first = first
+        self.second = second
+        self.first_pick = first_pick
+        self.second_pick = second_pick
+
+
+DERIVED_AXES = (
+    DerivedAxis("tone", ("tone.easy",), ("tone.serious",), "easy", "serious"),
+    DerivedAxis("speed", ("speed.slow",), ("speed.fast",), "slow", "fast"),
+    DerivedAxis("format", ("contact_format.text",), ("contact_format.live",), "text", "live"),
+    DerivedAxis("tempo", ("speed.fast", "frequency.often"), ("speed.slow", "frequency.rare"), "fast", "slow"),
+    DerivedAxis("initiative", ("initiative.self", "caution.false"), ("initiative.wait", "caution.true"), "active", "wait"),
+    DerivedAxis(
+        "contact",
+        ("tone.easy", "contact_format.text", "attention_reaction.likes"),
+        ("tone.serious", "contact_format.live", "attention_reaction.careful"),
+        "talk",
+        "reserved",
+    ),
+    DerivedAxis("structure", ("start_context.topic",), ("start_context.direct",), "flexible", "specific"),
+)
+
+# A derived axis is split when neither side has at least this share of the votes.
+SPLIT_MAJORITY = 0.6
+
+# (hint, kind, arguments):
+#   share    - slot count / total answers >= threshold
+#   split    - the derived axis has no clear majority
+#   any_split - any of the derived axes has no clear majority
+#   second   - the second side of the derived axis strictly outweighs the first
+HINT_RULES = (
+    ("caution", "share", ("caution.true", 0.3)),
+    ("uncertain", "any_split", ("tone", "speed", "format")),
+    ("contact_split", "split", ("contact",)),
+    ("structure_split", "split", ("structure",)),
+    ("needs_specifics", "second", ("structure",)),
+)
+
+
+class Evaluation:
+    """Derived sums, picks and hint flags for one count vector."""
+
+    __slots__ = ("engine", "total", "sums", "picks", "hints")
+
+    def __init__(self, engine: "RulesEngine", total: int, sums: tuple, picks: tuple, hints: tuple):
+        self.engine = engine
+        self.total = total
+        self.sums = sums
+        self.picks = picks
+        self.hints = hints
+
+    def pick(self, name: str) -> str:
+        return self.picks[self.engine.derived_index[name]]
+
+    def sides(self, name: str) -> tuple[int, int]:
+        i = self.engine.derived_index[name]
+        return self.sums[2 * i], self.sums[2 * i + 1]
+
+    def hint(self, name: str) -> bool:
+        return self.hints[self.engine.hint_index[name]]
+
+
+def _is_split(first: int, second: int) -> bool:
+    total = first + second
+    return total > 0 and max(first, second) / total < SPLIT_MAJORITY
+
+
+def _is_split_many(np, first, second):
+    total = first + second
+    return (total > 0) & (np.maximum(first, second) / np.maximum(total, 1) < SPLIT_MAJORITY)
+
+
+class BulkEvaluation:
+    """Evaluation of many count vectors at once: every field is a NumPy array with one entry per row."""
+
+    __slots__ = ("engine", "np", "total", "sums", "first", "hints")
+
+    def __init__(self, engine: "RulesEngine", np, total, sums: tuple, first: tuple, hints: tuple):
+        self.engine = engine
+        self.np = np
+        self.total = total
+        self.sums = sums
+        self.first = first
+        self.hints = hints
+
+    def pick(self, name: str):
+        i = self.engine.derived_index[name]
+        item = self.engine.derived[i]
+        return self.np.where(self.first[i], item.first_pick, item.second_pick)
+
+    def sides(self, name: str):
+        i = self.engine.derived_index[name]
+        return self.sums[2 * i], self.sums[2 * i + 1]
+
+    def hint(self, name: str):
+        return self.hints[self.engine.hint_index[name]]
+
+
+class RulesEngine:
+    """
+    Compiles the derived axes and hint rules into one generated function over the count
+    vector: each sum, pick and hint is a single expression, evaluated in one pass with no
+    lookups by name and no intermediate containers. evaluate_many compiles the same rules
+    over NumPy columns, on first use.
+    """
+
+    def __init__(self, derived: Sequence[DerivedAxis] = DERIVED_AXES, hint_rules=HINT_RULES):
+        self.derived = tuple(derived)
+        self.derived_index = {item.name: i for i, item in enumerate(self.derived)}
+        self.hint_index = {name: i for i, (name, _, _) in enumerate(hint_rules)}
+        self.hint_rules = tuple(hint_rules)
+        self.source = self._generate(self.hint_rules)
+        self._evaluate = self._compile(self.source, {"_is_split": _is_split})
+        self._evaluate_many = None
+
+    def dependencies(self, derived: Sequence[str] = (), hints: Sequence[str] = ()) -> Optional[frozenset[int]]:
+        """
+        Count slots the given derived axes and hints read, or None when any of them also
+        reads the answer total (share hints), so no slot subset decides them.
+        """
+        slots: set[int] = set()
+        for name in derived:
+            item = self.derived[self.derived_index[name]]
+            slots.update(slot(ref) for ref in (*item.first, *item.second))
+        for name in hints:
+            _, kind, args = self.hint_rules[self.hint_index[name]]
+            if kind == "share":
+                return None
+            slots.update(self.dependencies(derived=args))
+        return frozenset(slots)
+
+    @staticmethod
+    def _compile(source: str, namespace: dict) -> Callable:
+        exec(compile(source, "<axes rules>", "exec"), namespace)
+        return namespace["evaluate"]
+
+    def _generate(self, hint_rules, vectorized: bool = False) -> str:
+        lines = ["def evaluate(c, total):"]
+        sums = []
+        picks = []
+        for i, item in enumerate(self.derived):
+            for side, refs in (("a", item.first), ("b", item.second)):
+                if vectorized:
+                    lines.append(f"    s{i}{side} = " + " + ".join(f"c[:, {slot(ref)}]" for ref in refs))
+                else:
+                    lines.append(f"    s{i}{side} = " + " + ".join(f"c[{slot(ref)}]" for ref in refs))
+                sums.append(f"s{i}{side}")
+            if vectorized:
+                # Vectorized picks are "first side wins" masks; BulkEvaluation.pick maps them to names.
+                picks.append(f"(s{i}a >= s{i}b)")
+            else:
+                picks.append(f"({item.first_pick!r} if s{i}a >= s{i}b else {item.second_pick!r})")
+        hints = []
+        for name, kind, args in hint_rules:
+            if kind == "share":
+                if vectorized:
+                    hints.append(f"((total > 0) & (c[:, {slot(args[0])}] / np.maximum(total, 1) >= {float(args[1])!r}))")
+                else:
+                    hints.append(f"(total > 0 and c[{slot(args[0])}] / total >= {float(args[1])!r})")
+            elif kind == "second":
+                i = self.derived_index[args[0]]
+                hints.append(f"(s{i}b > s{i}a)")
+            elif kind in ("split", "any_split"):
+                call = "_is_split_many(np, " if vectorized else "_is_split("
+                terms = [f"{call}s{self.derived_index[item]}a, s{self.derived_index[item]}b)" for item in args]
+                hints.append("(" + (" | " if vectorized else " or ").join(terms) + ")")
+            else:
+                raise ValueError(f"unknown hint kind {kind!r} for {name!r}")
+        lines.append(f"    return ({', '.join(sums)},), ({', '.join(picks)},), ({', '.join(hints)},)")
+        return "\n".join(lines) + "\n"
+
+    def evaluate(self, counts: Sequence[int], total: int) -> Evaluation:
+        sums, picks, hints = self._evaluate(counts, total)
+        return Evaluation(self, total, sums, picks, hints)
+
+    def evaluate_many(self, counts, totals) -> BulkEvaluation:
+        """counts: int array of shape (rows, COUNT_VECTOR_SIZE); totals: int array of shape (rows,). Needs NumPy."""
+        import numpy as np
+
+        if self._evaluate_many is None:
+            source = self._generate(self.hint_rules, vectorized=True)
+            self._evaluate_many = self._compile(source, {"np": np, "_is_split_many": _is_split_many})
+        sums, first, hints = self._evaluate_many(counts, totals)
+        return BulkEvaluation(self, np, totals, sums, first, hints)
+
+
+RULES = RulesEngine()
@@ -0,0 +1,466 @@
+"""
+Cache backends for the web tier.
+
+LocalCache is an in-process LRU with a TTL per entry. RespCache keeps entries on a shared
+server speaking the Redis protocol (RESP), so every process and node sees the same entries;
+it fronts the server with a short-lived near cache that is dropped on invalidation messages
+from any process. create_cache picks one from a URL (CACHE_URL).
+
+Values are JSON-serializable objects. A cache never raises: an unreachable server reads as
+a miss and writes to it are dropped.
+"""
+
+import json
+import logging
+import queue
+import socket
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, Optional, TypeVar
+from urllib.parse import urlsplit
+
+LOCAL_CACHE_SIZE = 10000
+INVALIDATE_CHANNEL = "cache:invalidate"
+T = TypeVar("T")
+
+
+class CacheBackend(ABC):
+    """get/set/delete plus pub/sub; hits and misses count get() results."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[object]: ...
+
+    @abstractmethod
+    def set(self, key: str, value: object, ttl_seconds: float) -> None: ...
+
+    @abstractmethod
+    def delete(self, *keys: str) -> None: ...
+
+    @abstractmethod
+    def publish(self, channel: str, message: str) -> None: ...
+
+    @abstractmethod
+    def subscribe(self, channel: str, callback: Callable[[str], None]) -> None: ...
+
+    def invalidate(self, *keys: str) -> None:
+        """Delete keys and tell every process sharing the backend to drop its copies."""
+        if not keys:
+            return
+        self.delete(*keys)
+        self.publish(INVALIDATE_CHANNEL, json.dumps(list(keys)))
+
+
+class LocalCache(CacheBackend):
+    def __init__(self, max_entries: int = LOCAL_CACHE_SIZE):
+        super().__init__()
+        self.max_entries = max_entries
+        # key -> (value, monotonic expiry), least recently used first.
+        self._items: OrderedDict[str, tuple[object, float]] = OrderedDict()
+        self._subscribers: dict[str, list[Callable[[str], None]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[object]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[1] <= time.monotonic():
+                if item is not None:
+                    del self._items[key]
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key: str, value: object, ttl_seconds: float) -> None:
+        with self._lock:
+            self._items[key] = (value, time.monotonic() + ttl_seconds)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._items.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def publish(self, channel: str, message: str) -> None:
+        for callback in list(self._subscribers.get(channel, ())):
+            try:
+                callback(message)
+            except Exception:
+                logging.exception("cache subscriber failed on %s", channel)
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]) -> None:
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(callback)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class RespError(Exception):
+    pass
+
+
+def _encode_command(args) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+def _read_reply(rfile):
+    line = rfile.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("cache server closed the connection")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest.decode("utf-8")
+    if kind == b"-":
+        raise RespError(rest.decode("utf-8", "replace"))
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        size = int(rest)
+        if size < 0:
+            return None
+        data = rfile.read(size + 2)
+        if len(data) != size + 2:
+            raise ConnectionError("cache server closed the connection")
+        return data[:-2]
+    if kind == b"*":
+        size = int(rest)
+        if size < 0:
+            return None
+        return [_read_reply(rfile) for _ in range(size)]
+    raise ConnectionError(f"unexpected cache server reply {line[:40]!r}")
+
+
+class _RespConnection:
+    def __init__(self, host: str, port: int, timeout: Optional[float], password: Optional[str], db: int):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.rfile = self.sock.makefile("rb")
+        if password:
+            self.call("AUTH", password)
+        if db:
+            self.call("SELECT", db)
+
+    def send(self, *args) -> None:
+        self.sock.sendall(_encode_command(args))
+
+    def read(self):
+        return _read_reply(self.rfile)
+
+    def call(self, *args):
+        self.send(*args)
+        return self.read()
+
+    def close(self) -> None:
+        try:
+            self.rfile.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class _RespSubscriber:
+    """
+    One pub/sub connection and listener thread per cache server, shared by every RespCache
+    on it. on_reconnect callbacks run whenever the subscription drops or is re-established:
+    messages published in between are lost.
+    """
+
+    def __init__(self, host: str, port: int, password: Optional[str], timeout_seconds: float, retry_seconds: float):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.timeout_seconds = timeout_seconds
+        self.retry_seconds = retry_seconds
+        self._lock = threading.Lock()
+        self._callbacks: dict[str, list[Callable[[str], None]]] = {}
+        self._on_reconnect: list[Callable[[], None]] = []
+        self._thread: Optional[threading.Thread] = None
+        self._conn: Optional[_RespConnection] = None
+
+    def on_reconnect(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            self._on_reconnect.append(callback)
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]) -> None:
+        with self._lock:
+            new_channel = channel not in self._callbacks
+            self._callbacks.setdefault(channel, []).append(callback)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._listen, name="cache-subscriber", daemon=True)
+                self._thread.start()
+            elif new_channel and self._conn is not None:
+                try:
+                    self._conn.send("SUBSCRIBE", channel)
+                except OSError:
+                    pass
+
+    def _reconnected(self) -> None:
+        for callback in list(self._on_reconnect):
+            callback()
+
+    def _listen(self) -> None:
+        while True:
+            try:
+                conn = _RespConnection(self.host, self.port, self.timeout_seconds, self.password, 0)
+                conn.sock.settimeout(None)
+                with self._lock:
+                    # Whatever was published while disconnected is lost; start from clean near caches.
+                    self._reconnected()
+                    conn.send("SUBSCRIBE", *self._callbacks)
+                    self._conn = conn
+                while True:
+                    reply = conn.read()
+                    if not isinstance(reply, list) or len(reply) != 3 or reply[0] != b"message":
+                        continue
+                    channel = reply[1].decode("utf-8")
+                    message = reply[2].decode("utf-8")
+                    for callback in list(self._callbacks.get(channel, ())):
+                        try:
+                            callback(message)
+                        except Exception:
+                            logging.exception("cache subscriber failed on %s", channel)
+            except (OSError, ConnectionError, RespError) as exc:
+                logging.warning("Cache subscription to %s:%s lost: %s", self.host, self.port, exc)
+            with self._lock:
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+                self._reconnected()
+            time.sleep(self.retry_seconds)
+
+
+# Pub/sub channels are server-wide, not per db: every RespCache on a server shares one subscriber.
+_subscribers: dict[tuple, _RespSubscriber] = {}
+_subscribers_lock = threading.Lock()
+
+
+def _shared_subscriber(
+    host: str, port: int, password: Optional[str], timeout_seconds: float, retry_seconds: float
+) -> _RespSubscriber:
+    with _subscribers_lock:
+        subscriber = _subscribers.get((host, port, password))
+        if subscriber is None:
+            subscriber = _RespSubscriber(host, port, password, timeout_seconds, retry_seconds)
+            _subscribers[(host, port, password)] = subscriber
+        return subscriber
+
+
+class RespCache(CacheBackend):
+    """
+    Shared cache on a Redis-protocol server. Entries read from the server are kept in a local
+    near cache for near_ttl_seconds, so hot keys cost no round trip; invalidations published
+    by any process drop them everywhere, and the TTL bounds staleness if a message is missed.
+    After a connection error the server is skipped for retry_seconds.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int = 6379,
+        db: int = 0,
+        password: Optional[str] = None,
+        timeout_seconds: float = 0.5,
+        retry_seconds: float = 5.0,
+        near_ttl_seconds: float = 2.0,
+        near_entries: int = LOCAL_CACHE_SIZE,
+        pool_size: int = 16,
+    ):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout_seconds = timeout_seconds
+        self.retry_seconds = retry_seconds
+        self.near_ttl_seconds = near_ttl_seconds
+        self.near = LocalCache(near_entries)
+        self.errors = 0
+        self.invalidations = 0
+        self._pool: queue.LifoQueue = queue.LifoQueue(pool_size)
+        self._down_until = 0.0
+        self._subscriber = _shared_subscriber(host, port, password, timeout_seconds, retry_seconds)
+        self._subscriber.on_reconnect(self.near.clear)
+        self.subscribe(INVALIDATE_CHANNEL, self._drop_near)
+
+    def _connect(self, timeout: Optional[float]) -> _RespConnection:
+        return _RespConnection(self.host, self.port, timeout, self.password, self.db)
+
+    def _call(self, *args):
+        if self._down_until > time.monotonic():
+            return None
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = None
+        try:
+            if conn is None:
+                conn = self._connect(self.timeout_seconds)
+            reply = conn.call(*args)
+        except RespError as exc:
+            self.errors += 1
+            logging.warning("Cache %s failed: %s", args[0], exc)
+            reply = None
+        except (OSError, ConnectionError) as exc:
+            self.errors += 1
+            if conn is not None:
+                conn.close()
+            self._down_until = time.monotonic() + self.retry_seconds
+            logging.warning("Cache server %s:%s skipped for %.0fs: %s", self.host, self.port, self.retry_seconds, exc)
+            return None
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+        return reply
+
+    def get(self, key: str) -> Optional[object]:
+        value = self.near.get(key)
+        if value is None:
+            raw = self._call("GET", key)
+            if raw is not None:
+                try:
+                    value = json.loads(raw)
+                except ValueError:
+                    value = None
+            if value is not None:
+                self.near.set(key, value, self.near_ttl_seconds)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: object, ttl_seconds: float) -> None:
+        self.near.set(key, value, min(ttl_seconds, self.near_ttl_seconds))
+        self._call("SET", key, json.dumps(value, ensure_ascii=False), "PX", max(1, int(ttl_seconds * 1000)))
+
+    def delete(self, *keys: str) -> None:
+        if keys:
+            self.near.delete(*keys)
+            self._call("DEL", *keys)
+
+    def publish(self, channel: str, message: str) -> None:
+        self._call("PUBLISH", channel, message)
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]) -> None:
+        self._subscriber.subscribe(channel, callback)
+
+    def _drop_near(self, message: str) -> None:
+        try:
+            keys = json.loads(message)
+        except ValueError:
+            return
+        self.invalidations += 1
+        self.near.delete(*(str(key) for key in keys))
+
+
+def create_cache(url: str = "", max_entries: int = LOCAL_CACHE_SIZE) -> CacheBackend:
+    """LocalCache when url is empty, RespCache for redis://[:password@]host[:port][/db]."""
+    if not url:
+        return LocalCache(max_entries)
+    parts = urlsplit(url)
+    if parts.scheme not in ("redis", "resp"):
+        raise ValueError(f"unsupported cache url scheme {parts.scheme!r}")
+    path = parts.path.lstrip("/")
+    return RespCache(
+        parts.hostname or "127.0.0.1",
+        parts.port or 6379,
+        db=int(path) if path else 0,
+        password=parts.password,
+        near_entries=max_entries,
+    )
+
+
+class PayloadCache:
+    """
+    Rendered API payloads in a CacheBackend. A payload younger than fresh_seconds is served
+    as is, older ones are rebuilt. While available() is False the build is skipped and the
+    last payload (kept keep_seconds) is served with "stale": True. db functions return
+    defaults instead of raising, so a build that raised or during which failure_count() (the
+    calling thread's failures, see db.failures_in_context) moved is neither served nor cached.
+    """
+
+    def __init__(
+        self,
+        backend: CacheBackend,
+        available: Callable[[], bool],
+        failure_count: Callable[[], int],
+        fresh_seconds: float = 60.0,
+        keep_seconds: float = 86400.0,
+    ):
+        self.backend = backend
+        self.available = available
+        self.failure_count = failure_count
+        self.fresh_seconds = fresh_seconds
+        self.keep_seconds = keep_seconds
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def _build(self, build: Callable[[], T]) -> Optional[T]:
+        """build(), or None when one of its db calls fell back to defaults."""
+        failures = self.failure_count()
+        result = build()
+        return result if self.failure_count() == failures else None
+
+    def serve(self, key: str, build: Callable[[], dict]) -> Optional[dict]:
+        """Cached or fresh payload, else the cached one marked stale, else None."""
+        entry = self.backend.get(key)
+        if self.available():
+            # Wall-clock age: entries are shared between processes.
+            if entry is not None and time.time() - entry["at"] < self.fresh_seconds:
+                self.hits += 1
+                return entry["payload"]
+            self.misses += 1
+            try:
+                payload = self._build(build)
+            except Exception:
+                logging.exception("Building payload %s failed", key)
+                payload = None
+            if payload is not None:
+                self.put(key, payload)
+                return payload
+        if entry is None:
+            return None
+        self.stale += 1
+        return {**entry["payload"], "stale": True}
+
+    def prefill(self, key: str, build: Callable[[], dict[str, dict]]) -> bool:
+        """
+        Refresh ahead of viewers: unless key was cached less than fresh_seconds / 2 ago, run
+        build() and cache every payload it returns (cache key -> payload). True if it did.
+        """
+        entry = self.backend.get(key)
+        if entry is not None and time.time() - entry["at"] < self.fresh_seconds / 2:
+            return False
+        if not self.available():
+            return False
+        payloads = self._build(build)
+        if payloads is None:
+            return False
+        for payload_key, payload in payloads.items():
+            self.put(payload_key, payload)
+        return True
+
+    def put(self, key: str, payload: dict) -> None:
+        self.backend.set(key, {"at": time.time(), "payload": payload}, self.keep_seconds)
+
+    def invalidate(self, *keys: str) -> None:
+        self.backend.invalidate(*keys)
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Optional
+
+
+class BatchWorker:
+    """
+    Repeatedly runs a bounded db step in a worker thread.
+    The step returns a progress dict (with "rows") or None when there is nothing to do;
+    a progress dict with "failed" set means the batch did not run and is retried after
+    idle_seconds, so only None or "done" ends an until_done job.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        db_call: Callable,
+        step: Callable[[], Optional[dict]],
+        batch_pause_seconds: float = 0.05,
+        idle_seconds: float = 5.0,
+        until_done: bool = False,
+    ):
+        self.name = name
+        self.db_call = db_call
+        self.step = step
+        self.batch_pause_seconds = batch_pause_seconds
+        self.idle_seconds = idle_seconds
+        self.until_done = until_done
+        self.finished = False
+        self.cancelled = False
+        self._task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.rows = 0
+        self.last_progress: Optional[dict] = None
+        self.last_run_at: Optional[float] = None
+
+    def status(self) -> dict:
+        return {
+            "name": self.name,
+            "batches": self.batches,
+            "rows": self.rows,
+            "last_progress": self.last_progress,
+            "last_run_at": self.last_run_at,
+            "finished": self.finished,
+            "running": self.running,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> bool:
+        if self.running:
+            resumed = self.cancelled
+            self.cancelled = False
+            return resumed
+        self.cancelled = False
+        self.finished = False
+        self._task = asyncio.create_task(self.run())
+        return True
+
+    def cancel(self) -> bool:
+        """Stop after the batch in flight; the step's own state lets a later start resume."""
+        if not self.running:
+            return False
+        self.cancelled = True
+        return True
+
+    async def run_once(self) -> Optional[dict]:
+        progress = await self.db_call(self.step)
+        self.last_run_at = time.time()
+        if progress:
+            if not progress.get("failed"):
+                self.batches += 1
+                self.rows += int(progress.get("rows") or 0)
+            self.last_progress = progress
+        return progress
+
+    async def run(self) -> None:
+        while not self.cancelled:
+            try:
+                progress = await self.run_once()
+            except Exception as exc:
+                logging.warning("Background job %s failed: %s", self.name, exc)
+                await asyncio.sleep(self.idle_seconds)
+                continue
+            if progress is not None and progress.get("failed"):
+                await asyncio.sleep(self.idle_seconds)
+                continue
+            if self.until_done and (progress is None or progress.get("done")):
+                self.finished = True
+                return
+            await asyncio.sleep(self.batch_pause_seconds if progress else self.idle_seconds)
@@ -0,0 +1,243 @@
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: Optional[tuple[str, str]] = None) -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(f'{extra[0]}="{_escape(extra[1])}"')
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._values: dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        key = tuple(str(label) for label in labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(tuple(str(label) for label in labels), 0.0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # labels -> (per-bucket counts, sum, count)
+        self._values: dict[LabelValues, tuple[list[int], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        key = tuple(str(label) for label in labels)
+        with self._lock:
+            counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value, count + 1)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, (list(c), s, n)) for key, (c, s, n) in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ("le", _format_number(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key, ("le", "+Inf"))
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            plain = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{plain} {_format_number(total)}")
+            lines.append(f"{self.name}_count{plain} {count}")
+        return lines
+
+
+class CallbackMetric:
+    """Gauge or counter whose samples are read from a callback at scrape time."""
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: tuple[str, ...],
+        collect: Callable[[], Iterable[tuple[LabelValues, float]]],
+        metric_type: str = "gauge",
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.collect = collect
+        self.metric_type = metric_type
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.metric_type}"]
+        for key, value in self.collect():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}")
+        return lines
+
+
+class InFlight:
+    """Thread-safe in-flight counter, used as a context manager around the tracked work."""
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self) -> None:
+        with self._lock:
+            self.value += 1
+
+    def dec(self) -> None:
+        with self._lock:
+            self.value -= 1
+
+    def __enter__(self) -> "InFlight":
+        self.inc()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.dec()
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list = []
+        self._caches: dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def register_cache(self, name: str, cache: object) -> None:
+        """cache must expose integer hits and misses attributes."""
+        with self._lock:
+            self._caches[name] = cache
+
+    def cache_samples(self) -> list[tuple[LabelValues, float]]:
+        samples: list[tuple[LabelValues, float]] = []
+        with self._lock:
+            caches = list(self._caches.items())
+        for name, cache in caches:
+            samples.append(((name, "hit"), float(getattr(cache, "hits", 0))))
+            samples.append(((name, "miss"), float(getattr(cache, "misses", 0))))
+        return samples
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines: list[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(
+    Counter("http_requests_total", "HTTP requests by route, method and status.", ("route", "method", "status"))
+)
+HTTP_LATENCY = REGISTRY.register(
+    Histogram("http_request_duration_seconds", "HTTP request latency by route.", ("route",))
+)
+DB_CALLS = REGISTRY.register(
+    Counter("db_calls_total", "db module function calls by function and outcome.", ("function", "outcome"))
+)
+DB_LATENCY = REGISTRY.register(
+    Histogram("db_call_duration_seconds", "db module function wall time.", ("function",))
+)
+TELEGRAM_CALLS = REGISTRY.register(
+    Counter("telegram_requests_total", "Bot API requests by method and outcome.", ("method", "outcome"))
+)
+TELEGRAM_LATENCY = REGISTRY.register(
+    Histogram("telegram_request_duration_seconds", "Bot API request latency by method.", ("method",))
+)
+DB_QUERIES = REGISTRY.register(
+    Counter("db_queries_total", "SQL statements executed by calling db function.", ("function",))
+)
+DB_QUERY_LATENCY = REGISTRY.register(
+    Histogram("db_query_duration_seconds", "SQL statement wall time by calling db function.", ("function",))
+)
+PUSH_SENDS = REGISTRY.register(
+    Counter("push_sends_total", "Push notifications by event type and outcome.", ("event_type", "outcome"))
+)
+REGISTRY.register(
+    CallbackMetric(
+        "cache_requests_total",
+        "Cache lookups by cache and result.",
+        ("cache", "result"),
+        REGISTRY.cache_samples,
+        metric_type="counter",
+    )
+)
+
+
+def observe_db_call(function: str, seconds: float, ok: bool) -> None:
+    DB_CALLS.inc(function, "ok" if ok else "error")
+    DB_LATENCY.observe(seconds, function)
+
+
+def observe_db_query(record: dict) -> None:
+    DB_QUERIES.inc(record["function"])
+    DB_QUERY_LATENCY.observe(record["seconds"], record["function"])
+
+
+class TelegramMetricsMiddleware:
+    """aiogram request middleware recording Bot API latency and errors per method."""
+
+    async def __call__(self, make_request, bot, method):
+        name = getattr(method, "__api_method__", type(method).__name__)
+        started = time.perf_counter()
+        try:
+            response = await make_request(bot, method)
+        except Exception:
+            TELEGRAM_CALLS.inc(name, "error")
+            TELEGRAM_LATENCY.observe(time.perf_counter() - started, name)
+            raise
+        TELEGRAM_CALLS.inc(name, "ok")
+        TELEGRAM_LATENCY.observe(time.perf_counter() - started, name)
+        return response
@@ -2,8 +2,11 @@ import re
 from typing import Optional
 
 import db
+from app.axes import RULES, answer_values, encode_answers, mask_vector
 
 USERNAME_RE = re.compile(r"^@([A-Za-z0-9_]{3,32})$")
+# Answers a profile needs before recommendations are shown.
+ENOUGH_ANSWERS = 3
 
 
 def normalize_username(raw: str) -> Optional[str]:
@@ -14,190 +17,157 @@ def normalize_username(raw: str) -> Optional[str]:
     return f"@{m.group(1).lower()}"
 
 
-def pick_recommendation(dimensions: dict[str, dict[str, int]]) -> tuple[str, str, str]:
-    tone_counts = dimensions.get("tone", {})
-    speed_counts = dimensions.get("speed", {})
-    format_counts = dimensions.get("contact_format", {})
-
-    tone_pick = "easy" if tone_counts.get("easy", 0) >= tone_counts.get("serious", 0) else "serious"
-    speed_pick = "slow" if speed_counts.get("slow", 0) >= speed_counts.get("fast", 0) else "fast"
-    format_pick = "text" if format_counts.get("text", 0) >= format_counts.get("live", 0) else "live"
-    return tone_pick, speed_pick, format_pick
-
-
-def normalize_feedback_value(value: str, allowed: set[str], default: str) -> str:
-    return value if value in allowed else default
-
-
-def _axis_pick(left: int, right: int, left_key: str, right_key: str) -> str:
-    return left_key if left >= right else right_key
-
+# Derived axis -> row title and text for each pick.
+RESULT_ROWS = (
+    ("Темп", "tempo", {"fast": "Можно писать сразу и чаще", "slow": "Лучше не спеша и без частых сообщений"}),
+    ("Инициатива", "initiative", {"active": "Нормально, если инициативу проявляют", "wait": "Лучше аккуратно и без давления"}),
+    ("Контакт", "contact", {"talk": "Легче начать с шутки и переписки", "reserved": "Лучше спокойно, по делу и уважительно"}),
+)
+INSIGHT_LINES = (
+    ("tone", {"easy": "С юмора", "serious": "Спокойно, по делу"}),
+    ("speed", {"slow": "Не торопясь", "fast": "Сразу"}),
+    ("format", {"text": "Через переписку", "live": "В живом общении"}),
+)
+
+
+class EvaluatedProfile:
+    """
+    Rules evaluated once over a profile's aggregate counts (db.get_profile_counts).
+    Both the Mini App payload and the insight text are rendered from it.
+    """
+
+    def __init__(self, target: str, counts: dict):
+        self.target = target
+        self.target_user_id = counts["target_user_id"]
+        self.total = counts["total"]
+        self.visitors = counts["visitors"]
+        self.viewers = counts["viewers"]
+        self.counts = counts["counts"]
+        self.enough = self.total >= ENOUGH_ANSWERS
+        self.evaluation = RULES.evaluate(self.counts, self.total)
+
+    def payload(self) -> dict:
+        evaluation = self.evaluation
+        # Unique Mini App viewers (estimated); people who answered elsewhere saw the profile too.
+        viewed = max(self.viewers, self.total)
+        result = {
+            "target": self.target,
+            "viewed": viewed,
+            "answers": self.total,
+            "visitors": self.visitors,
+            "silent": viewed - self.total,
+            "enough": self.enough,
+            "recommendation": None,
+            "caution_block": False,
+            "uncertain_block": False,
+            "result_rows": [],
+            "extra_hint": "",
+            "adaptive_questions": {
+                "ask_tone_question": evaluation.hint("contact_split"),
+                "ask_uncertainty_question": evaluation.hint("structure_split"),
+            },
+        }
+        if not self.enough:
+            return result
+
+        result["recommendation"] = {
+            "tone": evaluation.pick("tone"),
+            "speed": evaluation.pick("speed"),
+            "format": evaluation.pick("format"),
+        }
+        result["caution_block"] = evaluation.hint("caution")
+        result["uncertain_block"] = evaluation.hint("uncertain")
+        result["result_rows"] = [
+            {"title": title, "value": texts[evaluation.pick(derived)]} for title, derived, texts in RESULT_ROWS
+        ]
+        result["extra_hint"] = self.extra_hint()
+        return result
 
-def _axis_is_uncertain(left: int, right: int) -> bool:
-    total = left + right
-    return total > 0 and (max(left, right) / total) < 0.6
+    def extra_hint(self) -> str:
+        if self.evaluation.hint("needs_specifics"):
+            return "Лучше конкретнее"
+        if self.evaluation.hint("contact_split"):
+            return "Человеку может понадобиться время на ответ"
+        return ""
+
+    def result_key(self) -> tuple:
+        """What the payload's result_rows and extra_hint are rendered from."""
+        if not self.enough:
+            return ()
+        return tuple(self.evaluation.pick(derived) for _, derived, _ in RESULT_ROWS), self.extra_hint()
+
+    def insight_text(self) -> Optional[str]:
+        if not self.enough:
+            return None
+        evaluation = self.evaluation
+        lines = [
+            "Как с этим человеком чаще всего",
+            "начинают общение:",
+            "",
+        ]
+        lines += [f"👉 {texts[evaluation.pick(derived)]}" for derived, texts in INSIGHT_LINES]
+        if evaluation.hint("uncertain"):
+            lines += [
+                "",
+                "По этому пункту мнения разделились —",
+                "лучше ориентироваться по ситуации.",
+            ]
+        if evaluation.hint("caution"):
+            lines += [
+                "",
+                "⚠️ Иногда лучше не давить",
+                "и дать время.",
+            ]
+        return "\n".join(lines)
+
+    def insight(self) -> dict:
+        text = self.insight_text()
+        if not text:
+            return {"enough": False}
+        return {"enough": True, "text": text}
+
+
+# Slots the result key reads; None would mean it also depends on the answer total.
+RESULT_SLOTS = RULES.dependencies(
+    derived=[derived for _, derived, _ in RESULT_ROWS],
+    hints=("needs_specifics", "contact_split"),
+)
+
+
+def counts_before_vote(after: dict, answers: dict, previous_mask: Optional[int]) -> dict:
+    """
+    Profile counts (as db.get_profile_counts) with one feedback vote undone: its answers
+    removed and, for an updated vote, the answers it replaced (previous_mask) restored.
+    """
+    delta = mask_vector(encode_answers(answer_values(answers)))
+    counts = [count - change for count, change in zip(after["counts"], delta)]
+    total = after["total"]
+    if previous_mask is None:
+        total -= 1
+    else:
+        counts = [count + change for count, change in zip(counts, mask_vector(previous_mask))]
+    return {**after, "total": total, "counts": counts}
+
+
+def result_changed(target: str, before: dict, after: dict) -> bool:
+    """Whether result_rows or extra_hint differ between two count snapshots of one profile."""
+    before_enough = before["total"] >= ENOUGH_ANSWERS
+    if before_enough != (after["total"] >= ENOUGH_ANSWERS):
+        return True
+    if not before_enough:
+        return False
+    if RESULT_SLOTS is not None and all(before["counts"][i] == after["counts"][i] for i in RESULT_SLOTS):
+        return False
+    return EvaluatedProfile(target, before).result_key() != EvaluatedProfile(target, after).result_key()
+
+
+def evaluate_profile(target: str) -> EvaluatedProfile:
+    return EvaluatedProfile(target, db.get_profile_counts(target))
 
 
 def build_profile_payload(target: str) -> dict:
-    target_user_id = db.get_user_id_by_username(target)
-    total = db.get_total(target, target_user_id)
-    ref_count = db.count_ref_visitors(target, target_user_id)
-    dimensions = db.get_contact_dimensions(target, target_user_id)
-    combined = total + ref_count
-    viewed = int(combined * 1.4)
-    silent = max(0, viewed - total)
-    result = {
-        "target": target,
-        "viewed": viewed,
-        "answers": total,
-        "visitors": ref_count,
-        "silent": silent,
-        "enough": total >= 3,
-        "recommendation": None,
-        "caution_block": False,
-        "uncertain_block": False,
-        "result_rows": [],
-        "extra_hint": "",
-        "adaptive_questions": {
-            "ask_tone_question": False,
-            "ask_uncertainty_question": False,
-        },
-    }
-    contact_left = (
-        dimensions["tone"]["easy"]
-        + dimensions["contact_format"]["text"]
-        + dimensions["attention_reaction"]["likes"]
-    )
-    contact_right = (
-        dimensions["tone"]["serious"]
-        + dimensions["contact_format"]["live"]
-        + dimensions["attention_reaction"]["careful"]
-    )
-    structure_left = dimensions["start_context"]["topic"]
-    structure_right = dimensions["start_context"]["direct"]
-    result["adaptive_questions"] = {
-        "ask_tone_question": _axis_is_uncertain(contact_left, contact_right),
-        "ask_uncertainty_question": _axis_is_uncertain(structure_left, structure_right),
-    }
-    if total < 3:
-        return result
-
-    tone_pick, speed_pick, format_pick = pick_recommendation(dimensions)
-    result["recommendation"] = {
-        "tone": tone_pick,
-        "speed": speed_pick,
-        "format": format_pick,
-    }
-    caution_counts = dimensions["caution"]
-    result["caution_block"] = (caution_counts["true"] / total) >= 0.3 if total > 0 else False
-
-    def is_uncertain(a: int, b: int) -> bool:
-        s = a + b
-        return s > 0 and max(a, b) / s < 0.6
-
-    tone_counts = dimensions["tone"]
-    speed_counts = dimensions["speed"]
-    format_counts = dimensions["contact_format"]
-    result["uncertain_block"] = (
-        is_uncertain(tone_counts["easy"], tone_counts["serious"])
-        or is_uncertain(speed_counts["fast"], speed_counts["slow"])
-        or is_uncertain(format_counts["text"], format_counts["live"])
-    )
-
-    tempo_fast = dimensions["speed"]["fast"] + dimensions["frequency"]["often"]
-    tempo_slow = dimensions["speed"]["slow"] + dimensions["frequency"]["rare"]
-    initiative_active = dimensions["initiative"]["self"] + dimensions["caution"]["false"]
-    initiative_wait = dimensions["initiative"]["wait"] + dimensions["caution"]["true"]
-    contact_talk = (
-        dimensions["tone"]["easy"]
-        + dimensions["contact_format"]["text"]
-        + dimensions["attention_reaction"]["likes"]
-    )
-    contact_reserved = (
-        dimensions["tone"]["serious"]
-        + dimensions["contact_format"]["live"]
-        + dimensions["attention_reaction"]["careful"]
-    )
-    structure_flexible = dimensions["start_context"]["topic"]
-    structure_specific = dimensions["start_context"]["direct"]
-
-    tempo_pick = _axis_pick(tempo_fast, tempo_slow, "fast", "slow")
-    initiative_pick = _axis_pick(initiative_active, initiative_wait, "active", "wait")
-    contact_pick = _axis_pick(contact_talk, contact_reserved, "talk", "reserved")
-
-    result["result_rows"] = [
-        {
-            "title": "Темп",
-            "value": "Можно писать сразу и чаще" if tempo_pick == "fast" else "Лучше не спеша и без частых сообщений",
-        },
-        {
-            "title": "Инициатива",
-            "value": "Нормально, если инициативу проявляют" if initiative_pick == "active" else "Лучше аккуратно и без давления",
-        },
-        {
-            "title": "Контакт",
-            "value": "Легче начать с шутки и переписки" if contact_pick == "talk" else "Лучше спокойно, по делу и уважительно",
-        },
-    ]
-
-    if structure_specific > structure_flexible:
-        result["extra_hint"] = "Лучше конкретнее"
-    elif _axis_is_uncertain(contact_talk, contact_reserved):
-        result["extra_hint"] = "Человеку может понадобиться время на ответ"
-    return result
+    return evaluate_profile(target).payload()
 
 
 def build_contact_insight_text(target: str) -> Optional[str]:
-    target_user_id = db.get_user_id_by_username(target)
-    total = db.get_total(target, target_user_id)
-    if total < 3:
-        return None
-
-    dimensions = db.get_contact_dimensions(target, target_user_id)
-    tone_counts = dimensions["tone"]
-    speed_counts = dimensions["speed"]
-    format_counts = dimensions["contact_format"]
-    caution_counts = dimensions["caution"]
-
-    tone_pick = "easy" if tone_counts["easy"] >= tone_counts["serious"] else "serious"
-    speed_pick = "slow" if speed_counts["slow"] >= speed_counts["fast"] else "fast"
-    format_pick = "text" if format_counts["text"] >= format_counts["live"] else "live"
-
-    tone_text = "С юмора" if tone_pick == "easy" else "Спокойно, по делу"
-    speed_text = "Не торопясь" if speed_pick == "slow" else "Сразу"
-    format_text = "Через переписку" if format_pick == "text" else "В живом общении"
-
-    lines = [
-        "Как с этим человеком чаще всего",
-        "начинают общение:",
-        "",
-        f"👉 {tone_text}",
-        f"👉 {speed_text}",
-        f"👉 {format_text}",
-    ]
-
-    def no_clear_majority(a: int, b: int) -> bool:
-        s = a + b
-        return s > 0 and max(a, b) / s < 0.6
-
-    uncertain = (
-        no_clear_majority(tone_counts["easy"], tone_counts["serious"])
-        or no_clear_majority(speed_counts["fast"], speed_counts["slow"])
-        or no_clear_majority(format_counts["text"], format_counts["live"])
-    )
-    if uncertain:
-        lines += [
-            "",
-            "По этому пункту мнения разделились —",
-            "лучше ориентироваться по ситуации.",
-        ]
-
-    caution_ratio = caution_counts["true"] / total if total > 0 else 0
-    if caution_ratio >= 0.3:
-        lines += [
-            "",
-            "⚠️ Иногда лучше не давить",
-            "и дать время.",
-        ]
-
-    return "\n".join(lines)
+    return evaluate_profile(target).insight_text()
@@ -4,6 +4,8 @@ from typing import Callable, Optional
 from aiogram import Bot
 
 import db
+from app.metrics import PUSH_SENDS
+from app.profile import counts_before_vote, result_changed
 
 
 class PushManager:
@@ -11,13 +13,11 @@ class PushManager:
         self,
         db_call: Callable,
         queue_coroutine: Callable,
-        build_profile_payload: Callable[[str], dict],
         admin_username: str,
         push_timeout_seconds: float,
     ):
         self.db_call = db_call
         self.queue_coroutine = queue_coroutine
-        self.build_profile_payload = build_profile_payload
         self.admin_username = admin_username
         self.push_timeout_seconds = push_timeout_seconds
 
@@ -64,11 +64,14 @@ class PushManager:
 
     async def send_action_push(self, bot: Bot, target_id: int, event_type: str, text: str) -> bool:
         if self.is_quiet_hours():
+            PUSH_SENDS.inc(event_type, "quiet_hours")
             return False
         sent_today = await self.db_call(db.count_pushes_today, target_id)
         if sent_today >= 2:
+            PUSH_SENDS.inc(event_type, "daily_cap")
             return False
         ok = await self.send_tracked_push(bot, target_id, text)
+        PUSH_SENDS.inc(event_type, "sent" if ok else "failed")
         if ok:
             await self.db_call(db.add_push_event, target_id, event_type)
         return ok
@@ -78,39 +81,11 @@ class PushManager:
         bot: Bot,
         target: str,
         voter_id: Optional[int],
-        tone: str,
-        speed: str,
-        contact_format: str,
-        initiative: str,
-        start_context: str,
-        attention_reaction: str,
-        caution: str,
-        frequency: str,
-        comm_format: str,
-        emotion_tone: str,
-        feedback_style: str,
-        uncertainty: str,
+        answers: dict[str, str],
     ) -> tuple[Optional[str], str]:
-        before_payload = await self.db_call(self.build_profile_payload, target)
         target_user_id = await self.db_call(db.get_user_id_by_username, target)
-        result = await self.db_call(
-            db.add_vote,
-            target,
-            "feedback",
-            voter_id,
-            target_user_id,
-            tone,
-            speed,
-            contact_format,
-            caution,
-            initiative,
-            start_context,
-            attention_reaction,
-            frequency,
-            comm_format,
-            emotion_tone,
-            feedback_style,
-            uncertainty,
+        result, previous_mask = await self.db_call(
+            db.add_vote_with_previous, target, "feedback", voter_id, target_user_id, answers
         )
         if result is None:
             return None, "База недоступна, попробуй позже"
@@ -119,8 +94,10 @@ class PushManager:
 
         target_id = target_user_id
         if target_id:
-            after_payload = await self.db_call(self.build_profile_payload, target)
-            answers_total = int(after_payload.get("answers") or 0)
+            # One aggregate read; the state before this vote is derived from it.
+            after_counts = await self.db_call(db.get_profile_counts, target)
+            before_counts = counts_before_vote(after_counts, answers, previous_mask)
+            answers_total = int(after_counts["total"])
 
             if result == "inserted" and answers_total > 0 and answers_total % 2 == 0:
                 self.queue_coroutine(
@@ -132,11 +109,7 @@ class PushManager:
                     )
                 )
 
-            before_rows = before_payload.get("result_rows") if isinstance(before_payload, dict) else []
-            after_rows = after_payload.get("result_rows") if isinstance(after_payload, dict) else []
-            before_hint = (before_payload or {}).get("extra_hint", "") if isinstance(before_payload, dict) else ""
-            after_hint = (after_payload or {}).get("extra_hint", "") if isinstance(after_payload, dict) else ""
-            if before_rows != after_rows or before_hint != after_hint:
+            if result_changed(target, before_counts, after_counts):
                 self.queue_coroutine(
                     self.send_action_push(
                         bot,
@@ -0,0 +1,77 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+
+class RateLimiter:
+    """
+    Token buckets per (endpoint, client key). budgets maps endpoint -> (tokens per second, burst).
+    Endpoints without a budget are not limited.
+    """
+
+    def __init__(self, budgets: dict[str, tuple[float, int]], max_keys: int = 100000):
+        self.budgets = budgets
+        self.max_keys = max_keys
+        self.rejected = 0
+        self._buckets: OrderedDict[tuple[str, Hashable], tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, endpoint: str, key: Hashable) -> float:
+        """Take one token. Returns 0 when allowed, otherwise seconds until a token is available."""
+        budget = self.budgets.get(endpoint)
+        if budget is None:
+            return 0.0
+        rate, burst = budget
+        now = time.monotonic()
+        bucket_key = (endpoint, key)
+        with self._lock:
+            tokens, updated = self._buckets.get(bucket_key, (float(burst), now))
+            tokens = min(float(burst), tokens + (now - updated) * rate)
+            if tokens >= 1.0:
+                self._buckets[bucket_key] = (tokens - 1.0, now)
+                retry_after = 0.0
+            else:
+                self._buckets[bucket_key] = (tokens, now)
+                retry_after = (1.0 - tokens) / rate
+                self.rejected += 1
+            self._buckets.move_to_end(bucket_key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+
+class ConcurrencyGate:
+    """
+    Non-blocking cap on concurrent requests; callers that don't get a slot fail fast.
+    Background callers pass reserve to leave that many slots to requests; their misses
+    are not counted as rejections.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.rejected = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def try_enter(self, reserve: int = 0) -> bool:
+        with self._lock:
+            if self._in_flight >= self.limit - reserve:
+                if not reserve:
+                    self.rejected += 1
+                return False
+            self._in_flight += 1
+            return True
+
+    def leave(self) -> None:
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
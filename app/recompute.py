@@ -0,0 +1,179 @@
+"""
+Bulk recomputation of every profile with NumPy.
+
+Feedback votes are read once, in keyset pages, into a profiles x count-vector matrix; the
+rules run vectorized over all rows (RULES.evaluate_many) and the results replace the
+profile_results table. Profiles are keyed the way db.get_profile_counts resolves a target:
+by user id for registered usernames, by the target string otherwise.
+
+NumPy is optional; it is imported only when a recompute runs.
+"""
+
+import json
+import time
+from typing import Optional
+
+import db
+from app.axes import COUNT_VECTOR_SIZE, RULES, slot
+from app.profile import ENOUGH_ANSWERS, RESULT_ROWS
+
+PAGE_SIZE = 50000
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError as exc:
+        raise RuntimeError("bulk profile recompute needs numpy (pip install numpy)") from exc
+    return numpy
+
+
+class BulkProfiles:
+    """Count vectors and rule results for every profile, one array row per profile."""
+
+    def __init__(self, np, targets: list, target_user_ids: list, totals, visitors, counts, votes: int):
+        self.np = np
+        self.targets = targets
+        self.target_user_ids = target_user_ids
+        self.totals = totals
+        self.visitors = visitors
+        self.counts = counts
+        self.votes = votes
+        self.evaluation = RULES.evaluate_many(counts, totals)
+        self.enough = totals >= ENOUGH_ANSWERS
+        self.caution_ratio = counts[:, slot("caution.true")] / np.maximum(totals, 1)
+
+    def __len__(self) -> int:
+        return len(self.targets)
+
+    def result_rows(self) -> list:
+        """Per result row title, the text picked for every profile."""
+        np = self.np
+        columns = []
+        for title, derived, texts in RESULT_ROWS:
+            item = RULES.derived[RULES.derived_index[derived]]
+            values = np.where(
+                self.evaluation.first[RULES.derived_index[derived]], texts[item.first_pick], texts[item.second_pick]
+            )
+            columns.append((title, values))
+        return columns
+
+    def db_rows(self) -> list[tuple]:
+        """Rows in db.PROFILE_RESULT_COLUMNS order."""
+        evaluation = self.evaluation
+        pick_names = [item.name for item in RULES.derived]
+        hint_names = list(RULES.hint_index)
+        picks = [evaluation.pick(name).tolist() for name in pick_names]
+        hints = [evaluation.hint(name).tolist() for name in hint_names]
+        result_columns = self.result_rows()
+        titles = [title for title, _ in result_columns]
+        results = [values.tolist() for _, values in result_columns]
+        rows = []
+        for i, (target, user_id, total, visitors, enough, ratio) in enumerate(
+            zip(
+                self.targets,
+                self.target_user_ids,
+                self.totals.tolist(),
+                self.visitors.tolist(),
+                self.enough.tolist(),
+                self.caution_ratio.tolist(),
+            )
+        ):
+            row_hints = json.dumps({name: bool(column[i]) for name, column in zip(hint_names, hints)})
+            if enough:
+                row_picks = json.dumps({name: column[i] for name, column in zip(pick_names, picks)})
+                row_results = json.dumps(
+                    [{"title": title, "value": column[i]} for title, column in zip(titles, results)],
+                    ensure_ascii=False,
+                )
+            else:
+                row_picks, row_results = None, "[]"
+            rows.append((target, user_id, total, visitors, int(enough), ratio, row_picks, row_hints, row_results))
+        return rows
+
+
+def load_profiles(page_size: int = PAGE_SIZE) -> BulkProfiles:
+    np = _numpy()
+    usernames = dict(db.list_usernames_by_user_id())
+    registered = set(usernames.values())
+
+    # Votes keyed by user id, and by target string for targets without one.
+    id_parts, id_mask_parts = [], []
+    text_targets, text_masks = [], []
+    votes = 0
+    after_id: Optional[int] = 0
+    while after_id is not None:
+        rows, after_id = db.read_feedback_masks_page(after_id, page_size)
+        if not rows:
+            break
+        votes += len(rows)
+        user_ids = np.fromiter((row[0] for row in rows), np.int64, len(rows))
+        masks = np.fromiter((row[2] for row in rows), np.int64, len(rows))
+        by_id = user_ids != 0
+        id_parts.append(user_ids[by_id])
+        id_mask_parts.append(masks[by_id])
+        for i in np.flatnonzero(~by_id).tolist():
+            text_targets.append(rows[i][1])
+            text_masks.append(rows[i][2])
+
+    visits = db.count_ref_visitors_by_target()
+    vote_ids = np.concatenate(id_parts) if id_parts else np.zeros(0, np.int64)
+    id_masks = np.concatenate(id_mask_parts) if id_mask_parts else np.zeros(0, np.int64)
+    visit_ids = np.array([user_id for user_id, _, _ in visits if user_id], np.int64)
+
+    # Only registered usernames resolve to a user id; unknown ids are unreachable by target.
+    known_ids = np.fromiter(usernames, np.int64, len(usernames))
+    profile_ids = np.unique(np.concatenate([vote_ids, visit_ids]))
+    profile_ids = profile_ids[np.isin(profile_ids, known_ids)]
+    # A target that names a registered user is served by its user id, not by the string.
+    target_keys = sorted(
+        {target for target in text_targets if target.lower() not in registered}
+        | {target for user_id, target, _ in visits if not user_id and target.lower() not in registered}
+    )
+    target_index = {target: len(profile_ids) + i for i, target in enumerate(target_keys)}
+    size = len(profile_ids) + len(target_keys)
+
+    kept = np.isin(vote_ids, profile_ids)
+    text_rows = [(target_index[target], mask) for target, mask in zip(text_targets, text_masks) if target in target_index]
+    index = np.concatenate(
+        [
+            np.searchsorted(profile_ids, vote_ids[kept]),
+            np.fromiter((i for i, _ in text_rows), np.int64, len(text_rows)),
+        ]
+    )
+    masks = np.concatenate([id_masks[kept], np.fromiter((mask for _, mask in text_rows), np.int64, len(text_rows))])
+
+    totals = np.bincount(index, minlength=size).astype(np.int64)
+    counts = np.empty((size, COUNT_VECTOR_SIZE), np.int64)
+    for position in range(COUNT_VECTOR_SIZE):
+        counts[:, position] = np.bincount(index, weights=(masks >> position) & 1, minlength=size).astype(np.int64)
+
+    visitors = np.zeros(size, np.int64)
+    for user_id, target, count in visits:
+        if user_id:
+            i = int(np.searchsorted(profile_ids, user_id))
+            if i < len(profile_ids) and profile_ids[i] == user_id:
+                visitors[i] += count
+        elif target in target_index:
+            visitors[target_index[target]] += count
+
+    id_list = profile_ids.tolist()
+    targets = [usernames[user_id] for user_id in id_list] + target_keys
+    target_user_ids = id_list + [None] * len(target_keys)
+    return BulkProfiles(np, targets, target_user_ids, totals, visitors, counts, votes)
+
+
+def recompute_profiles(write: bool = True, page_size: int = PAGE_SIZE) -> dict:
+    """Recompute every profile and replace profile_results. Returns counts and timings."""
+    started = time.perf_counter()
+    profiles = load_profiles(page_size)
+    computed = time.perf_counter()
+    written = db.replace_profile_results(profiles.db_rows()) if write else 0
+    return {
+        "votes": profiles.votes,
+        "profiles": len(profiles),
+        "enough": int(profiles.enough.sum()),
+        "written": written,
+        "compute_seconds": round(computed - started, 3),
+        "total_seconds": round(time.perf_counter() - started, 3),
+    }
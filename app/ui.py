@@ -26,3 +26,30 @@ def build_launch_kb(mini_app_url: str, prefill_target: Optional[str] = None) ->
     kb.button(text="Открыть приложение", web_app=types.WebAppInfo(url=app_url))
     return kb.as_markup()
 
+
+USERS_PAGE_CALLBACK_PREFIX = "users:"
+
+
+def encode_users_cursor(cursor: Optional[tuple[str, int]]) -> str:
+    if not cursor:
+        return USERS_PAGE_CALLBACK_PREFIX
+    return f"{USERS_PAGE_CALLBACK_PREFIX}{cursor[0]}|{cursor[1]}"
+
+
+def decode_users_cursor(data: str) -> Optional[tuple[str, int]]:
+    raw = data[len(USERS_PAGE_CALLBACK_PREFIX):] if data.startswith(USERS_PAGE_CALLBACK_PREFIX) else ""
+    updated_at, sep, user_id = raw.rpartition("|")
+    if not sep or not user_id.isdigit():
+        return None
+    return updated_at, int(user_id)
+
+
+def build_users_page_kb(next_cursor: Optional[tuple[str, int]], is_first_page: bool) -> Optional[types.InlineKeyboardMarkup]:
+    if is_first_page and not next_cursor:
+        return None
+    kb = InlineKeyboardBuilder()
+    if not is_first_page:
+        kb.button(text="⏮ В начало", callback_data=encode_users_cursor(None))
+    if next_cursor:
+        kb.button(text="Дальше ▶", callback_data=encode_users_cursor(next_cursor))
+    return kb.as_markup()
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+import db
+
+UserKey = tuple[str, str, str]
+PendingUser = tuple[int, str, str, str, str, str]
+
+
+class UserSyncer:
+    """
+    Keeps bot users in sync with the users table without a write per message.
+    Unchanged users seen within the TTL are skipped; changes are flushed in batches.
+    """
+
+    def __init__(
+        self,
+        db_call: Callable,
+        on_new_user: Callable[[int, str, str], Awaitable[None]],
+        ttl_seconds: float = 900.0,
+        flush_interval_seconds: float = 2.0,
+        batch_size: int = 200,
+        max_entries: int = 50000,
+    ):
+        self.db_call = db_call
+        self.on_new_user = on_new_user
+        self.ttl_seconds = ttl_seconds
+        self.flush_interval_seconds = flush_interval_seconds
+        self.batch_size = batch_size
+        self.max_entries = max_entries
+        self._seen: OrderedDict[int, tuple[UserKey, float]] = OrderedDict()
+        self._pending: dict[int, PendingUser] = {}
+
+    def observe(
+        self,
+        user_id: int,
+        username: str,
+        first_name: str = "",
+        last_name: str = "",
+        photo_url: str = "",
+        source: str = "bot",
+    ) -> bool:
+        key = (username.lower(), first_name, last_name)
+        now = time.monotonic()
+        entry = self._seen.get(user_id)
+        if entry and entry[0] == key and now - entry[1] < self.ttl_seconds:
+            return False
+        self._seen[user_id] = (key, now)
+        self._seen.move_to_end(user_id)
+        while len(self._seen) > self.max_entries:
+            self._seen.popitem(last=False)
+        self._pending[user_id] = (user_id, key[0], first_name, last_name, photo_url, source)
+        return True
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    async def flush(self) -> int:
+        if not self._pending:
+            return 0
+        batch: list[PendingUser] = []
+        for user_id in list(self._pending)[: self.batch_size]:
+            batch.append(self._pending.pop(user_id))
+        rows = [(uid, uname, fn, ln, photo, True) for uid, uname, fn, ln, photo, _ in batch]
+        try:
+            new_ids = await self.db_call(db.upsert_users_batch, rows)
+        except Exception as exc:
+            logging.warning("User sync batch failed: %s", exc)
+            new_ids = None
+        if new_ids is None:
+            # Keep the batch for the next flush unless a newer entry replaced it. Beyond
+            # max_entries pending (a long outage) forget it: the user's next message retries.
+            for item in batch:
+                if item[0] in self._pending:
+                    continue
+                if len(self._pending) < self.max_entries:
+                    self._pending[item[0]] = item
+                else:
+                    self._seen.pop(item[0], None)
+            return 0
+        new_set = set(new_ids)
+        for user_id, username, _, _, _, source in batch:
+            if user_id in new_set:
+                try:
+                    await self.on_new_user(user_id, username, source)
+                except Exception as exc:
+                    logging.warning("New user notification failed: %s", exc)
+        return len(batch)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval_seconds)
+            try:
+                while await self.flush() >= self.batch_size:
+                    pass
+            except Exception as exc:
+                logging.warning("User sync flush failed: %s", exc)
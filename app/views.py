@@ -0,0 +1,158 @@
+"""
+Profile view counting.
+
+Views of /api/miniapp/profile are counted in memory and written behind in batches
+(ProfileViews.flush, one db.add_profile_views call per interval). Unique viewers are
+estimated with a HyperLogLog sketch per target (ViewerSketch), merged into the stored one
+on every flush, so a viewer counts once however often and from whichever process they look.
+"""
+
+import hashlib
+import math
+import struct
+import threading
+import time
+from collections import Counter
+from typing import Callable, Optional
+
+SKETCH_PRECISION = 10
+SKETCH_REGISTERS = 1 << SKETCH_PRECISION
+_HASH_BITS = 64 - SKETCH_PRECISION
+_ALPHA = 0.7213 / (1 + 1.079 / SKETCH_REGISTERS)
+_INVERSE_POWERS = tuple(2.0**-rank for rank in range(_HASH_BITS + 2))
+# Serialized forms: dense is every register; sparse is (index, rank) pairs for mostly empty sketches.
+_DENSE = b"\x00"
+_SPARSE = b"\x01"
+_SPARSE_ENTRY = struct.Struct(">HB")
+
+
+class ViewerSketch:
+    """HyperLogLog over viewer ids: 1024 one-byte registers, about 3% standard error."""
+
+    __slots__ = ("registers",)
+
+    def __init__(self, registers: Optional[bytearray] = None):
+        self.registers = registers if registers is not None else bytearray(SKETCH_REGISTERS)
+
+    def add(self, viewer_id: int) -> None:
+        digest = hashlib.blake2b(str(viewer_id).encode("ascii"), digest_size=8).digest()
+        value = int.from_bytes(digest, "big")
+        index = value >> _HASH_BITS
+        rank = _HASH_BITS - (value & ((1 << _HASH_BITS) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "ViewerSketch") -> None:
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def estimate(self) -> int:
+        registers = self.registers
+        raw = _ALPHA * SKETCH_REGISTERS * SKETCH_REGISTERS / sum(_INVERSE_POWERS[rank] for rank in registers)
+        zeros = registers.count(0)
+        if raw <= 2.5 * SKETCH_REGISTERS and zeros:
+            # Linear counting: exact enough for the long tail of rarely viewed profiles.
+            return int(round(SKETCH_REGISTERS * math.log(SKETCH_REGISTERS / zeros)))
+        return int(round(raw))
+
+    def to_bytes(self) -> bytes:
+        used = [(index, rank) for index, rank in enumerate(self.registers) if rank]
+        if len(used) * _SPARSE_ENTRY.size < SKETCH_REGISTERS:
+            return _SPARSE + b"".join(_SPARSE_ENTRY.pack(index, rank) for index, rank in used)
+        return _DENSE + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data: Optional[bytes]) -> "ViewerSketch":
+        if not data:
+            return cls()
+        data = bytes(data)
+        if data[:1] == _DENSE and len(data) == SKETCH_REGISTERS + 1:
+            return cls(bytearray(data[1:]))
+        sketch = cls()
+        if data[:1] == _SPARSE:
+            for index, rank in _SPARSE_ENTRY.iter_unpack(data[1:]):
+                sketch.registers[index] = rank
+        return sketch
+
+
+class ProfileViews:
+    """
+    Write-behind view counters. record() only touches memory; flush() hands everything
+    recorded since the previous flush to store(rows) as one batch of (target, views, sketch)
+    and, when store reports failure, merges the batch back for the next flush.
+    Past flushes also feed a decaying per-target score for top().
+
+    Each pending target holds a 1 KB sketch: flush() writes once interval_seconds have passed
+    or flush_targets targets are pending, and targets beyond max_targets are dropped.
+    """
+
+    def __init__(
+        self,
+        store: Callable[[list], bool],
+        max_targets: int = 20000,
+        flush_targets: int = 5000,
+        interval_seconds: float = 0.0,
+        decay: float = 0.5,
+    ):
+        self.store = store
+        self.max_targets = max_targets
+        self.flush_targets = flush_targets
+        self.interval_seconds = interval_seconds
+        self.decay = decay
+        self.recorded = 0
+        self.flushed = 0
+        self.dropped = 0
+        self._pending: dict[str, list] = {}
+        self._recent: Counter = Counter()
+        self._lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+
+    def record(self, target: str, viewer_id: int) -> None:
+        with self._lock:
+            entry = self._pending.get(target)
+            if entry is None:
+                if len(self._pending) >= self.max_targets:
+                    self.dropped += 1
+                    return
+                entry = self._pending[target] = [0, ViewerSketch()]
+            entry[0] += 1
+            entry[1].add(viewer_id)
+            self.recorded += 1
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def flush(self, force: bool = False) -> Optional[dict]:
+        with self._lock:
+            due = time.monotonic() - self._flushed_at >= self.interval_seconds
+            if not (force or due or len(self._pending) >= self.flush_targets):
+                return None
+            self._flushed_at = time.monotonic()
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return None
+        rows = [(target, views, sketch) for target, (views, sketch) in pending.items()]
+        views = sum(row[1] for row in rows)
+        if not self.store(rows):
+            with self._lock:
+                for target, (count, sketch) in pending.items():
+                    entry = self._pending.setdefault(target, [0, ViewerSketch()])
+                    entry[0] += count
+                    entry[1].merge(sketch)
+            return {"rows": 0, "failed": len(rows)}
+        with self._lock:
+            self.flushed += views
+            for target, score in list(self._recent.items()):
+                if score * self.decay < 0.01:
+                    del self._recent[target]
+                else:
+                    self._recent[target] = score * self.decay
+            for target, count, _ in rows:
+                self._recent[target] += count
+            if len(self._recent) > self.max_targets:
+                self._recent = Counter(dict(self._recent.most_common(self.max_targets // 2)))
+        return {"rows": len(rows), "views": views}
+
+    def top(self, limit: int) -> list[tuple[str, float]]:
+        """Targets most viewed in recent flushes, with their decayed view counts."""
+        with self._lock:
+            return self._recent.most_common(limit)
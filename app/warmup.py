@@ -0,0 +1,52 @@
+import logging
+from typing import Callable, Optional
+
+
+class ProfileWarmer:
+    """
+    BatchWorker step that keeps caches warm for the most viewed targets. Each pass lists
+    popular(limit) and calls warm(target) for them in order, one target per step, so the
+    worker's batch pause bounds the rate. warm returns False when it had nothing to do
+    (the target is still cached); those don't count against the rate. It returns None when
+    it had to back off (no spare Telegram capacity); the target is retried on the next step.
+    After a pass the step returns None once, and the worker idles until the next one.
+    """
+
+    def __init__(self, popular: Callable[[int], list], warm: Callable[[str], Optional[bool]], limit: int = 100):
+        self.popular = popular
+        self.warm = warm
+        self.limit = limit
+        self.passes = 0
+        self.warmed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.deferred = 0
+        self._pending: list[str] = []
+        self._in_pass = False
+
+    def step(self) -> Optional[dict]:
+        if not self._pending:
+            if self._in_pass:
+                self._in_pass = False
+                self.passes += 1
+                return None
+            # Most popular last: pop() takes it first.
+            self._pending = [target for target, _ in reversed(self.popular(self.limit))]
+            self._in_pass = bool(self._pending)
+        while self._pending:
+            target = self._pending.pop()
+            try:
+                warmed = self.warm(target)
+            except Exception as exc:
+                self.failed += 1
+                logging.warning("Warming %s failed: %s", target, exc)
+                continue
+            if warmed is None:
+                self._pending.append(target)
+                self.deferred += 1
+                return {"rows": 0, "target": target, "deferred": True, "pending": len(self._pending)}
+            if warmed:
+                self.warmed += 1
+                return {"rows": 1, "target": target, "pending": len(self._pending)}
+            self.skipped += 1
+        return {"rows": 0, "pending": 0} if self._in_pass else None
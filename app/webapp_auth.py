@@ -2,11 +2,68 @@ import hashlib
 import hmac
 import json
 import time
+from functools import lru_cache
 from typing import Optional
 from urllib.parse import parse_qsl
 
 from flask import Request
 
+from app.cache import LocalCache
+
+INIT_DATA_CACHE_SIZE = 10000
+# auth_date freshness is checked on every read; the TTL only bounds how long entries linger.
+INIT_DATA_CACHE_TTL = 86400
+
+
+@lru_cache(maxsize=8)
+def derive_webapp_secret(bot_token: str) -> bytes:
+    return hmac.new(b"WebAppData", bot_token.encode("utf-8"), hashlib.sha256).digest()
+
+
+@lru_cache(maxsize=8)
+def token_fingerprint(bot_token: str) -> str:
+    return hashlib.sha256(b"fingerprint:" + bot_token.encode("utf-8")).hexdigest()[:16]
+
+
+class VerifiedInitDataCache:
+    """
+    Already verified initData strings -> (user, auth_date, bot token fingerprint). Entries are
+    trusted without re-checking the hash, so they stay in this process: anyone able to write
+    to a shared cache server could otherwise plant a verified user. Keys are hashes.
+    """
+
+    def __init__(self, max_entries: int = INIT_DATA_CACHE_SIZE, ttl_seconds: float = INIT_DATA_CACHE_TTL):
+        self.backend = LocalCache(max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(init_data: str) -> str:
+        return "initdata:" + hashlib.sha256(init_data.encode("utf-8")).hexdigest()
+
+    def get(self, init_data: str) -> Optional[tuple[dict, int, str]]:
+        item = self.backend.get(self._key(init_data))
+        if item is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        user, auth_date, fingerprint = item
+        return user, auth_date, fingerprint
+
+    def put(self, init_data: str, user: dict, auth_date: int, bot_token: str) -> None:
+        self.backend.set(self._key(init_data), [user, auth_date, token_fingerprint(bot_token)], self.ttl_seconds)
+
+    def discard(self, init_data: str) -> None:
+        self.backend.delete(self._key(init_data))
+
+
+INIT_DATA_CACHE = VerifiedInitDataCache()
+
+
+def _is_fresh(auth_date: int, max_age_seconds: int) -> bool:
+    return auth_date > 0 and abs(int(time.time()) - auth_date) <= max_age_seconds
+
 
 def verify_telegram_init_data(
     init_data: str,
@@ -15,13 +72,23 @@ def verify_telegram_init_data(
 ) -> Optional[dict]:
     if not init_data:
         return None
+    cached = INIT_DATA_CACHE.get(init_data)
+    if cached is not None:
+        user, auth_date, fingerprint = cached
+        same_token = fingerprint == token_fingerprint(bot_token)
+        if same_token and _is_fresh(auth_date, max_age_seconds):
+            return user
+        if same_token:
+            INIT_DATA_CACHE.discard(init_data)
+            return None
+
     pairs = dict(parse_qsl(init_data, keep_blank_values=True))
     provided_hash = pairs.pop("hash", None)
     if not provided_hash:
         return None
 
     data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(pairs.items()))
-    secret = hmac.new(b"WebAppData", bot_token.encode("utf-8"), hashlib.sha256).digest()
+    secret = derive_webapp_secret(bot_token)
     calculated_hash = hmac.new(secret, data_check_string.encode("utf-8"), hashlib.sha256).hexdigest()
     if not hmac.compare_digest(calculated_hash, provided_hash):
         return None
@@ -31,7 +98,7 @@ def verify_telegram_init_data(
         auth_date = int(auth_date_raw) if auth_date_raw else 0
     except ValueError:
         return None
-    if auth_date <= 0 or abs(int(time.time()) - auth_date) > max_age_seconds:
+    if not _is_fresh(auth_date, max_age_seconds):
         return None
 
     user_raw = pairs.get("user")
@@ -41,7 +108,10 @@ def verify_telegram_init_data(
         user = json.loads(user_raw)
     except json.JSONDecodeError:
         return None
-    return user if isinstance(user, dict) else None
+    if not isinstance(user, dict):
+        return None
+    INIT_DATA_CACHE.put(init_data, user, auth_date, bot_token)
+    return user
 
 
 def get_webapp_user(request: Request, bot_token: str, max_age_seconds: int) -> Optional[dict]:
@@ -52,4 +122,3 @@ def get_webapp_user(request: Request, bot_token: str, max_age_seconds: int) -> O
 def build_avatar_proxy_url(username: str) -> str:
     uname = username.lstrip("@").lower()
     return f"/api/miniapp/avatar?username={uname}"
-
@@ -0,0 +1 @@
+"""Load-testing and benchmarking tools. Not imported by the bot itself."""
@@ -0,0 +1,268 @@
+"""
+Synthetic dataset generator for benchmarking db.py at realistic volumes.
+
+Votes follow a power law over targets: a handful of celebrity profiles collect thousands
+of answers, most users get a few or none. Users, ref_visits, push_events and
+profile_prefs are sized relative to --votes.
+
+    python -m bench.dataset --votes 100000 --sqlite bench.sqlite3
+    python -m bench.dataset --votes 10000000 --database-url postgresql://localhost/bench --truncate
+
+Usernames and ids match bench.initdata.synthetic_user, so bench.load can run on top.
+"""
+
+import argparse
+import importlib
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+from pathlib import Path
+from typing import Iterator, Optional
+
+from app.axes import AXES, encode_answers
+from bench.initdata import synthetic_user
+
+BATCH_ROWS = 5000
+BENCH_TABLES = (
+    "votes",
+    "ref_visits",
+    "ref_answerer_counts",
+    "push_events",
+    "profile_prefs",
+    "profile_results",
+    "profile_views",
+    "seen_hints",
+    "relink_queue",
+    "users",
+)
+VOTE_AXES = tuple((axis.name, axis.left, axis.right) for axis in AXES)
+# Answers go into answers_mask with the TEXT answer columns NULL, the way db.add_vote writes them.
+VOTE_COLUMNS = ("target", "target_user_id", "label", "answers_mask", *(axis for axis, _, _ in VOTE_AXES), "voter_id", "created_at")
+PUSH_EVENT_TYPES = ("new_answer", "ref_answer", "milestone")
+
+
+def load_db(database_url: str = "", sqlite_path: Optional[str] = None):
+    """Import db configured for the given backend; db reads DATABASE_URL at import time."""
+    os.environ["DATABASE_URL"] = database_url
+    db = importlib.import_module("db")
+    if db.USE_POSTGRES != bool(database_url):
+        raise SystemExit("db was already imported for another backend")
+    if sqlite_path:
+        db.DB_PATH = Path(sqlite_path)
+    return db
+
+
+def _timestamp(now: datetime, rng: random.Random, max_age: timedelta) -> str:
+    return (now - max_age * rng.random()).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def power_law_counts(total: int, buckets: int, exponent: float, cap: int, rng: random.Random) -> list[int]:
+    """Spread total items over ranked buckets with weight 1/rank^exponent, each capped at cap."""
+    weights = [1.0 / (rank + 1) ** exponent for rank in range(buckets)]
+    scale = total / sum(weights)
+    counts = [min(cap, int(weight * scale)) for weight in weights]
+    remainder = total - sum(counts)
+    cum_weights = list(accumulate(weights))
+    while remainder > 0:
+        rank = rng.choices(range(buckets), cum_weights=cum_weights)[0]
+        if counts[rank] < cap:
+            counts[rank] += 1
+            remainder -= 1
+    return counts
+
+
+class DatasetGenerator:
+    def __init__(
+        self,
+        db,
+        votes: int,
+        users: Optional[int] = None,
+        exponent: float = 1.1,
+        app_user_share: float = 0.7,
+        seed: int = 1,
+    ):
+        self.db = db
+        self.votes = votes
+        self.users = users or max(1000, votes // 10)
+        self.ref_visits = votes // 2
+        self.push_events = votes // 5
+        self.profile_prefs = self.users // 4
+        self.exponent = exponent
+        self.app_user_share = app_user_share
+        self.rng = random.Random(seed)
+        self.now = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    def _user_rows(self) -> Iterator[tuple]:
+        for i in range(self.users):
+            user = synthetic_user(i)
+            yield (
+                user["id"],
+                f"@{user['username']}",
+                user["first_name"],
+                user["last_name"],
+                "",
+                self.rng.random() < self.app_user_share,
+                _timestamp(self.now, self.rng, timedelta(days=180)),
+            )
+
+    def _vote_rows(self) -> Iterator[tuple]:
+        counts = power_law_counts(self.votes, self.users, self.exponent, self.users - 1, self.rng)
+        for rank, count in enumerate(counts):
+            if not count:
+                continue
+            target = synthetic_user(rank)
+            # Each target leans its own way on every axis, so aggregates are not all 50/50.
+            leanings = [self.rng.random() for _ in VOTE_AXES]
+            voters = self.rng.sample(range(self.users - 1), count)
+            for voter in voters:
+                voter = voter + 1 if voter >= rank else voter
+                answers = [
+                    left if self.rng.random() < lean else right
+                    for (_, left, right), lean in zip(VOTE_AXES, leanings)
+                ]
+                yield (
+                    f"@{target['username']}",
+                    target["id"],
+                    "feedback",
+                    encode_answers(answers),
+                    *(None for _ in VOTE_AXES),
+                    synthetic_user(voter)["id"],
+                    _timestamp(self.now, self.rng, timedelta(days=90)),
+                )
+
+    def _ref_visit_rows(self) -> Iterator[tuple]:
+        counts = power_law_counts(self.ref_visits, self.users, self.exponent, self.users - 1, self.rng)
+        for rank, count in enumerate(counts):
+            target = synthetic_user(rank)
+            for visitor in self.rng.sample(range(self.users - 1), count):
+                visitor = visitor + 1 if visitor >= rank else visitor
+                yield (
+                    f"@{target['username']}",
+                    target["id"],
+                    synthetic_user(visitor)["id"],
+                    _timestamp(self.now, self.rng, timedelta(days=90)),
+                )
+
+    def _push_event_rows(self) -> Iterator[tuple]:
+        for _ in range(self.push_events):
+            # Pushes go to people who get answers, so they follow the same skew.
+            rank = min(self.users - 1, int(self.rng.paretovariate(self.exponent)) - 1)
+            yield (
+                synthetic_user(rank)["id"],
+                self.rng.choice(PUSH_EVENT_TYPES),
+                _timestamp(self.now, self.rng, timedelta(days=7)),
+            )
+
+    def _profile_pref_rows(self) -> Iterator[tuple]:
+        for i in self.rng.sample(range(self.users), self.profile_prefs):
+            yield (
+                synthetic_user(i)["id"],
+                f"Заметка {i}",
+                _timestamp(self.now, self.rng, timedelta(days=180)),
+            )
+
+    def _insert(self, conn, table: str, columns: tuple[str, ...], rows: Iterator[tuple]) -> int:
+        column_list = ", ".join(columns)
+        total = 0
+        if self.db.USE_POSTGRES:
+            with conn.cursor() as cur:
+                with cur.copy(f"COPY {table} ({column_list}) FROM STDIN") as copy:
+                    for row in rows:
+                        copy.write_row(row)
+                        total += 1
+            conn.commit()
+            return total
+        placeholders = ", ".join("?" for _ in columns)
+        sql = f"INSERT INTO {table} ({column_list}) VALUES ({placeholders})"
+        batch: list[tuple] = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= BATCH_ROWS:
+                conn.executemany(sql, batch)
+                conn.commit()
+                total += len(batch)
+                batch = []
+        if batch:
+            conn.executemany(sql, batch)
+            conn.commit()
+            total += len(batch)
+        return total
+
+    def truncate(self) -> None:
+        conn = self.db._get_pg_conn() if self.db.USE_POSTGRES else self.db._get_sqlite_conn()
+        try:
+            if self.db.USE_POSTGRES:
+                conn.execute(f"TRUNCATE {', '.join(BENCH_TABLES)}")
+            else:
+                for table in BENCH_TABLES:
+                    conn.execute(f"DELETE FROM {table}")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def generate(self) -> dict[str, int]:
+        self.db.init_db()
+        conn = self.db._get_pg_conn() if self.db.USE_POSTGRES else self.db._get_sqlite_conn()
+        counts: dict[str, int] = {}
+        try:
+            if not self.db.USE_POSTGRES:
+                conn.execute("PRAGMA synchronous = OFF")
+            # New ref visits are unflagged; the answerer counters are rebuilt at the end.
+            conn.execute("DELETE FROM ref_answerer_counts")
+            conn.execute("UPDATE ref_visits SET answered = 0 WHERE answered <> 0")
+            placeholder = "%s" if self.db.USE_POSTGRES else "?"
+            conn.execute(f"DELETE FROM job_state WHERE name = {placeholder}", (self.db.REF_ANSWERERS_JOB,))
+            plan = (
+                ("users", ("user_id", "username", "first_name", "last_name", "photo_url", "app_user", "updated_at"), self._user_rows),
+                ("votes", VOTE_COLUMNS, self._vote_rows),
+                ("ref_visits", ("target", "target_user_id", "visitor_id", "created_at"), self._ref_visit_rows),
+                ("push_events", ("user_id", "event_type", "created_at"), self._push_event_rows),
+                ("profile_prefs", ("user_id", "note", "updated_at"), self._profile_pref_rows),
+            )
+            for table, columns, rows in plan:
+                started = time.perf_counter()
+                counts[table] = self._insert(conn, table, columns, rows())
+                print(f"{table}: {counts[table]} rows in {time.perf_counter() - started:.1f}s")
+            if conn.execute("SELECT id FROM votes WHERE answers_mask IS NULL OR answers_mask >= 0 LIMIT 1").fetchone() is None:
+                # Every vote is already packed; the backfill has nothing to do.
+                self.db._save_job_state(conn, self.db.ANSWERS_MASK_JOB, "0", True, 0)
+            conn.execute("ANALYZE")
+            conn.commit()
+        finally:
+            conn.close()
+        # Build the ref answerer counters the app maintains on write.
+        started = time.perf_counter()
+        while progress := self.db.backfill_ref_answerers_batch(BATCH_ROWS * 10):
+            if progress.get("failed"):
+                raise RuntimeError("ref_answerer_counts backfill failed")
+        print(f"ref_answerer_counts: built in {time.perf_counter() - started:.1f}s")
+        return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Populate a database with synthetic users, votes and visits.")
+    parser.add_argument("--votes", type=int, default=100000, help="number of votes; other tables scale from it")
+    parser.add_argument("--users", type=int, help="default max(1000, votes / 10)")
+    parser.add_argument("--exponent", type=float, default=1.1, help="power-law skew of votes per target")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database-url", default="", help="Postgres URL; SQLite is used when empty")
+    parser.add_argument("--sqlite", default="bench.sqlite3", help="SQLite file (must not exist unless --truncate)")
+    parser.add_argument("--truncate", action="store_true", help="wipe the bot tables before generating")
+    args = parser.parse_args()
+
+    if not args.database_url and Path(args.sqlite).exists() and not args.truncate:
+        raise SystemExit(f"{args.sqlite} already exists; pass --truncate to overwrite its data")
+    db = load_db(args.database_url, None if args.database_url else args.sqlite)
+    generator = DatasetGenerator(db, args.votes, args.users, args.exponent, seed=args.seed)
+    if args.truncate:
+        db.init_db()
+        generator.truncate()
+    started = time.perf_counter()
+    counts = generator.generate()
+    print(f"done in {time.perf_counter() - started:.1f}s: {counts}")
+
+
+if __name__ == "__main__":
+    main()
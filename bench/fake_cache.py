@@ -0,0 +1,161 @@
+"""
+Minimal stand-in for a Redis server, good enough for app.cache.RespCache:
+PING, AUTH, SELECT, GET, SET (EX/PX), DEL, PUBLISH and SUBSCRIBE over RESP.
+Keys live in one dict regardless of SELECT; expired keys are dropped on read.
+
+    python -m bench.fake_cache --port 6390
+"""
+
+import argparse
+import asyncio
+import time
+from collections import Counter
+from typing import Optional
+
+
+def _encode(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(_encode(item) for item in value)
+    return b"+%s\r\n" % str(value).encode("utf-8")
+
+
+async def _read_command(reader: asyncio.StreamReader) -> Optional[list[bytes]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline command, as typed into telnet.
+        return line.split()
+    args = []
+    for _ in range(int(line[1:-2])):
+        size = int((await reader.readline())[1:-2])
+        args.append((await reader.readexactly(size + 2))[:-2])
+    return args
+
+
+class FakeCacheServer:
+    def __init__(self):
+        self.commands: Counter = Counter()
+        self._data: dict[bytes, tuple[bytes, float]] = {}
+        self._subscribers: dict[bytes, set[asyncio.StreamWriter]] = {}
+        self._clients: set[asyncio.StreamWriter] = set()
+        self._server: Optional[asyncio.base_events.Server] = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 6390) -> str:
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return f"redis://{host}:{port}/0"
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            # Hang up on clients first, so their handlers finish instead of being cancelled.
+            for writer in list(self._clients):
+                writer.close()
+            await asyncio.sleep(0.05)
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[1] and item[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return item[0]
+
+    def _set(self, args: list[bytes]) -> object:
+        key, value, options = args[0], args[1], [arg.upper() for arg in args[2:]]
+        expires = 0.0
+        for i, option in enumerate(options):
+            if option in (b"EX", b"PX") and i + 1 < len(options):
+                seconds = float(args[3 + i]) / (1000 if option == b"PX" else 1)
+                expires = time.monotonic() + seconds
+        self._data[key] = (value, expires)
+        return "OK"
+
+    def _publish(self, channel: bytes, message: bytes) -> int:
+        writers = self._subscribers.get(channel, set())
+        frame = _encode([b"message", channel, message])
+        for writer in list(writers):
+            if writer.is_closing():
+                writers.discard(writer)
+            else:
+                writer.write(frame)
+        return len(writers)
+
+    def _execute(self, args: list[bytes], writer: asyncio.StreamWriter) -> bytes:
+        name = args[0].upper().decode("utf-8", "replace")
+        self.commands[name] += 1
+        if name == "PING":
+            return _encode("PONG")
+        if name in ("AUTH", "SELECT"):
+            return _encode("OK")
+        if name == "GET" and len(args) == 2:
+            return _encode(self._get(args[1]))
+        if name == "SET" and len(args) >= 3:
+            return _encode(self._set(args[1:]))
+        if name == "DEL":
+            return _encode(sum(1 for key in args[1:] if self._data.pop(key, None) is not None))
+        if name == "PUBLISH" and len(args) == 3:
+            return _encode(self._publish(args[1], args[2]))
+        if name == "SUBSCRIBE" and len(args) >= 2:
+            replies = []
+            for channel in args[1:]:
+                self._subscribers.setdefault(channel, set()).add(writer)
+                count = sum(1 for writers in self._subscribers.values() if writer in writers)
+                replies.append(_encode([b"subscribe", channel, count]))
+            return b"".join(replies)
+        return b"-ERR unknown command '%s'\r\n" % name.encode("utf-8")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._clients.add(writer)
+        try:
+            while True:
+                args = await _read_command(reader)
+                if args is None:
+                    break
+                if args:
+                    writer.write(self._execute(args, writer))
+                    await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            for writers in self._subscribers.values():
+                writers.discard(writer)
+            self._clients.discard(writer)
+            writer.close()
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    server = FakeCacheServer()
+    url = await server.start(args.host, args.port)
+    print(f"Fake cache server listening on {url} (set CACHE_URL={url})")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
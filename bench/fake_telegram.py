@@ -0,0 +1,198 @@
+"""
+Minimal stand-in for the Telegram Bot API, good enough for the calls the bot makes:
+getMe, getChat, getFile, sendMessage, getUpdates and file downloads.
+Every call waits latency_ms +- jitter_ms and fails with error_rate probability.
+
+    python -m bench.fake_telegram --port 8081 --latency-ms 80 --error-rate 0.01
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import zlib
+from collections import Counter
+from typing import Optional
+
+from aiohttp import web
+
+from bench.initdata import synthetic_user
+
+# Smallest valid JPEG-ish payload; the app only forwards the bytes.
+AVATAR_BYTES = bytes.fromhex("ffd8ffe000104a46494600010100000100010000ffd9") + b"\0" * 2048
+
+
+def chat_id_for_username(username: str) -> int:
+    username = username.lstrip("@").lower()
+    prefix = "bench_user_"
+    if username.startswith(prefix) and username[len(prefix):].isdigit():
+        return synthetic_user(int(username[len(prefix):]))["id"]
+    return 8_000_000_000 + zlib.crc32(username.encode("utf-8"))
+
+
+class FakeTelegramAPI:
+    def __init__(
+        self,
+        latency_ms: float = 50.0,
+        jitter_ms: float = 20.0,
+        error_rate: float = 0.0,
+        photo_rate: float = 0.8,
+        seed: Optional[int] = None,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.photo_rate = photo_rate
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self._random = random.Random(seed)
+        self._message_id = 0
+        self._runner: Optional[web.AppRunner] = None
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route("*", "/bot{token}/{method}", self.handle_method)
+        app.router.add_get("/file/bot{token}/{path:.+}", self.handle_file)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8081) -> str:
+        self._runner = web.AppRunner(self.build_app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        return f"http://{host}:{port}"
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _delay(self) -> None:
+        delay = self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+    def _should_fail(self) -> bool:
+        return self.error_rate > 0 and self._random.random() < self.error_rate
+
+    async def handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(request.query)
+        if request.method == "POST":
+            params.update(await request.post())
+        self.calls[method] += 1
+
+        if method.lower() == "getupdates":
+            # Long polling: hold the request like Telegram does when there are no updates.
+            await asyncio.sleep(min(float(params.get("timeout") or 0), 5.0))
+            return web.json_response({"ok": True, "result": []})
+
+        await self._delay()
+        if self._should_fail():
+            self.errors[method] += 1
+            return web.json_response(
+                {"ok": False, "error_code": 500, "description": "Internal Server Error: fake failure"},
+                status=500,
+            )
+        handler = getattr(self, f"_{method.lower()}", None)
+        result = handler(params) if handler else True
+        if result is None:
+            return web.json_response(
+                {"ok": False, "error_code": 400, "description": "Bad Request: chat not found"},
+                status=400,
+            )
+        return web.json_response({"ok": True, "result": result})
+
+    async def handle_file(self, request: web.Request) -> web.Response:
+        self.calls["file"] += 1
+        await self._delay()
+        if self._should_fail():
+            self.errors["file"] += 1
+            return web.Response(status=500)
+        return web.Response(body=AVATAR_BYTES, content_type="image/jpeg")
+
+    def _getme(self, params: dict) -> dict:
+        return {
+            "id": 1000,
+            "is_bot": True,
+            "first_name": "Bench",
+            "username": "bench_fake_bot",
+            "can_join_groups": True,
+            "can_read_all_group_messages": False,
+            "supports_inline_queries": False,
+        }
+
+    def _getchat(self, params: dict) -> Optional[dict]:
+        raw = str(params.get("chat_id") or "")
+        if not raw:
+            return None
+        if raw.startswith("@"):
+            username = raw[1:].lower()
+            chat_id = chat_id_for_username(username)
+        else:
+            chat_id = int(raw)
+            username = f"user{chat_id}"
+        chat = {
+            "id": chat_id,
+            "type": "private",
+            "username": username,
+            "first_name": f"Fake{chat_id % 10000}",
+            "bio": "Синтетический профиль для нагрузочного теста.",
+        }
+        if (chat_id % 100) < self.photo_rate * 100:
+            chat["photo"] = {
+                "small_file_id": f"small{chat_id}",
+                "small_file_unique_id": f"su{chat_id}",
+                "big_file_id": f"big{chat_id}",
+                "big_file_unique_id": f"bu{chat_id}",
+            }
+        return chat
+
+    def _getfile(self, params: dict) -> dict:
+        file_id = str(params.get("file_id") or "file")
+        return {
+            "file_id": file_id,
+            "file_unique_id": f"u{file_id}",
+            "file_size": len(AVATAR_BYTES),
+            "file_path": f"photos/{file_id}.jpg",
+        }
+
+    def _sendmessage(self, params: dict) -> dict:
+        self._message_id += 1
+        try:
+            chat_id = int(params.get("chat_id") or 0)
+        except ValueError:
+            chat_id = chat_id_for_username(str(params.get("chat_id")))
+        return {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": str(params.get("text") or ""),
+        }
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    api = FakeTelegramAPI(args.latency_ms, args.jitter_ms, args.error_rate)
+    url = await api.start(args.host, args.port)
+    print(f"Fake Bot API listening on {url} (set TELEGRAM_API_URL={url})")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await api.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import hashlib
+import hmac
+import json
+import time
+from typing import Optional
+from urllib.parse import urlencode
+
+
+def sign_init_data(bot_token: str, user: dict, auth_date: Optional[int] = None) -> str:
+    """Build a Mini App initData string signed the same way Telegram signs it."""
+    pairs = {
+        "auth_date": str(auth_date or int(time.time())),
+        "query_id": f"bench{user.get('id')}",
+        "user": json.dumps(user, ensure_ascii=False, separators=(",", ":")),
+    }
+    data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(pairs.items()))
+    secret = hmac.new(b"WebAppData", bot_token.encode("utf-8"), hashlib.sha256).digest()
+    pairs["hash"] = hmac.new(secret, data_check_string.encode("utf-8"), hashlib.sha256).hexdigest()
+    return urlencode(pairs)
+
+
+def synthetic_user(index: int, id_offset: int = 7_000_000_000) -> dict:
+    return {
+        "id": id_offset + index,
+        "username": f"bench_user_{index}",
+        "first_name": f"Bench{index}",
+        "last_name": "User",
+        "language_code": "ru",
+    }
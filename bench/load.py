@@ -0,0 +1,364 @@
+"""
+Load test for the Mini App HTTP API.
+
+Starts main.py in a subprocess against bench.fake_telegram, registers synthetic users
+with signed initData, seeds some feedback, then drives a weighted mix of
+me/profile/insight/search/feedback/avatar requests at fixed concurrency and reports
+RPS and p50/p95/p99 latency per endpoint, plus cache hit rates.
+
+    python -m bench.load --backend sqlite --duration 30 --concurrency 32
+    python -m bench.load --backend sqlite --backend postgres --database-url postgresql://localhost/bench
+    python -m bench.load --processes 4 --shared-cache
+
+--processes runs several app processes on one database, with requests spread over them at
+random; --shared-cache points them all at a bench.fake_cache server (CACHE_URL).
+
+Use a throwaway Postgres database: the run writes synthetic users and votes into it.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+import aiohttp
+
+from app.axes import AXES
+from bench.fake_cache import FakeCacheServer
+from bench.fake_telegram import FakeTelegramAPI
+from bench.initdata import sign_init_data, synthetic_user
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+BENCH_BOT_TOKEN = "123456:BENCH-TOKEN"
+WORKLOADS = ("me", "profile", "insight", "search", "feedback", "avatar")
+DEFAULT_MIX = "me=1,profile=4,insight=2,search=2,feedback=1,avatar=2"
+FEEDBACK_CHOICES = {axis.name: axis.options for axis in AXES}
+CACHE_SAMPLE_RE = re.compile(r'^cache_requests_total\{cache="([^"]+)",result="(hit|miss)"\} (\S+)$', re.MULTILINE)
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    mix: dict[str, float] = {}
+    for part in text.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name not in WORKLOADS:
+            raise argparse.ArgumentTypeError(f"unknown workload {name!r}, expected one of {', '.join(WORKLOADS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class AppProcess:
+    """main.py running in a subprocess in workdir; processes sharing a workdir share its SQLite file."""
+
+    def __init__(self, workdir: Path, port: int, telegram_url: str, database_url: str, cache_url: str = "", name: str = "app"):
+        self.workdir = workdir
+        self.port = port
+        self.base_url = f"http://127.0.0.1:{port}"
+        self.log_path = workdir / f"{name}.log"
+        self.env = dict(
+            os.environ,
+            BOT_TOKEN=BENCH_BOT_TOKEN,
+            PORT=str(port),
+            TELEGRAM_API_URL=telegram_url,
+            DATABASE_URL=database_url,
+            CACHE_URL=cache_url,
+            ADMIN_USERNAME="bench_user_0",
+            MINI_APP_URL="",
+            METRICS_TOKEN="",
+        )
+        self._proc: Optional[subprocess.Popen] = None
+        self._log = None
+
+    def start(self) -> None:
+        self._log = open(self.log_path, "wb")
+        self._proc = subprocess.Popen(
+            [sys.executable, str(REPO_ROOT / "main.py")],
+            cwd=self.workdir,
+            env=self.env,
+            stdout=self._log,
+            stderr=subprocess.STDOUT,
+        )
+
+    async def wait_ready(self, session: aiohttp.ClientSession, timeout: float = 30.0) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._proc is not None and self._proc.poll() is not None:
+                raise RuntimeError(f"app exited with code {self._proc.returncode}, see {self.log_path}")
+            try:
+                # /health answers before the bot and schema are ready; the avatar proxy returns 503 until then.
+                async with session.get(f"{self.base_url}/api/miniapp/avatar", params={"username": "bench_user_0"}) as resp:
+                    if resp.status != 503:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+        raise RuntimeError(f"app did not become ready in {timeout:.0f}s, see {self.log_path}")
+
+    def stop(self) -> None:
+        if self._proc is not None and self._proc.poll() is None:
+            self._proc.terminate()
+            try:
+                self._proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self._proc.kill()
+        if self._log is not None:
+            self._log.close()
+
+    async def cache_counts(self, session: aiohttp.ClientSession) -> dict[str, tuple[float, float]]:
+        """cache name -> (hits, misses) from /metrics."""
+        async with session.get(f"{self.base_url}/metrics") as resp:
+            text = await resp.text()
+        counts: dict[str, list[float]] = {}
+        for name, result, value in CACHE_SAMPLE_RE.findall(text):
+            counts.setdefault(name, [0.0, 0.0])[0 if result == "hit" else 1] = float(value)
+        return {name: (hits, misses) for name, (hits, misses) in counts.items()}
+
+
+class LoadClient:
+    def __init__(self, session: aiohttp.ClientSession, base_urls: list[str], users: list[dict], targets: list[str], seed: int):
+        self.session = session
+        self.base_urls = base_urls
+        self.users = users
+        self.targets = targets
+        self.init_data = {user["id"]: sign_init_data(BENCH_BOT_TOKEN, user) for user in users}
+        self.random = random.Random(seed)
+        # Zipf-like popularity: a few targets get most of the traffic.
+        self.target_weights = [1.0 / (rank + 1) for rank in range(len(targets))]
+
+    def pick_user(self) -> dict:
+        return self.random.choice(self.users)
+
+    def pick_target(self) -> str:
+        return self.random.choices(self.targets, weights=self.target_weights)[0]
+
+    async def call(self, workload: str, user: dict, target: Optional[str] = None) -> int:
+        headers = {"X-Telegram-Init-Data": self.init_data[user["id"]]}
+        target = target or self.pick_target()
+        if workload == "me":
+            method, path, params, body = "GET", "/api/miniapp/me", None, None
+        elif workload == "profile":
+            method, path, params, body = "GET", "/api/miniapp/profile", {"target": target}, None
+        elif workload == "insight":
+            method, path, params, body = "GET", "/api/miniapp/insight", {"target": target}, None
+        elif workload == "search":
+            method, path, params, body = "GET", "/api/miniapp/search-users", {"q": target[1:][: self.random.randint(3, 12)]}, None
+        elif workload == "avatar":
+            method, path, params, body = "GET", "/api/miniapp/avatar", {"username": target.lstrip("@")}, None
+        else:
+            body = {key: self.random.choice(values) for key, values in FEEDBACK_CHOICES.items()}
+            body["target"] = target
+            method, path, params = "POST", "/api/miniapp/feedback", None
+        base_url = self.random.choice(self.base_urls)
+        async with self.session.request(method, base_url + path, params=params, json=body, headers=headers) as resp:
+            await resp.read()
+            return resp.status
+
+
+async def seed_data(client: LoadClient, votes_per_user: int, concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def register(user: dict) -> None:
+        async with semaphore:
+            await client.call("me", user)
+
+    async def vote(user: dict) -> None:
+        async with semaphore:
+            for target in client.random.sample(client.targets, min(votes_per_user, len(client.targets))):
+                if target.lstrip("@") != user["username"]:
+                    await client.call("feedback", user, target)
+
+    await asyncio.gather(*(register(user) for user in client.users))
+    await asyncio.gather(*(vote(user) for user in client.users))
+
+
+async def run_workload(
+    client: LoadClient,
+    mix: dict[str, float],
+    concurrency: int,
+    duration: float,
+) -> tuple[dict[str, list[tuple[float, int]]], float]:
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    samples: dict[str, list[tuple[float, int]]] = {name: [] for name in names}
+    deadline = time.monotonic() + duration
+
+    async def worker() -> None:
+        while time.monotonic() < deadline:
+            workload = client.random.choices(names, weights=weights)[0]
+            started = time.perf_counter()
+            try:
+                status = await client.call(workload, client.pick_user())
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                status = 0
+            samples[workload].append((time.perf_counter() - started, status))
+
+    started = time.monotonic()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, time.monotonic() - started
+
+
+def summarize(samples: dict[str, list[tuple[float, int]]], elapsed: float) -> dict[str, dict]:
+    summary: dict[str, dict] = {}
+    for name, items in samples.items():
+        latencies = sorted(seconds * 1000 for seconds, _ in items)
+        statuses: dict[str, int] = {}
+        for _, status in items:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        summary[name] = {
+            "requests": len(items),
+            "rps": round(len(items) / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "statuses": statuses,
+        }
+    return summary
+
+
+def cache_hit_rates(counts: list[dict[str, tuple[float, float]]]) -> dict[str, dict]:
+    """Hits and misses summed over processes, with the hit rate."""
+    totals: dict[str, list[float]] = {}
+    for process_counts in counts:
+        for name, (hits, misses) in process_counts.items():
+            total = totals.setdefault(name, [0.0, 0.0])
+            total[0] += hits
+            total[1] += misses
+    return {
+        name: {"hits": int(hits), "misses": int(misses), "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None}
+        for name, (hits, misses) in sorted(totals.items())
+    }
+
+
+def print_report(backend: str, summary: dict[str, dict]) -> None:
+    print(f"\n== {backend} ==")
+    print(f"{'endpoint':<10} {'requests':>9} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  statuses")
+    for name, row in summary.items():
+        statuses = " ".join(f"{code}:{count}" for code, count in sorted(row["statuses"].items()))
+        print(
+            f"{name:<10} {row['requests']:>9} {row['rps']:>9.1f} "
+            f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f}  {statuses}"
+        )
+
+
+async def run_backend(backend: str, database_url: str, args: argparse.Namespace) -> dict:
+    fake = FakeTelegramAPI(args.tg_latency_ms, args.tg_jitter_ms, args.tg_error_rate, seed=args.seed)
+    telegram_url = await fake.start(port=free_port())
+    cache_server = FakeCacheServer() if args.shared_cache else None
+    cache_url = await cache_server.start(port=free_port()) if cache_server is not None else ""
+    workdir = Path(tempfile.mkdtemp(prefix=f"bench-{backend}-"))
+    apps = [
+        AppProcess(workdir, free_port(), telegram_url, database_url, cache_url, name=f"app{i}")
+        for i in range(args.processes)
+    ]
+    users = [synthetic_user(i) for i in range(args.users)]
+    targets = [f"@{user['username']}" for user in users[: args.targets]]
+    timeout = aiohttp.ClientTimeout(total=30)
+    connector = aiohttp.TCPConnector(limit=max(args.concurrency, 8))
+    # The first process creates the schema; the rest start once it is ready.
+    apps[0].start()
+    try:
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            await apps[0].wait_ready(session)
+            for app in apps[1:]:
+                app.start()
+            for app in apps[1:]:
+                await app.wait_ready(session)
+            client = LoadClient(session, [app.base_url for app in apps], users, targets, args.seed)
+            if not args.skip_seed:
+                await seed_data(client, args.votes_per_user, args.concurrency)
+            before = [await app.cache_counts(session) for app in apps]
+            samples, elapsed = await run_workload(client, args.mix, args.concurrency, args.duration)
+            after = [await app.cache_counts(session) for app in apps]
+    finally:
+        for app in apps:
+            app.stop()
+        await fake.stop()
+        if cache_server is not None:
+            await cache_server.stop()
+    summary = summarize(samples, elapsed)
+    print_report(backend, summary)
+    # Only the measured run: seeding is all first lookups.
+    caches = cache_hit_rates(
+        [
+            {name: (hits - start.get(name, (0, 0))[0], misses - start.get(name, (0, 0))[1]) for name, (hits, misses) in end.items()}
+            for start, end in zip(before, after)
+        ]
+    )
+    total = sum(row["requests"] for row in summary.values())
+    print(f"total: {total} requests in {elapsed:.1f}s ({total / elapsed:.1f} rps) over {len(apps)} process(es); logs in {workdir}")
+    print("cache hit rates:", {name: row["hit_rate"] for name, row in caches.items()})
+    print("fake Bot API calls:", dict(fake.calls), "injected errors:", dict(fake.errors))
+    if cache_server is not None:
+        print(f"cache server: {len(cache_server)} keys, commands:", dict(cache_server.commands))
+    return {
+        "elapsed_seconds": round(elapsed, 2),
+        "processes": len(apps),
+        "shared_cache": bool(cache_url),
+        "endpoints": summary,
+        "caches": caches,
+        "telegram_calls": dict(fake.calls),
+        "telegram_errors": dict(fake.errors),
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Load test the Mini App API against a fake Bot API.")
+    parser.add_argument("--backend", action="append", choices=("sqlite", "postgres"), help="repeatable, default sqlite")
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL", ""), help="Postgres URL for --backend postgres")
+    parser.add_argument("--users", type=int, default=2000, help="synthetic Mini App users")
+    parser.add_argument("--targets", type=int, default=200, help="how many of the users are looked up / voted for")
+    parser.add_argument("--votes-per-user", type=int, default=3, help="feedback submitted per user while seeding")
+    parser.add_argument("--skip-seed", action="store_true", help="reuse data already in the database")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--processes", type=int, default=1, help="app processes sharing the database")
+    parser.add_argument("--shared-cache", action="store_true", help="point every process at one bench.fake_cache server")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of measured load per backend")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f"default {DEFAULT_MIX}")
+    parser.add_argument("--tg-latency-ms", type=float, default=50.0)
+    parser.add_argument("--tg-jitter-ms", type=float, default=20.0)
+    parser.add_argument("--tg-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", dest="json_path", help="write results to this file")
+    return parser
+
+
+async def _run(args: argparse.Namespace) -> dict:
+    results = {}
+    for backend in args.backend or ["sqlite"]:
+        if backend == "postgres" and not args.database_url:
+            print("skipping postgres: pass --database-url or set BENCH_DATABASE_URL")
+            continue
+        results[backend] = await run_backend(backend, args.database_url if backend == "postgres" else "", args)
+    return results
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    results = asyncio.run(_run(args))
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Micro-benchmarks for the public db functions, run against a database filled by bench.dataset.
+
+Read functions are timed for a celebrity target, a mid-table target and a long-tail one.
+Write functions use ids outside the generated range, but still change the data: point it
+at a throwaway database.
+
+    python -m bench.micro --sqlite bench.sqlite3 --output micro.json
+    python -m bench.micro --database-url postgresql://localhost/bench --only get_contact_dimensions
+
+The JSON holds per-benchmark mean/p50/p95/min milliseconds and SQL statements per call.
+"""
+
+import argparse
+import itertools
+import json
+import platform
+import statistics
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Optional
+
+from bench.dataset import VOTE_AXES, load_db
+from bench.initdata import synthetic_user
+
+# Ids for rows created by write benchmarks; far above anything bench.dataset generates.
+WRITE_ID_BASE = 9_000_000_000
+
+
+def _target(rank: int) -> tuple[str, int]:
+    user = synthetic_user(rank)
+    return f"@{user['username']}", user["id"]
+
+
+def build_benchmarks(db, users: int) -> dict[str, Callable[[], object]]:
+    """Benchmark name -> zero-argument callable making one db call."""
+    ranks = {"celebrity": 0, "mid": min(users - 1, 100), "tail": max(0, users - 10)}
+    benchmarks: dict[str, Callable[[], object]] = {}
+    for label, rank in ranks.items():
+        target, target_id = _target(rank)
+        benchmarks[f"get_contact_dimensions[{label}]"] = lambda t=target, i=target_id: db.get_contact_dimensions(t, i)
+        benchmarks[f"get_total[{label}]"] = lambda t=target, i=target_id: db.get_total(t, i)
+        benchmarks[f"count_ref_visitors[{label}]"] = lambda t=target, i=target_id: db.count_ref_visitors(t, i)
+        benchmarks[f"count_ref_answerers[{label}]"] = lambda t=target, i=target_id: db.count_ref_answerers(t, i)
+
+    target, target_id = _target(ranks["mid"])
+    benchmarks["get_user_id_by_username"] = lambda: db.get_user_id_by_username(target)
+    benchmarks["get_user_public_by_username"] = lambda: db.get_user_public_by_username(target)
+    benchmarks["get_username_by_user_id"] = lambda: db.get_username_by_user_id(target_id)
+    benchmarks["get_profile_note"] = lambda: db.get_profile_note(target_id)
+    benchmarks["count_pushes_today"] = lambda: db.count_pushes_today(_target(0)[1])
+    benchmarks["search_users[prefix]"] = lambda: db.search_users("bench_user_1", 20)
+    benchmarks["search_users[miss]"] = lambda: db.search_users("nobody_here", 20)
+    benchmarks["list_users_page"] = lambda: db.list_users_page(50, None)
+    benchmarks["count_users"] = db.count_users
+    benchmarks["count_votes"] = db.count_votes
+    benchmarks["top_voters"] = lambda: db.top_voters(10)
+    benchmarks["top_targets"] = lambda: db.top_targets(10)
+
+    write_ids = itertools.count(WRITE_ID_BASE)
+    answers = {axis: left for axis, left, _ in VOTE_AXES}
+    celebrity, celebrity_id = _target(0)
+
+    def add_vote() -> object:
+        return db.add_vote(celebrity, "feedback", next(write_ids), celebrity_id, answers)
+
+    def upsert_new_user() -> object:
+        user_id = next(write_ids)
+        return db.upsert_user_with_flag(user_id, f"@bench_write_{user_id}", "Bench", "Write", "")
+
+    def upsert_existing_user() -> object:
+        return db.upsert_user_with_flag(target_id, target, "Bench", "User", "")
+
+    def upsert_users_batch() -> object:
+        rows = []
+        for _ in range(50):
+            user_id = next(write_ids)
+            rows.append((user_id, f"@bench_write_{user_id}", "Bench", "Write", "", False))
+        return db.upsert_users_batch(rows)
+
+    benchmarks["add_vote"] = add_vote
+    benchmarks["upsert_user_with_flag[new]"] = upsert_new_user
+    benchmarks["upsert_user_with_flag[existing]"] = upsert_existing_user
+    benchmarks["upsert_users_batch[50]"] = upsert_users_batch
+    benchmarks["add_ref_visit"] = lambda: db.add_ref_visit(celebrity, next(write_ids), celebrity_id)
+    benchmarks["add_push_event"] = lambda: db.add_push_event(next(write_ids), "bench")
+    benchmarks["set_profile_note"] = lambda: db.set_profile_note(target_id, "Заметка из бенчмарка")
+    return benchmarks
+
+
+def run_benchmark(db, func: Callable[[], object], iterations: int, warmup: int, max_seconds: float) -> dict:
+    for _ in range(warmup):
+        func()
+    timings: list[float] = []
+    queries = 0
+    deadline = time.perf_counter() + max_seconds
+    for _ in range(iterations):
+        token = db.start_query_stats()
+        started = time.perf_counter()
+        try:
+            func()
+        finally:
+            timings.append(time.perf_counter() - started)
+            queries += db.get_query_stats().count
+            db.stop_query_stats(token)
+        if time.perf_counter() > deadline:
+            break
+    timings.sort()
+    millis = [seconds * 1000 for seconds in timings]
+    return {
+        "iterations": len(millis),
+        "mean_ms": round(statistics.fmean(millis), 4),
+        "p50_ms": round(millis[len(millis) // 2], 4),
+        "p95_ms": round(millis[min(len(millis) - 1, int(len(millis) * 0.95))], 4),
+        "min_ms": round(millis[0], 4),
+        "queries_per_call": round(queries / len(millis), 2),
+    }
+
+
+def table_counts(db) -> dict[str, int]:
+    conn = db._get_pg_conn() if db.USE_POSTGRES else db._get_sqlite_conn()
+    try:
+        return {
+            table: int(conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0])
+            for table in ("users", "votes", "ref_visits", "push_events", "profile_prefs")
+        }
+    finally:
+        conn.close()
+
+
+def main(argv: Optional[list[str]] = None) -> dict:
+    parser = argparse.ArgumentParser(description="Time each public db function.")
+    parser.add_argument("--database-url", default="", help="Postgres URL; SQLite is used when empty")
+    parser.add_argument("--sqlite", default="bench.sqlite3")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=10.0, help="time cap per benchmark")
+    parser.add_argument("--only", action="append", help="substring filter on benchmark names, repeatable")
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    if not args.database_url and not Path(args.sqlite).exists():
+        raise SystemExit(f"{args.sqlite} not found; generate it with python -m bench.dataset first")
+    db = load_db(args.database_url, None if args.database_url else args.sqlite)
+    db.init_db()
+    counts = table_counts(db)
+    benchmarks = build_benchmarks(db, counts["users"])
+
+    results: dict[str, dict] = {}
+    print(f"{'benchmark':<40} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8}")
+    for name, func in benchmarks.items():
+        if args.only and not any(part in name for part in args.only):
+            continue
+        row = run_benchmark(db, func, args.iterations, args.warmup, args.max_seconds)
+        results[name] = row
+        print(f"{name:<40} {row['mean_ms']:>9.3f} {row['p50_ms']:>9.3f} {row['p95_ms']:>9.3f} {row['queries_per_call']:>8}")
+
+    report = {
+        "meta": {
+            "backend": "postgres" if db.USE_POSTGRES else "sqlite",
+            "rows": counts,
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+        },
+        "results": results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    return report
+
+
+if __name__ == "__main__":
+    main()
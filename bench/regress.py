@@ -0,0 +1,185 @@
+"""
+Performance regression gate for the hot paths.
+
+Times build_profile_payload, build_contact_insight_text, verify_telegram_init_data,
+add_vote and the main Mini App routes (through the Flask test client) on a fixed synthetic
+dataset, compares the medians with a stored baseline and exits with 1 when any of them is
+slower than the tolerance allows.
+
+    python -m bench.regress --save           # record the baseline (before your change)
+    python -m bench.regress                  # compare (after your change)
+    python -m bench.regress --compare micro.json --baseline micro-before.json
+
+Baselines are machine specific; record and compare on the same host.
+"""
+
+import argparse
+import importlib
+import itertools
+import json
+import logging
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import Callable, Optional
+
+from bench.dataset import VOTE_AXES, DatasetGenerator, load_db
+from bench.initdata import sign_init_data, synthetic_user
+from bench.micro import WRITE_ID_BASE, run_benchmark
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent.parent / ".bench-baseline.json"
+REGRESS_BOT_TOKEN = "123456:REGRESS-TOKEN"
+DATASET_VOTES = 20000
+DATASET_SEED = 7
+
+
+def _target(rank: int) -> tuple[str, int]:
+    user = synthetic_user(rank)
+    return f"@{user['username']}", user["id"]
+
+
+def build_benchmarks(db) -> dict[str, Callable[[], object]]:
+    os.environ["BOT_TOKEN"] = REGRESS_BOT_TOKEN
+    profile = importlib.import_module("app.profile")
+    webapp_auth = importlib.import_module("app.webapp_auth")
+    main = importlib.import_module("main")
+    # Measure the handlers, not the per-user token buckets or cached payloads.
+    main.RATE_LIMITER.budgets = {}
+    main.PAYLOADS.fresh_seconds = 0
+    client = main.health_app.test_client()
+
+    celebrity, celebrity_id = _target(0)
+    tail, _ = _target(900)
+    viewer = synthetic_user(1)
+    viewer_init_data = sign_init_data(REGRESS_BOT_TOKEN, viewer)
+    headers = {"X-Telegram-Init-Data": viewer_init_data}
+    write_ids = itertools.count(WRITE_ID_BASE)
+    answers = {axis: left for axis, left, _ in VOTE_AXES}
+
+    def verify_cold() -> object:
+        webapp_auth.INIT_DATA_CACHE.discard(viewer_init_data)
+        return webapp_auth.verify_telegram_init_data(viewer_init_data, REGRESS_BOT_TOKEN, 86400)
+
+    def get(path: str, **params: str) -> Callable[[], object]:
+        def call() -> object:
+            resp = client.get(path, query_string=params, headers=headers)
+            if resp.status_code != 200:
+                raise RuntimeError(f"{path} returned {resp.status_code}")
+            return resp
+
+        return call
+
+    return {
+        "build_profile_payload[celebrity]": lambda: profile.build_profile_payload(celebrity),
+        "build_profile_payload[tail]": lambda: profile.build_profile_payload(tail),
+        "build_contact_insight_text[celebrity]": lambda: profile.build_contact_insight_text(celebrity),
+        "build_contact_insight_text[tail]": lambda: profile.build_contact_insight_text(tail),
+        "verify_telegram_init_data[cold]": verify_cold,
+        "verify_telegram_init_data[cached]": lambda: webapp_auth.verify_telegram_init_data(
+            viewer_init_data, REGRESS_BOT_TOKEN, 86400
+        ),
+        "add_vote": lambda: db.add_vote(celebrity, "feedback", next(write_ids), celebrity_id, answers),
+        "GET /api/miniapp/me": get("/api/miniapp/me"),
+        "GET /api/miniapp/profile": get("/api/miniapp/profile", target=celebrity),
+        "GET /api/miniapp/insight": get("/api/miniapp/insight", target=celebrity),
+        "GET /api/miniapp/search-users": get("/api/miniapp/search-users", q="bench_user_1"),
+    }
+
+
+def compare(baseline: dict, current: dict, tolerance: float, min_delta_ms: float) -> tuple[list[tuple], bool]:
+    """Rows of (name, baseline p50, current p50, change, status) and whether anything regressed."""
+    rows: list[tuple] = []
+    failed = False
+    for name in sorted(set(baseline) | set(current)):
+        before = baseline.get(name, {}).get("p50_ms")
+        after = current.get(name, {}).get("p50_ms")
+        if before is None:
+            rows.append((name, None, after, None, "new"))
+            continue
+        if after is None:
+            rows.append((name, before, None, None, "missing"))
+            continue
+        change = (after - before) / before if before else 0.0
+        if change > tolerance and after - before > min_delta_ms:
+            status = "REGRESSION"
+            failed = True
+        elif change < -tolerance:
+            status = "faster"
+        else:
+            status = "ok"
+        rows.append((name, before, after, change, status))
+    return rows, failed
+
+
+def print_table(rows: list[tuple], tolerance: float) -> None:
+    print(f"{'benchmark':<42} {'base ms':>10} {'now ms':>10} {'change':>9}  status (tolerance {tolerance:+.0%})")
+    for name, before, after, change, status in rows:
+        before_text = f"{before:.3f}" if before is not None else "-"
+        after_text = f"{after:.3f}" if after is not None else "-"
+        change_text = f"{change:+.1%}" if change is not None else "-"
+        print(f"{name:<42} {before_text:>10} {after_text:>10} {change_text:>9}  {status}")
+
+
+def measure(args: argparse.Namespace) -> dict:
+    if args.database_url:
+        db = load_db(args.database_url)
+    else:
+        workdir = Path(tempfile.mkdtemp(prefix="bench-regress-"))
+        db = load_db("", str(workdir / "regress.sqlite3"))
+        # The same seed and size every run, so timings are comparable between runs.
+        with open(os.devnull, "w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                DatasetGenerator(db, DATASET_VOTES, seed=DATASET_SEED).generate()
+            finally:
+                sys.stdout = stdout
+    db.init_db()
+    logging.disable(logging.WARNING)
+    results = {}
+    for name, func in build_benchmarks(db).items():
+        if args.only and not any(part in name for part in args.only):
+            continue
+        results[name] = run_benchmark(db, func, args.iterations, args.warmup, args.max_seconds)
+    logging.disable(logging.NOTSET)
+    return {"meta": {"backend": "postgres" if db.USE_POSTGRES else "sqlite", "votes": DATASET_VOTES}, "results": results}
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare hot path timings with a stored baseline.")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="store the measured timings as the new baseline")
+    parser.add_argument("--compare", type=Path, help="compare an existing results JSON (e.g. bench.micro output) instead of measuring")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed slowdown of the median, 0.3 = 30%%")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05, help="ignore slowdowns smaller than this")
+    parser.add_argument("--database-url", default="", help="measure on this Postgres instead of a generated SQLite file")
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=5.0)
+    parser.add_argument("--only", action="append", help="substring filter on benchmark names, repeatable")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        report = json.loads(args.compare.read_text(encoding="utf-8"))
+    else:
+        report = measure(args)
+
+    if args.save:
+        args.baseline.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"baseline with {len(report['results'])} benchmarks saved to {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print(f"no baseline at {args.baseline}; record one with --save", file=sys.stderr)
+        return 2
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    rows, failed = compare(baseline["results"], report["results"], args.tolerance, args.min_delta_ms)
+    print_table(rows, args.tolerance)
+    if failed:
+        print("\nperformance regression: medians above tolerance", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
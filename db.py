@@ -1,753 +1,2203 @@
+import contextvars
+import functools
+import inspect
+import json
 import logging
 import os
+import re
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Callable, List, Mapping, Optional, Sequence, Tuple
+
+from app.axes import AXES, AXIS_NAMES, COUNT_VECTOR_SIZE, answer_values, counts_to_dimensions, encode_answers, mask_vector
+from app.views import ViewerSketch
 
 DB_PATH = Path("data.sqlite3")
 DATABASE_URL = os.getenv("DATABASE_URL", "").strip()
 USE_POSTGRES = DATABASE_URL.lower().startswith("postgres")
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+# Postgres only: init_db converts votes and push_events to monthly range partitions once.
+DB_PARTITIONING = os.getenv("DB_PARTITIONING", "").strip().lower() in ("1", "true", "yes")
+VOTES_HOT_MONTHS = max(1, int(os.getenv("VOTES_HOT_MONTHS", "6")))
+PUSH_EVENTS_RETENTION_MONTHS = max(1, int(os.getenv("PUSH_EVENTS_RETENTION_MONTHS", "2")))
+# Postgres only: comma-separated replica URLs for read-only functions (see ReadRouter).
+DATABASE_READ_URLS = tuple(url.strip() for url in os.getenv("DATABASE_READ_URLS", "").split(",") if url.strip())
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "5"))
+READ_YOUR_WRITES_SECONDS = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "10"))
+BREAKER_FAILURES = max(1, int(os.getenv("DB_BREAKER_FAILURES", "5")))
+BREAKER_RESET_SECONDS = float(os.getenv("DB_BREAKER_RESET_SECONDS", "10"))
 
 if USE_POSTGRES:
     import psycopg
 
 
+class QueryStats:
+    """Queries issued within one context (e.g. one HTTP request)."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.by_function: dict[str, int] = {}
+        self.by_fingerprint: dict[tuple[str, str], int] = {}
+
+    def add(self, record: dict) -> None:
+        self.count += 1
+        self.seconds += record["seconds"]
+        function = record["function"]
+        self.by_function[function] = self.by_function.get(function, 0) + 1
+        key = (function, record["fingerprint"])
+        self.by_fingerprint[key] = self.by_fingerprint.get(key, 0) + 1
+
+    def repeated(self, min_count: int = 2) -> List[Tuple[str, str, int]]:
+        items = [(fn, fp, n) for (fn, fp), n in self.by_fingerprint.items() if n >= min_count]
+        return sorted(items, key=lambda item: -item[2])
+
+
+_CURRENT_FUNCTION: contextvars.ContextVar[str] = contextvars.ContextVar("db_function", default="-")
+_QUERY_STATS: contextvars.ContextVar[Optional[QueryStats]] = contextvars.ContextVar("db_query_stats", default=None)
+_QUERY_OBSERVERS: List[Callable[[dict], None]] = []
+_FINGERPRINT_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_FINGERPRINT_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+# Failed statements, connects and circuit rejections in the current context (thread or task).
+_CONTEXT_FAILURES: contextvars.ContextVar[int] = contextvars.ContextVar("db_failures", default=0)
+
+
+def failures_in_context() -> int:
+    """
+    Database failures seen by db calls of the current thread or task so far. db functions return
+    defaults instead of raising; a caller compares this before and after to tell whether its
+    own calls fell back.
+    """
+    return _CONTEXT_FAILURES.get()
+
+
+def _note_failure() -> None:
+    _CONTEXT_FAILURES.set(_CONTEXT_FAILURES.get() + 1)
+
+
+def start_query_stats() -> contextvars.Token:
+    return _QUERY_STATS.set(QueryStats())
+
+
+def get_query_stats() -> Optional[QueryStats]:
+    return _QUERY_STATS.get()
+
+
+def stop_query_stats(token: contextvars.Token) -> None:
+    _QUERY_STATS.reset(token)
+
+
+def add_query_observer(observer: Callable[[dict], None]) -> None:
+    """Register observer(record) for every executed statement."""
+    _QUERY_OBSERVERS.append(observer)
+
+
+def sql_fingerprint(sql: str) -> str:
+    text = " ".join(sql.split()).replace("%s", "?")
+    text = _FINGERPRINT_LITERALS.sub("?", text)
+    return _FINGERPRINT_LISTS.sub("(...)", text)
+
+
+def _param_count(params) -> int:
+    if params is None:
+        return 0
+    try:
+        return len(params)
+    except TypeError:
+        return 0
+
+
+def _record_query(conn, sql: str, params, seconds: float, rows: Optional[int]) -> None:
+    record = {
+        "function": _CURRENT_FUNCTION.get(),
+        "fingerprint": sql_fingerprint(sql),
+        "params": _param_count(params),
+        "rows": rows,
+        "seconds": seconds,
+    }
+    stats = _QUERY_STATS.get()
+    if stats is not None:
+        stats.add(record)
+    for observer in _QUERY_OBSERVERS:
+        try:
+            observer(record)
+        except Exception:
+            pass
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        logging.warning(
+            "Slow query %.1fms in %s (params=%d rows=%s): %s%s",
+            seconds * 1000,
+            record["function"],
+            record["params"],
+            rows,
+            record["fingerprint"],
+            _explain(conn, sql, params),
+        )
+
+
+def _explain(conn, sql: str, params) -> str:
+    head = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ""
+    if head not in ("SELECT", "WITH"):
+        return ""
+    try:
+        if USE_POSTGRES:
+            # A savepoint: a failing EXPLAIN must not abort the caller's transaction.
+            with conn.transaction(), psycopg.Cursor(conn) as cur:
+                cur.execute("EXPLAIN " + sql, params)
+                plan = [str(row[0]) for row in cur.fetchall()]
+        else:
+            cur = sqlite3.Cursor(conn)
+            cur.execute("EXPLAIN QUERY PLAN " + sql, params or ())
+            plan = [str(row[-1]) for row in cur.fetchall()]
+    except Exception as exc:
+        return f"\nplan unavailable: {exc}"
+    return "\nplan:\n  " + "\n  ".join(plan)
+
+
+class _TracedSqliteCursor(sqlite3.Cursor):
+    # Only execute() is timed: sqlite steps to the first row there, and the rest is read
+    # lazily by the caller, so result sets stream instead of being buffered for tracing.
+    # Their row count is unknown at that point and is recorded as None.
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        super().execute(sql, parameters)
+        rows = self.rowcount if self.description is None else None
+        _record_query(self.connection, sql, parameters, time.perf_counter() - started, rows)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        _record_query(self.connection, sql, None, time.perf_counter() - started, self.rowcount)
+        return self
+
+
+class _TracedSqliteConnection(sqlite3.Connection):
+    def cursor(self, factory=_TracedSqliteCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+class DatabaseUnavailable(Exception):
+    """Raised instead of connecting while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Shared by every primary Postgres connection. After failure_threshold consecutive failures
+    (connect errors, lost connections, statement timeouts) it opens and connects fail fast with
+    DatabaseUnavailable. Once reset_seconds have passed one caller is let through as a probe:
+    a successful connect closes the breaker, a failure opens it for another reset_seconds.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.rejected = 0
+        self.trips = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._probing or time.monotonic() - self._opened_at >= self.reset_seconds:
+                return "half_open"
+            return "open"
+
+    def available(self) -> bool:
+        """False while calls would be rejected; True when closed or a probe is due."""
+        return self.state != "open"
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if not self._probing and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self._probing = True
+                return
+            self.rejected += 1
+        raise DatabaseUnavailable("database unavailable (circuit open)")
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._opened_at is not None:
+                logging.warning("DB circuit closed")
+            self.failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._probing or (self._opened_at is None and self.failures >= self.failure_threshold):
+                if self._opened_at is None:
+                    self.trips += 1
+                    logging.warning("DB circuit opened after %d failures", self.failures)
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+DB_BREAKER = CircuitBreaker(BREAKER_FAILURES, BREAKER_RESET_SECONDS)
+
+
+def database_available() -> bool:
+    return DB_BREAKER.available()
+
+
+if USE_POSTGRES:
+
+    class _TracedPgCursor(psycopg.Cursor):
+        breaker: Optional[CircuitBreaker] = DB_BREAKER
+
+        def execute(self, query, params=None, **kwargs):
+            started = time.perf_counter()
+            try:
+                super().execute(query, params, **kwargs)
+            except psycopg.Error as exc:
+                _note_failure()
+                if self.breaker and isinstance(exc, psycopg.OperationalError):
+                    self.breaker.record_failure()
+                raise
+            _record_query(self.connection, str(query), params, time.perf_counter() - started, self.rowcount)
+            return self
+
+        def executemany(self, query, params_seq, **kwargs):
+            started = time.perf_counter()
+            try:
+                super().executemany(query, params_seq, **kwargs)
+            except psycopg.Error as exc:
+                _note_failure()
+                if self.breaker and isinstance(exc, psycopg.OperationalError):
+                    self.breaker.record_failure()
+                raise
+            _record_query(self.connection, str(query), None, time.perf_counter() - started, self.rowcount)
+
+    class _TracedReplicaCursor(_TracedPgCursor):
+        # Replica health is tracked by ReadRouter, not by the primary's breaker.
+        breaker = None
+
+
 def _get_sqlite_conn() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, factory=_TracedSqliteConnection)
     return conn
 
 
 def _get_pg_conn():
-    return psycopg.connect(DATABASE_URL, connect_timeout=2)
+    try:
+        DB_BREAKER.before_call()
+    except DatabaseUnavailable:
+        _note_failure()
+        raise
+    try:
+        conn = psycopg.connect(DATABASE_URL, connect_timeout=2, cursor_factory=_TracedPgCursor)
+    except psycopg.OperationalError:
+        _note_failure()
+        DB_BREAKER.record_failure()
+        raise
+    DB_BREAKER.record_success()
+    return conn
+
+
+class ReadRouter:
+    """
+    Connections for read-only functions: replicas round-robin, or the primary when no replica
+    is healthy or the read touches a key written in the last sticky_seconds (read-your-writes).
+    A replica that fails to connect is skipped for retry_seconds; replication lag is checked
+    every check_seconds and a replica further behind than max_lag_seconds is skipped too.
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        max_lag_seconds: float,
+        sticky_seconds: float,
+        check_seconds: float = 10.0,
+        retry_seconds: float = 30.0,
+        max_sticky_keys: int = 100000,
+    ):
+        self.urls = tuple(urls)
+        self.max_lag_seconds = max_lag_seconds
+        self.sticky_seconds = sticky_seconds
+        self.check_seconds = check_seconds
+        self.retry_seconds = retry_seconds
+        self.max_sticky_keys = max_sticky_keys
+        self._lock = threading.Lock()
+        self._turn = 0
+        self._down_until: dict[str, float] = {}
+        self._checked_at: dict[str, float] = {}
+        # key -> monotonic deadline, oldest first: every write pushes its keys to the end.
+        self._written: OrderedDict = OrderedDict()
+
+    @staticmethod
+    def _key(key):
+        return key.lower() if isinstance(key, str) else key
+
+    def mark_written(self, *keys) -> None:
+        if not self.urls:
+            return
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                if key is None:
+                    continue
+                key = self._key(key)
+                self._written.pop(key, None)
+                self._written[key] = now + self.sticky_seconds
+            while self._written and (len(self._written) > self.max_sticky_keys or next(iter(self._written.values())) <= now):
+                self._written.popitem(last=False)
+
+    def _sticky(self, keys) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            return any(self._written.get(self._key(key), 0.0) > now for key in keys if key is not None)
+
+    def _candidates(self) -> list[str]:
+        now = time.monotonic()
+        with self._lock:
+            start = self._turn
+            self._turn = (self._turn + 1) % len(self.urls)
+            ordered = self.urls[start:] + self.urls[:start]
+            return [url for url in ordered if self._down_until.get(url, 0.0) <= now]
+
+    def _mark_down(self, url: str, reason) -> None:
+        with self._lock:
+            self._down_until[url] = time.monotonic() + self.retry_seconds
+        logging.warning("DB replica %s skipped for %.0fs: %s", _redact_url(url), self.retry_seconds, reason)
+
+    def _lagging(self, conn, url: str) -> bool:
+        now = time.monotonic()
+        if now - self._checked_at.get(url, float("-inf")) < self.check_seconds:
+            return False
+        self._checked_at[url] = now
+        row = conn.execute(
+            """
+            SELECT CASE
+                WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+            END
+            """
+        ).fetchone()
+        lag = float(row[0] or 0)
+        if lag > self.max_lag_seconds:
+            self._mark_down(url, f"replication lag {lag:.1f}s")
+            return True
+        return False
+
+    def connect(self, *keys):
+        """A connection for a read of keys (targets, usernames, user ids); falls back to the primary."""
+        if not self.urls or self._sticky(keys):
+            return _get_pg_conn()
+        for url in self._candidates():
+            try:
+                conn = psycopg.connect(url, connect_timeout=2, cursor_factory=_TracedReplicaCursor)
+            except Exception as exc:
+                self._mark_down(url, exc)
+                continue
+            try:
+                lagging = self._lagging(conn, url)
+            except Exception as exc:
+                conn.close()
+                self._mark_down(url, exc)
+                continue
+            if lagging:
+                conn.close()
+                continue
+            return conn
+        return _get_pg_conn()
+
+
+def _redact_url(url: str) -> str:
+    return re.sub(r"//[^@/]*@", "//***@", url)
+
+
+READ_ROUTER = ReadRouter(DATABASE_READ_URLS if USE_POSTGRES else (), REPLICA_MAX_LAG_SECONDS, READ_YOUR_WRITES_SECONDS)
+
+
+def _get_pg_read_conn(*keys):
+    return READ_ROUTER.connect(*keys)
+
+
+_WRITE_OBSERVERS: List[Callable[[tuple], None]] = []
+
+
+def add_write_observer(observer: Callable[[tuple], None]) -> None:
+    """Register observer(keys) for committed writes; keys are the user ids and targets the write touched."""
+    _WRITE_OBSERVERS.append(observer)
+
+
+def _written(*keys) -> None:
+    READ_ROUTER.mark_written(*keys)
+    keys = tuple(key for key in keys if key is not None)
+    for observer in _WRITE_OBSERVERS:
+        try:
+            observer(keys)
+        except Exception:
+            pass
+
+
+SCHEMA_LOCK_ID = 7240528
+VOTE_ANSWER_DEFAULTS = tuple((axis.name, axis.default) for axis in AXES)
+
+
+def _sql_types() -> tuple[str, str]:
+    if USE_POSTGRES:
+        return "SERIAL PRIMARY KEY", "BIGINT"
+    return "INTEGER PRIMARY KEY AUTOINCREMENT", "INTEGER"
+
+
+def _add_column(conn, table: str, column: str, decl: str) -> None:
+    if USE_POSTGRES:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {decl}")
+        return
+    existing = {str(row[1]) for row in conn.execute(f"PRAGMA table_info({table})").fetchall()}
+    if column not in existing:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def _migration_base_schema(conn) -> None:
+    serial, bigint = _sql_types()
+    answer_columns = ",\n".join(f"{column} TEXT DEFAULT '{default}'" for column, default in VOTE_ANSWER_DEFAULTS)
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS votes (
+            id {serial},
+            target TEXT NOT NULL,
+            label TEXT NOT NULL,
+            {answer_columns},
+            voter_id {bigint},
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    for column, default in VOTE_ANSWER_DEFAULTS:
+        _add_column(conn, "votes", column, f"TEXT DEFAULT '{default}'")
+    _add_column(conn, "votes", "target_user_id", bigint)
+
+    app_user_decl = "BOOLEAN DEFAULT TRUE" if USE_POSTGRES else "INTEGER DEFAULT 1"
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id {bigint} PRIMARY KEY,
+            username TEXT NOT NULL UNIQUE,
+            first_name TEXT DEFAULT '',
+            last_name TEXT DEFAULT '',
+            photo_url TEXT DEFAULT '',
+            app_user {app_user_decl},
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    _add_column(conn, "users", "first_name", "TEXT DEFAULT ''")
+    _add_column(conn, "users", "last_name", "TEXT DEFAULT ''")
+    _add_column(conn, "users", "photo_url", "TEXT DEFAULT ''")
+    _add_column(conn, "users", "app_user", app_user_decl)
+
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS ref_visits (
+            id {serial},
+            target TEXT NOT NULL,
+            visitor_id {bigint} NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    _add_column(conn, "ref_visits", "target_user_id", bigint)
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS seen_hints (
+            target TEXT NOT NULL,
+            watcher_id {bigint} NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (target, watcher_id)
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_votes_unique
+        ON votes (target, voter_id)
+        WHERE voter_id IS NOT NULL
+        """
+    )
+    conn.execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_votes_unique_user
+        ON votes (target_user_id, voter_id)
+        WHERE target_user_id IS NOT NULL AND voter_id IS NOT NULL
+        """
+    )
+    conn.execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_ref_unique
+        ON ref_visits (target, visitor_id)
+        """
+    )
+    conn.execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_ref_unique_user
+        ON ref_visits (target_user_id, visitor_id)
+        WHERE target_user_id IS NOT NULL
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS profile_prefs (
+            user_id {bigint} PRIMARY KEY,
+            note TEXT DEFAULT '',
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS push_events (
+            id {serial},
+            user_id {bigint} NOT NULL,
+            event_type TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+
+def _migration_relink_queue(conn) -> None:
+    _, bigint = _sql_types()
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS relink_queue (
+            user_id {bigint} PRIMARY KEY,
+            aliases TEXT NOT NULL,
+            votes_linked INTEGER DEFAULT 0,
+            refs_linked INTEGER DEFAULT 0,
+            enqueued_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_votes_target_lower ON votes (LOWER(target))")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ref_target_lower ON ref_visits (LOWER(target))")
+
+
+def _migration_job_state(conn) -> None:
+    _, bigint = _sql_types()
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS job_state (
+            name TEXT PRIMARY KEY,
+            cursor TEXT DEFAULT '',
+            done INTEGER DEFAULT 0,
+            rows_processed {bigint} DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_username_lower ON users (LOWER(username))")
+
+
+def _migration_stats_snapshot(conn) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS stats_snapshot (
+            name TEXT PRIMARY KEY,
+            payload TEXT NOT NULL,
+            computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+
+def _migration_users_updated_index(conn) -> None:
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_updated ON users (updated_at DESC, user_id DESC)")
+
+
+# answers_mask with the sign bit clear was written before the slot layout (migration 12): bit i
+# set means axis i has its left option, clear its right one. backfill_answers_mask_batch rewrites
+# those masks; until it has finished, readers go through _packed_mask_expression.
+_SLOTS_FLAG_SQL = "(-9223372036854775807 - 1)"
+
+
+def _answers_mask_expression() -> str:
+    """SQL computing answers_mask (see app.axes.encode_answers) from the TEXT answer columns of the same row."""
+    return f"{_SLOTS_FLAG_SQL} + " + " + ".join(
+        f"(CASE WHEN {axis.name} = '{axis.left}' THEN {1 << 2 * axis.index} "
+        f"WHEN {axis.name} = '{axis.right}' THEN {1 << 2 * axis.index + 1} ELSE 0 END)"
+        for axis in AXES
+    )
+
+
+def _packed_mask_expression() -> str:
+    """SQL for the row's answers in the slot layout: answers_mask, converted from the old layout or packed from TEXT."""
+    legacy = f"{_SLOTS_FLAG_SQL} + " + " + ".join(
+        f"(CASE WHEN (answers_mask >> {axis.index}) & 1 = 1 THEN {1 << 2 * axis.index} ELSE {1 << 2 * axis.index + 1} END)"
+        for axis in AXES
+    )
+    return (
+        f"CASE WHEN answers_mask < 0 THEN answers_mask "
+        f"WHEN answers_mask IS NOT NULL THEN {legacy} ELSE {_answers_mask_expression()} END"
+    )
+
+
+def _decoded_answer(axis) -> str:
+    """SQL for the option answers_mask holds on axis, NULL when it holds none."""
+    return (
+        f"CASE WHEN (answers_mask >> {2 * axis.index}) & 1 = 1 THEN '{axis.left}' "
+        f"WHEN (answers_mask >> {2 * axis.index + 1}) & 1 = 1 THEN '{axis.right}' END"
+    )
+
+
+def _create_vote_answers_view(conn) -> None:
+    # Text answers for every row, decoded from the packed mask. A row with an answer that is no
+    # option of its axis keeps its TEXT columns (see backfill_answers_mask_batch).
+    columns = ",\n".join(f"COALESCE({_decoded_answer(axis)}, {axis.name}) AS {axis.name}" for axis in AXES)
+    conn.execute("DROP VIEW IF EXISTS votes_answers")
+    conn.execute(
+        f"""
+        CREATE VIEW votes_answers AS
+        SELECT id, target, target_user_id, label, voter_id, created_at, answers_mask,
+        {columns}
+        FROM (
+            SELECT id, target, target_user_id, label, voter_id, created_at, {", ".join(AXIS_NAMES)},
+                   {_packed_mask_expression()} AS answers_mask
+            FROM votes
+        ) packed
+        """
+    )
+
+
+def _migration_answers_mask(conn) -> None:
+    _add_column(conn, "votes", "answers_mask", "SMALLINT" if USE_POSTGRES else "INTEGER")
+    _create_vote_answers_view(conn)
+
+
+def _migration_profile_results(conn) -> None:
+    _, bigint = _sql_types()
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS profile_results (
+            target TEXT PRIMARY KEY,
+            target_user_id {bigint},
+            answers INTEGER DEFAULT 0,
+            visitors INTEGER DEFAULT 0,
+            enough INTEGER DEFAULT 0,
+            caution_ratio REAL DEFAULT 0,
+            picks TEXT,
+            hints TEXT,
+            result_rows TEXT,
+            computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+
+def _migration_ref_answerers(conn) -> None:
+    _, bigint = _sql_types()
+    # Set once the visitor has left feedback for the same target user; see _flag_ref_answerers.
+    _add_column(conn, "ref_visits", "answered", "SMALLINT DEFAULT 0" if USE_POSTGRES else "INTEGER DEFAULT 0")
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS ref_answerer_counts (
+            target_user_id {bigint} PRIMARY KEY,
+            answerers INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    # Profile aggregates, the vote dedupe lookup and answerer joins read only these columns.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_votes_user_label ON votes (target_user_id, label, voter_id, answers_mask)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_votes_target_label ON votes (target, label, voter_id, answers_mask)")
+
+
+def _migration_vote_rollups(conn) -> None:
+    serial, bigint = _sql_types()
+    left_columns = ",\n".join(f"{axis.name}_left INTEGER NOT NULL DEFAULT 0" for axis in AXES)
+    # Feedback votes of archived months summed per target (see maintain_partitions). Rows are
+    # additive deltas: replacing an archived vote adds a negative row instead of editing one.
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS vote_rollups (
+            id {serial},
+            target TEXT NOT NULL,
+            target_user_id {bigint},
+            month TIMESTAMP,
+            answers INTEGER NOT NULL DEFAULT 0,
+            {left_columns},
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_vote_rollups_user ON vote_rollups (target_user_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_vote_rollups_target ON vote_rollups (target)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_vote_rollups_target_lower ON vote_rollups (LOWER(target))")
+    # Single row (id = 1): votes created before archived_before are counted from vote_rollups.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS vote_archive (
+            id INTEGER PRIMARY KEY,
+            archived_before TIMESTAMP
+        )
+        """
+    )
+
+
+def _migration_profile_views(conn) -> None:
+    blob = "BYTEA" if USE_POSTGRES else "BLOB"
+    # Per target: all views, the estimated unique viewers and the app.views.ViewerSketch they come from.
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS profile_views (
+            target TEXT PRIMARY KEY,
+            views BIGINT NOT NULL DEFAULT 0,
+            viewers BIGINT NOT NULL DEFAULT 0,
+            sketch {blob},
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+
+def _migration_wide_answers_mask(conn) -> None:
+    # SMALLINT held 15 axes; app.axes.ANSWERS_MASK_BITS is the BIGINT width. SQLite integers are 64-bit already.
+    if USE_POSTGRES:
+        conn.execute("DROP VIEW IF EXISTS votes_answers")
+        conn.execute("ALTER TABLE votes ALTER COLUMN answers_mask TYPE BIGINT")
+        _create_vote_answers_view(conn)
+
+
+def _migration_answers_mask_slots(conn) -> None:
+    # Bit i (axis i has its left option) becomes bits 2i / 2i + 1 for the left / right option,
+    # so an answer that is neither option can be stored as no bit at all. Votes keep their masks
+    # here: the answers_mask job is restarted to rewrite them in batches (see _packed_mask_expression).
+    for axis in AXES:
+        _add_column(conn, "vote_rollups", f"{axis.name}_right", "INTEGER NOT NULL DEFAULT 0")
+    rights = ", ".join(f"{axis.name}_right = answers - {axis.name}_left" for axis in AXES)
+    conn.execute(f"UPDATE vote_rollups SET {rights}")
+    p = "%s" if USE_POSTGRES else "?"
+    conn.execute(f"DELETE FROM job_state WHERE name = {p}", (ANSWERS_MASK_JOB,))
+    _create_vote_answers_view(conn)
+
+
+def _table_columns(conn, table: str) -> set[str]:
+    if USE_POSTGRES:
+        rows = conn.execute(
+            "SELECT attname FROM pg_attribute WHERE attrelid = to_regclass(%s) AND attnum > 0 AND NOT attisdropped",
+            (table,),
+        ).fetchall()
+    else:
+        rows = [(row[1],) for row in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+    return {str(row[0]) for row in rows}
+
+
+def _missing_axis_columns(conn) -> list[tuple[str, str]]:
+    """(table, column) pairs an axis appended to app.axes.AXES still needs."""
+    votes = _table_columns(conn, "votes")
+    rollups = _table_columns(conn, "vote_rollups")
+    missing = [("votes", axis.name) for axis in AXES if axis.name not in votes]
+    missing += [
+        ("vote_rollups", f"{axis.name}_{side}")
+        for axis in AXES
+        for side in ("left", "right")
+        if rollups and f"{axis.name}_{side}" not in rollups
+    ]
+    return missing
+
+
+def _add_axis_columns(conn, missing: Sequence[tuple[str, str]]) -> None:
+    """
+    Add the columns of newly registered axes; runs on every init_db, after the migrations.
+    Existing votes get NULL (no answer) rather than the axis default.
+    """
+    for table, column in missing:
+        _add_column(conn, table, column, "TEXT" if table == "votes" else "INTEGER NOT NULL DEFAULT 0")
+    if any(table == "votes" for table, _ in missing):
+        _create_vote_answers_view(conn)
+
+
+def _migration_vote_keys(conn) -> None:
+    # Databases partitioned before vote_keys existed; conversions from now on create it themselves.
+    if USE_POSTGRES and "votes" in _partitioned_tables(conn):
+        _create_vote_keys(conn)
+
+
+# Ordered, append-only. Every migration must be idempotent: the first run on a
+# database created before schema_version existed replays them over the old schema.
+MIGRATIONS = (
+    (1, "base schema", _migration_base_schema),
+    (2, "relink queue", _migration_relink_queue),
+    (3, "background job state", _migration_job_state),
+    (4, "stats snapshot", _migration_stats_snapshot),
+    (5, "users updated_at index", _migration_users_updated_index),
+    (6, "votes answers bitmask", _migration_answers_mask),
+    (7, "profile results table", _migration_profile_results),
+    (8, "ref answerer counters and covering vote indexes", _migration_ref_answerers),
+    (9, "vote rollups", _migration_vote_rollups),
+    (10, "profile views", _migration_profile_views),
+    (11, "bigint answers_mask", _migration_wide_answers_mask),
+    (12, "answers_mask bit per option", _migration_answers_mask_slots),
+    (13, "vote keys for partitioned votes", _migration_vote_keys),
+)
+
+
+def _schema_version(conn) -> int:
+    row = conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()
+    return int(row[0] or 0)
+
+
+def _apply_migrations(conn) -> int:
+    placeholder = "%s" if USE_POSTGRES else "?"
+    applied = _schema_version(conn)
+    count = 0
+    for version, name, migrate in MIGRATIONS:
+        if version <= applied:
+            continue
+        if not USE_POSTGRES:
+            conn.execute("BEGIN")
+        try:
+            migrate(conn)
+            conn.execute(
+                f"INSERT INTO schema_version (version, name) VALUES ({placeholder}, {placeholder})",
+                (version, name),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        count += 1
+    return count
+
+
+PARTITIONED_TABLES = ("votes", "push_events")
+# Indexes of the partitioned tables. A unique index must include the partition key, so vote
+# uniqueness per (target, voter) moves to vote_keys (see _create_vote_keys).
+_PARTITION_INDEXES = {
+    "votes": (
+        "CREATE INDEX IF NOT EXISTS idx_votes_target_voter ON votes (target, voter_id)",
+        "CREATE INDEX IF NOT EXISTS idx_votes_user_voter ON votes (target_user_id, voter_id)",
+        "CREATE INDEX IF NOT EXISTS idx_votes_user_label ON votes (target_user_id, label, voter_id, answers_mask)",
+        "CREATE INDEX IF NOT EXISTS idx_votes_target_label ON votes (target, label, voter_id, answers_mask)",
+        "CREATE INDEX IF NOT EXISTS idx_votes_target_lower ON votes (LOWER(target))",
+    ),
+    "push_events": ("CREATE INDEX IF NOT EXISTS idx_push_events_user_created ON push_events (user_id, created_at)",),
+}
+# Tables found partitioned by the last init_db.
+_partitioned: set[str] = set()
+
+
+def _create_vote_keys(conn) -> None:
+    """
+    Uniqueness of partitioned votes: a trigger mirrors the (target, voter_id) and
+    (target_user_id, voter_id) of every vote with a voter into vote_keys, whose unique indexes
+    reject a second vote from any writer. _add_vote still takes turns under an advisory lock,
+    so its own writers never hit them.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS vote_keys (
+            vote_id BIGINT PRIMARY KEY,
+            target TEXT NOT NULL,
+            target_user_id BIGINT,
+            voter_id BIGINT NOT NULL
+        )
+        """
+    )
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_vote_keys_target ON vote_keys (target, voter_id)")
+    conn.execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_vote_keys_user
+        ON vote_keys (target_user_id, voter_id)
+        WHERE target_user_id IS NOT NULL
+        """
+    )
+    conn.execute(
+        """
+        CREATE OR REPLACE FUNCTION votes_sync_keys() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'TRUNCATE' THEN
+                TRUNCATE vote_keys;
+                RETURN NULL;
+            END IF;
+            IF TG_OP <> 'INSERT' THEN
+                DELETE FROM vote_keys WHERE vote_id = OLD.id;
+            END IF;
+            IF TG_OP <> 'DELETE' AND NEW.voter_id IS NOT NULL THEN
+                INSERT INTO vote_keys (vote_id, target, target_user_id, voter_id)
+                VALUES (NEW.id, NEW.target, NEW.target_user_id, NEW.voter_id);
+            END IF;
+            RETURN NULL;
+        END
+        $$
+        """
+    )
+    conn.execute("DROP TRIGGER IF EXISTS votes_keys ON votes")
+    conn.execute(
+        """
+        CREATE TRIGGER votes_keys AFTER INSERT OR DELETE OR UPDATE OF target, target_user_id, voter_id
+        ON votes FOR EACH ROW EXECUTE FUNCTION votes_sync_keys()
+        """
+    )
+    conn.execute("DROP TRIGGER IF EXISTS votes_keys_truncate ON votes")
+    conn.execute("CREATE TRIGGER votes_keys_truncate AFTER TRUNCATE ON votes FOR EACH STATEMENT EXECUTE FUNCTION votes_sync_keys()")
+    keyed = _fill_vote_keys(conn, "votes")
+    skipped = conn.execute("SELECT COUNT(*) FROM votes WHERE voter_id IS NOT NULL").fetchone()[0] - keyed
+    if skipped:
+        # Duplicates written before vote_keys existed stay in votes; new ones are rejected.
+        logging.warning("vote_keys: %s duplicate votes left without a key", skipped)
+
+
+def _fill_vote_keys(conn, table: str) -> int:
+    cur = conn.execute(
+        f"""
+        INSERT INTO vote_keys (vote_id, target, target_user_id, voter_id)
+        SELECT id, target, target_user_id, voter_id FROM {table}
+        WHERE voter_id IS NOT NULL
+        ON CONFLICT DO NOTHING
+        """
+    )
+    return max(cur.rowcount, 0)
+
+
+def _add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def _current_month(conn) -> datetime:
+    # The database clock, which also fills created_at.
+    return conn.execute("SELECT date_trunc('month', LOCALTIMESTAMP)").fetchone()[0]
+
+
+def _partitioned_tables(conn) -> set[str]:
+    rows = conn.execute(
+        "SELECT relname FROM pg_class WHERE relkind = 'p' AND oid = ANY(ARRAY[to_regclass(%s), to_regclass(%s)])",
+        PARTITIONED_TABLES,
+    ).fetchall()
+    return {str(row[0]) for row in rows}
+
+
+def _month_partitions(conn, table: str) -> list[tuple[str, datetime]]:
+    rows = conn.execute(
+        """
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+        """,
+        (table,),
+    ).fetchall()
+    months = []
+    for (name,) in rows:
+        match = re.fullmatch(rf"{table}_p(\d{{4}})(\d{{2}})", str(name))
+        if match:
+            months.append((str(name), datetime(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(months, key=lambda item: item[1])
+
+
+def _partition_bounds(month: datetime) -> str:
+    return f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_add_months(month, 1):%Y-%m-%d}')"
+
+
+def _attach_month_partition(conn, table: str, month: datetime) -> Optional[str]:
+    """Create the partition for month unless it exists, moving its rows out of the default partition."""
+    name = f"{table}_p{month:%Y%m}"
+    if conn.execute("SELECT to_regclass(%s)", (name,)).fetchone()[0] is not None:
+        return None
+    conn.execute(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)")
+    conn.execute(
+        f"""
+        WITH moved AS (
+            DELETE FROM {table}_default
+            WHERE created_at >= %s AND created_at < %s
+            RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+        """,
+        (month, _add_months(month, 1)),
+    )
+    if table == "votes":
+        # The trigger dropped the keys of the moved rows; name is not attached yet and fires nothing.
+        _fill_vote_keys(conn, name)
+    conn.execute(f"ALTER TABLE {table} ATTACH PARTITION {name} {_partition_bounds(month)}")
+    return name
+
+
+def _partition_by_month(conn, table: str) -> None:
+    """Rebuild table as range-partitioned by month of created_at, copying its rows in the same transaction."""
+    legacy = f"{table}_unpartitioned"
+    conn.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+    conn.execute(f"CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)")
+    current = _current_month(conn)
+    oldest = conn.execute(f"SELECT date_trunc('month', MIN(created_at)) FROM {legacy}").fetchone()[0]
+    first = min(oldest or current, current)
+    conn.execute(f"UPDATE {legacy} SET created_at = %s WHERE created_at IS NULL", (first,))
+    conn.execute(f"ALTER TABLE {table} ALTER COLUMN created_at SET NOT NULL")
+    month = first
+    while month <= _add_months(current, 1):
+        conn.execute(f"CREATE TABLE {table}_p{month:%Y%m} PARTITION OF {table} {_partition_bounds(month)}")
+        month = _add_months(month, 1)
+    conn.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+    conn.execute(f"INSERT INTO {table} SELECT * FROM {legacy}")
+    sequence = conn.execute("SELECT pg_get_serial_sequence(%s, 'id')", (legacy,)).fetchone()[0]
+    conn.execute(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id")
+    conn.execute(f"DROP TABLE {legacy}")
+    conn.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (id, created_at)")
+    for statement in _PARTITION_INDEXES[table]:
+        conn.execute(statement)
+    if table == "votes":
+        _create_vote_keys(conn)
+
+
+def _setup_partitioning(conn) -> None:
+    """Convert whichever of PARTITIONED_TABLES is still a plain table; caller holds the schema lock."""
+    partitioned = _partitioned_tables(conn)
+    if "votes" not in partitioned:
+        conn.execute("DROP VIEW IF EXISTS votes_answers")
+        _partition_by_month(conn, "votes")
+        _create_vote_answers_view(conn)
+        # Nothing is archived yet: the cutoff starts at the oldest partition.
+        conn.execute("DELETE FROM vote_rollups")
+        conn.execute(
+            """
+            INSERT INTO vote_archive (id, archived_before)
+            VALUES (1, (SELECT date_trunc('month', MIN(created_at)) FROM votes))
+            ON CONFLICT(id) DO UPDATE SET archived_before = excluded.archived_before
+            """
+        )
+        conn.execute("UPDATE vote_archive SET archived_before = date_trunc('month', LOCALTIMESTAMP) WHERE archived_before IS NULL")
+        conn.commit()
+        logging.info("votes converted to monthly partitions")
+    if "push_events" not in partitioned:
+        _partition_by_month(conn, "push_events")
+        conn.commit()
+        logging.info("push_events converted to monthly partitions")
 
 
 def init_db() -> bool:
+    """
+    Bring the schema up to date, including columns of axes appended to app.axes.AXES.
+    When nothing is pending this is a few catalog SELECTs; data backfills run later as
+    background batches.
+    """
+    latest = MIGRATIONS[-1][0]
+    create_version_table = """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """
+    if USE_POSTGRES:
+        try:
+            conn = _get_pg_conn()
+            try:
+                conn.execute(create_version_table)
+                conn.commit()
+                partitioned = _partitioned_tables(conn)
+                pending_partitions = DB_PARTITIONING and partitioned != set(PARTITIONED_TABLES)
+                if _schema_version(conn) >= latest and not pending_partitions and not _missing_axis_columns(conn):
+                    conn.commit()
+                    _partitioned.clear()
+                    _partitioned.update(partitioned)
+                    return True
+                conn.execute("SELECT pg_advisory_lock(%s)", (SCHEMA_LOCK_ID,))
+                try:
+                    _apply_migrations(conn)
+                    if DB_PARTITIONING:
+                        _setup_partitioning(conn)
+                    missing = _missing_axis_columns(conn)
+                    if missing:
+                        _add_axis_columns(conn, missing)
+                        conn.commit()
+                    partitioned = _partitioned_tables(conn)
+                finally:
+                    conn.rollback()
+                    conn.execute("SELECT pg_advisory_unlock(%s)", (SCHEMA_LOCK_ID,))
+                    conn.commit()
+                _partitioned.clear()
+                _partitioned.update(partitioned)
+            finally:
+                conn.close()
+            return True
+        except Exception as exc:
+            logging.warning("DB init failed: %s", exc)
+            return False
+    else:
+        conn = _get_sqlite_conn()
+        try:
+            conn.execute(create_version_table)
+            conn.commit()
+            if _schema_version(conn) < latest:
+                _apply_migrations(conn)
+            missing = _missing_axis_columns(conn)
+            if missing:
+                with conn:
+                    _add_axis_columns(conn, missing)
+        finally:
+            conn.close()
+        return True
+
+
+def get_job_state(name: str) -> dict:
     if USE_POSTGRES:
         try:
             conn = _get_pg_conn()
             try:
                 with conn.cursor() as cur:
                     cur.execute(
-                        """
-                        CREATE TABLE IF NOT EXISTS votes (
-                            id SERIAL PRIMARY KEY,
-                            target TEXT NOT NULL,
-                            label TEXT NOT NULL,
-                            tone TEXT DEFAULT 'serious',
-                            speed TEXT DEFAULT 'slow',
-                            contact_format TEXT DEFAULT 'text',
-                            caution TEXT DEFAULT 'false',
-                            initiative TEXT DEFAULT 'wait',
-                            start_context TEXT DEFAULT 'topic',
-                            attention_reaction TEXT DEFAULT 'careful',
-                            frequency TEXT DEFAULT 'rare',
-                            comm_format TEXT DEFAULT 'reserved',
-                            emotion_tone TEXT DEFAULT 'neutral',
-                            feedback_style TEXT DEFAULT 'soft',
-                            uncertainty TEXT DEFAULT 'high',
-                            voter_id BIGINT,
-                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                        )
-                        """
-                    )
-                    cur.execute("ALTER TABLE votes ADD COLUMN IF NOT EXISTS tone TEXT DEFAULT 'serious'")
-                    cur.execute("ALTER TABLE votes ADD COLUMN IF NOT EXISTS speed TEXT DEFAULT 'slow'")
-                    cur.execute("ALTER TABLE votes ADD COLUMN IF NOT EXISTS contact_format TEXT DEFAULT 'text'")
-                    cur.execute("ALTER TABLE votes ADD COLUMN IF NOT EXISTS caution TEXT DEFAULT 'false'")
-                    cur.execute("ALTER TABLE votes ADD COLUMN IF NOT EXISTS initiative TEXT DEFAULT 'wait'")
-                    cur.execute("ALTER TABLE votes ADD COLUMN IF NOT EXISTS start_context TEXT DEFAULT 'topic'")
-                    cur.execute("ALTER TABLE votes ADD COLUMN IF NOT EXISTS attention_reaction TEXT DEFAULT 'careful'")
-                    cur.execute("ALTER TABLE votes ADD COLUMN IF NOT EXISTS frequency TEXT DEFAULT 'rare'")
-                    cur.execute("ALTER TABLE votes ADD COLUMN IF NOT EXISTS comm_format TEXT DEFAULT 'reserved'")
-                    cur.execute("ALTER TABLE votes ADD COLUMN IF NOT EXISTS emotion_tone TEXT DEFAULT 'neutral'")
-                    cur.execute("ALTER TABLE votes ADD COLUMN IF NOT EXISTS feedback_style TEXT DEFAULT 'soft'")
-                    cur.execute("ALTER TABLE votes ADD COLUMN IF NOT EXISTS uncertainty TEXT DEFAULT 'high'")
-                    cur.execute("ALTER TABLE votes ADD COLUMN IF NOT EXISTS target_user_id BIGINT")
-                    cur.execute(
-                        """
-                        CREATE TABLE IF NOT EXISTS users (
-                            user_id BIGINT PRIMARY KEY,
-                            username TEXT NOT NULL UNIQUE,
-                            first_name TEXT DEFAULT '',
-                            last_name TEXT DEFAULT '',
-                            photo_url TEXT DEFAULT '',
-                            app_user BOOLEAN DEFAULT TRUE,
-                            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                        )
-                        """
-                    )
-                    cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS first_name TEXT DEFAULT ''")
-                    cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS last_name TEXT DEFAULT ''")
-                    cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS photo_url TEXT DEFAULT ''")
-                    cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS app_user BOOLEAN DEFAULT TRUE")
-                    cur.execute(
-                        """
-                        CREATE TABLE IF NOT EXISTS ref_visits (
-                            id SERIAL PRIMARY KEY,
-                            target TEXT NOT NULL,
-                            visitor_id BIGINT NOT NULL,
-                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                        )
-                        """
-                    )
-                    cur.execute(
-                        """
-                        CREATE TABLE IF NOT EXISTS seen_hints (
-                            target TEXT NOT NULL,
-                            watcher_id BIGINT NOT NULL,
-                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                            PRIMARY KEY (target, watcher_id)
-                        )
-                        """
-                    )
-                    cur.execute(
-                        """
-                        CREATE UNIQUE INDEX IF NOT EXISTS idx_votes_unique
-                        ON votes (target, voter_id)
-                        WHERE voter_id IS NOT NULL
-                        """
-                    )
-                    cur.execute(
-                        """
-                        CREATE UNIQUE INDEX IF NOT EXISTS idx_votes_unique_user
-                        ON votes (target_user_id, voter_id)
-                        WHERE target_user_id IS NOT NULL AND voter_id IS NOT NULL
-                        """
-                    )
-                    cur.execute("ALTER TABLE ref_visits ADD COLUMN IF NOT EXISTS target_user_id BIGINT")
-                    cur.execute(
-                        """
-                        CREATE UNIQUE INDEX IF NOT EXISTS idx_ref_unique
-                        ON ref_visits (target, visitor_id)
-                        """
-                    )
-                    cur.execute(
-                        """
-                        CREATE UNIQUE INDEX IF NOT EXISTS idx_ref_unique_user
-                        ON ref_visits (target_user_id, visitor_id)
-                        WHERE target_user_id IS NOT NULL
-                        """
+                        "SELECT cursor, done, rows_processed, updated_at FROM job_state WHERE name = %s",
+                        (name,),
                     )
+                    row = cur.fetchone()
+            finally:
+                conn.close()
+        except Exception as exc:
+            logging.warning("DB get_job_state failed: %s", exc)
+            row = None
+    else:
+        conn = _get_sqlite_conn()
+        try:
+            cur = conn.execute(
+                "SELECT cursor, done, rows_processed, updated_at FROM job_state WHERE name = ?",
+                (name,),
+            )
+            row = cur.fetchone()
+        finally:
+            conn.close()
+    if not row:
+        return {"name": name, "cursor": "", "done": False, "rows": 0, "updated_at": None}
+    return {
+        "name": name,
+        "cursor": str(row[0] or ""),
+        "done": bool(row[1]),
+        "rows": int(row[2] or 0),
+        "updated_at": row[3],
+    }
+
+
+def reset_job_state(name: str) -> None:
+    if USE_POSTGRES:
+        try:
+            conn = _get_pg_conn()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("DELETE FROM job_state WHERE name = %s", (name,))
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception as exc:
+            logging.warning("DB reset_job_state failed: %s", exc)
+    else:
+        conn = _get_sqlite_conn()
+        try:
+            with conn:
+                conn.execute("DELETE FROM job_state WHERE name = ?", (name,))
+        finally:
+            conn.close()
+
+
+def _save_job_state(conn, name: str, cursor: str, done: bool, rows: int) -> None:
+    placeholder = "%s" if USE_POSTGRES else "?"
+    conn.execute(
+        f"""
+        INSERT INTO job_state (name, cursor, done, rows_processed, updated_at)
+        VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, CURRENT_TIMESTAMP)
+        ON CONFLICT(name) DO UPDATE SET
+            cursor = excluded.cursor,
+            done = excluded.done,
+            rows_processed = job_state.rows_processed + excluded.rows_processed,
+            updated_at = CURRENT_TIMESTAMP
+        """,
+        (name, cursor, 1 if done else 0, rows),
+    )
+
+
+BACKFILL_TABLES = ("votes", "ref_visits")
+
+
+def _flag_backfilled_ref_answerers(conn, table: str, last_id: int, upper: int) -> None:
+    p = "%s" if USE_POSTGRES else "?"
+    if table == "ref_visits":
+        _flag_ref_answerers(conn, f"id > {p} AND id <= {p}", (last_id, upper))
+    else:
+        _flag_ref_answerers(
+            conn,
+            f"target_user_id IN (SELECT target_user_id FROM votes WHERE id > {p} AND id <= {p} AND target_user_id IS NOT NULL)",
+            (last_id, upper),
+        )
+
+
+def _link_vote_rollups(conn) -> None:
+    # Rollups are few; link them in one statement once the votes they were summed from are linked.
+    conn.execute(
+        """
+        UPDATE vote_rollups
+        SET target_user_id = (
+            SELECT u.user_id FROM users u
+            WHERE LOWER(u.username) = LOWER(vote_rollups.target)
+            LIMIT 1
+        )
+        WHERE target_user_id IS NULL
+          AND EXISTS (SELECT 1 FROM users u WHERE LOWER(u.username) = LOWER(vote_rollups.target))
+        """
+    )
+
+
+def backfill_target_user_ids_batch(table: str, batch_size: int = 1000) -> Optional[dict]:
+    """
+    Resumable keyset backfill of target_user_id for rows written before their
+    target registered. Returns None once the job has finished, failed=True when a batch fails.
+    """
+    if table not in BACKFILL_TABLES:
+        raise ValueError(f"unknown backfill table: {table}")
+    job = f"backfill_{table}_target_user_id"
+    state = get_job_state(job)
+    if state["done"]:
+        return None
+    last_id = int(state["cursor"] or 0)
+    if USE_POSTGRES:
+        try:
+            conn = _get_pg_conn()
+            try:
+                with conn.cursor() as cur:
                     cur.execute(
-                        """
-                        CREATE TABLE IF NOT EXISTS profile_prefs (
-                            user_id BIGINT PRIMARY KEY,
-                            note TEXT DEFAULT '',
-                            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                        )
-                        """
+                        f"SELECT MAX(id), COUNT(*) FROM (SELECT id FROM {table} WHERE id > %s ORDER BY id LIMIT %s) s",
+                        (last_id, batch_size),
                     )
-                    cur.execute(
-                        """
-                        CREATE TABLE IF NOT EXISTS push_events (
-                            id SERIAL PRIMARY KEY,
-                            user_id BIGINT NOT NULL,
-                            event_type TEXT NOT NULL,
-                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    upper, scanned = cur.fetchone()
+                    linked = 0
+                    if upper is not None:
+                        cur.execute(
+                            f"""
+                            UPDATE {table} t
+                            SET target_user_id = u.user_id
+                            FROM users u
+                            WHERE t.id > %s AND t.id <= %s
+                              AND t.target_user_id IS NULL
+                              AND LOWER(t.target) = LOWER(u.username)
+                            """,
+                            (last_id, upper),
                         )
-                        """
-                    )
-                    cur.execute(
-                        """
-                        UPDATE votes v
-                        SET target_user_id = u.user_id
-                        FROM users u
-                        WHERE v.target_user_id IS NULL
-                          AND LOWER(v.target) = LOWER(u.username)
-                        """
-                    )
-                    cur.execute(
-                        """
-                        UPDATE ref_visits r
-                        SET target_user_id = u.user_id
-                        FROM users u
-                        WHERE r.target_user_id IS NULL
-                          AND LOWER(r.target) = LOWER(u.username)
-                        """
-                    )
+                        linked = max(cur.rowcount, 0)
+                    if linked:
+                        _flag_backfilled_ref_answerers(conn, table, last_id, upper)
+                    done = int(scanned or 0) < batch_size
+                    if done and table == "votes":
+                        _link_vote_rollups(conn)
+                    _save_job_state(conn, job, str(upper if upper is not None else last_id), done, linked)
                 conn.commit()
             finally:
                 conn.close()
-            return True
         except Exception as exc:
-            logging.warning("DB init failed: %s", exc)
-            return False
+            logging.warning("DB backfill_target_user_ids_batch failed: %s", exc)
+            return {"job": job, "rows": 0, "failed": True}
     else:
         conn = _get_sqlite_conn()
         try:
-            conn.execute(
-                """
-                    CREATE TABLE IF NOT EXISTS votes (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        target TEXT NOT NULL,
-                        label TEXT NOT NULL,
-                        tone TEXT DEFAULT 'serious',
-                        speed TEXT DEFAULT 'slow',
-                        contact_format TEXT DEFAULT 'text',
-                        caution TEXT DEFAULT 'false',
-                        initiative TEXT DEFAULT 'wait',
-                        start_context TEXT DEFAULT 'topic',
-                        attention_reaction TEXT DEFAULT 'careful',
-                        frequency TEXT DEFAULT 'rare',
-                        comm_format TEXT DEFAULT 'reserved',
-                        emotion_tone TEXT DEFAULT 'neutral',
-                        feedback_style TEXT DEFAULT 'soft',
-                        uncertainty TEXT DEFAULT 'high',
-                        voter_id INTEGER,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            with conn:
+                upper, scanned = conn.execute(
+                    f"SELECT MAX(id), COUNT(*) FROM (SELECT id FROM {table} WHERE id > ? ORDER BY id LIMIT ?)",
+                    (last_id, batch_size),
+                ).fetchone()
+                linked = 0
+                if upper is not None:
+                    cur = conn.execute(
+                        f"""
+                        UPDATE {table}
+                        SET target_user_id = (
+                            SELECT u.user_id FROM users u
+                            WHERE LOWER(u.username) = LOWER({table}.target)
+                            LIMIT 1
+                        )
+                        WHERE id > ? AND id <= ?
+                          AND target_user_id IS NULL
+                          AND EXISTS (SELECT 1 FROM users u WHERE LOWER(u.username) = LOWER({table}.target))
+                        """,
+                        (last_id, upper),
                     )
-                    """
-                )
-            try:
-                conn.execute("ALTER TABLE votes ADD COLUMN tone TEXT DEFAULT 'serious'")
-            except sqlite3.OperationalError:
-                pass
-            try:
-                conn.execute("ALTER TABLE votes ADD COLUMN speed TEXT DEFAULT 'slow'")
-            except sqlite3.OperationalError:
-                pass
-            try:
-                conn.execute("ALTER TABLE votes ADD COLUMN contact_format TEXT DEFAULT 'text'")
-            except sqlite3.OperationalError:
-                pass
-            try:
-                conn.execute("ALTER TABLE votes ADD COLUMN caution TEXT DEFAULT 'false'")
-            except sqlite3.OperationalError:
-                pass
-            try:
-                conn.execute("ALTER TABLE votes ADD COLUMN initiative TEXT DEFAULT 'wait'")
-            except sqlite3.OperationalError:
-                pass
-            try:
-                conn.execute("ALTER TABLE votes ADD COLUMN start_context TEXT DEFAULT 'topic'")
-            except sqlite3.OperationalError:
-                pass
-            try:
-                conn.execute("ALTER TABLE votes ADD COLUMN attention_reaction TEXT DEFAULT 'careful'")
-            except sqlite3.OperationalError:
-                pass
-            try:
-                conn.execute("ALTER TABLE votes ADD COLUMN frequency TEXT DEFAULT 'rare'")
-            except sqlite3.OperationalError:
-                pass
-            try:
-                conn.execute("ALTER TABLE votes ADD COLUMN comm_format TEXT DEFAULT 'reserved'")
-            except sqlite3.OperationalError:
-                pass
-            try:
-                conn.execute("ALTER TABLE votes ADD COLUMN emotion_tone TEXT DEFAULT 'neutral'")
-            except sqlite3.OperationalError:
-                pass
-            try:
-                conn.execute("ALTER TABLE votes ADD COLUMN feedback_style TEXT DEFAULT 'soft'")
-            except sqlite3.OperationalError:
-                pass
-            try:
-                conn.execute("ALTER TABLE votes ADD COLUMN uncertainty TEXT DEFAULT 'high'")
-            except sqlite3.OperationalError:
-                pass
-            try:
-                conn.execute("ALTER TABLE votes ADD COLUMN target_user_id INTEGER")
-            except sqlite3.OperationalError:
-                pass
+                    linked = max(cur.rowcount, 0)
+                    if linked:
+                        _flag_backfilled_ref_answerers(conn, table, last_id, upper)
+                done = int(scanned or 0) < batch_size
+                if done and table == "votes":
+                    _link_vote_rollups(conn)
+                _save_job_state(conn, job, str(upper if upper is not None else last_id), done, linked)
+        finally:
+            conn.close()
+    return {"job": job, "cursor": upper, "rows": linked, "done": done}
+
+
+# Finished job_state jobs whose results queries may rely on; until then readers take the slow path.
+JOB_READY_RECHECK_SECONDS = 60.0
+_ready_jobs: set[str] = set()
+_job_checked_at: dict[str, float] = {}
+
+
+def _job_ready(conn, name: str) -> bool:
+    """True once the job is done; job_state is rechecked at most every JOB_READY_RECHECK_SECONDS."""
+    if name in _ready_jobs:
+        return True
+    now = time.monotonic()
+    if now - _job_checked_at.get(name, float("-inf")) >= JOB_READY_RECHECK_SECONDS:
+        _job_checked_at[name] = now
+        p = "%s" if USE_POSTGRES else "?"
+        row = conn.execute(f"SELECT done FROM job_state WHERE name = {p}", (name,)).fetchone()
+        if row and row[0]:
+            _ready_jobs.add(name)
+    return name in _ready_jobs
+
+
+ANSWERS_MASK_JOB = "votes_answers_mask"
+
+
+def backfill_answers_mask_batch(batch_size: int = 1000) -> Optional[dict]:
+    """
+    Resumable keyset pass packing the TEXT answers of old votes into answers_mask and rewriting
+    masks from before the slot layout. The TEXT columns of a row are cleared only once its
+    mask decodes back to every one of them, so
+    answers that are no option of their axis stay readable (and uncounted). Returns None
+    once the job has finished.
+    """
+    state = get_job_state(ANSWERS_MASK_JOB)
+    if state["done"]:
+        _ready_jobs.add(ANSWERS_MASK_JOB)
+        return None
+    last_id = int(state["cursor"] or 0)
+    p = "%s" if USE_POSTGRES else "?"
+    cleared = ", ".join(f"{name} = NULL" for name in AXIS_NAMES)
+    verified = " AND ".join(f"{axis.name} = {_decoded_answer(axis)}" for axis in AXES)
+
+    def step(conn) -> tuple[Optional[int], int, bool]:
+        upper, scanned = conn.execute(
+            f"SELECT MAX(id), COUNT(*) FROM (SELECT id FROM votes WHERE id > {p} ORDER BY id LIMIT {p}) s",
+            (last_id, batch_size),
+        ).fetchone()
+        packed = 0
+        if upper is not None:
+            cur = conn.execute(
+                f"""
+                UPDATE votes
+                SET answers_mask = {_packed_mask_expression()}
+                WHERE id > {p} AND id <= {p} AND (answers_mask IS NULL OR answers_mask >= 0)
+                """,
+                (last_id, upper),
+            )
+            packed = max(cur.rowcount, 0)
             conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id INTEGER PRIMARY KEY,
-                    username TEXT NOT NULL UNIQUE,
-                    first_name TEXT DEFAULT '',
-                    last_name TEXT DEFAULT '',
-                    photo_url TEXT DEFAULT '',
-                    app_user INTEGER DEFAULT 1,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-                """
+                f"""
+                UPDATE votes SET {cleared}
+                WHERE id > {p} AND id <= {p} AND answers_mask < 0 AND {verified}
+                """,
+                (last_id, upper),
             )
+        done = int(scanned or 0) < batch_size
+        _save_job_state(conn, ANSWERS_MASK_JOB, str(upper if upper is not None else last_id), done, packed)
+        return upper, packed, done
+
+    if USE_POSTGRES:
+        try:
+            conn = _get_pg_conn()
             try:
-                conn.execute("ALTER TABLE users ADD COLUMN first_name TEXT DEFAULT ''")
-            except sqlite3.OperationalError:
-                pass
-            try:
-                conn.execute("ALTER TABLE users ADD COLUMN last_name TEXT DEFAULT ''")
-            except sqlite3.OperationalError:
-                pass
-            try:
-                conn.execute("ALTER TABLE users ADD COLUMN photo_url TEXT DEFAULT ''")
-            except sqlite3.OperationalError:
-                pass
+                upper, packed, done = step(conn)
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception as exc:
+            logging.warning("DB backfill_answers_mask_batch failed: %s", exc)
+            return {"job": ANSWERS_MASK_JOB, "rows": 0, "failed": True}
+    else:
+        conn = _get_sqlite_conn()
+        try:
+            with conn:
+                upper, packed, done = step(conn)
+        finally:
+            conn.close()
+    if done:
+        _ready_jobs.add(ANSWERS_MASK_JOB)
+    return {"job": ANSWERS_MASK_JOB, "cursor": upper, "rows": packed, "done": done}
+
+
+REF_ANSWERERS_JOB = "ref_answerer_counts"
+
+
+def _flag_ref_answerers(conn, where: str, params: tuple) -> int:
+    """
+    Flag the ref visits matching where whose visitor has left feedback for the same target
+    user, and add each newly flagged visit to ref_answerer_counts. A visit is counted once:
+    only unflagged rows flip, so concurrent callers cannot both count it.
+    """
+    p = "%s" if USE_POSTGRES else "?"
+    rows = conn.execute(
+        f"""
+        UPDATE ref_visits SET answered = 1
+        WHERE {where}
+          AND answered = 0
+          AND target_user_id IS NOT NULL
+          AND EXISTS (
+              SELECT 1 FROM votes v
+              WHERE v.target_user_id = ref_visits.target_user_id
+                AND v.voter_id = ref_visits.visitor_id
+                AND v.label = 'feedback'
+          )
+        RETURNING target_user_id
+        """,
+        params,
+    ).fetchall()
+    flagged: dict[int, int] = {}
+    for row in rows:
+        flagged[int(row[0])] = flagged.get(int(row[0]), 0) + 1
+    if flagged:
+        conn.cursor().executemany(
+            f"""
+            INSERT INTO ref_answerer_counts (target_user_id, answerers) VALUES ({p}, {p})
+            ON CONFLICT(target_user_id) DO UPDATE SET answerers = ref_answerer_counts.answerers + excluded.answerers
+            """,
+            list(flagged.items()),
+        )
+    return len(rows)
+
+
+def backfill_ref_answerers_batch(batch_size: int = 1000) -> Optional[dict]:
+    """
+    Resumable keyset pass flagging existing ref visits whose visitor already answered,
+    which builds ref_answerer_counts. Returns None once the job has finished, failed=True
+    when a batch fails.
+    """
+    state = get_job_state(REF_ANSWERERS_JOB)
+    if state["done"]:
+        _ready_jobs.add(REF_ANSWERERS_JOB)
+        return None
+    last_id = int(state["cursor"] or 0)
+    p = "%s" if USE_POSTGRES else "?"
+
+    def step(conn) -> tuple[Optional[int], int, bool]:
+        upper, scanned = conn.execute(
+            f"SELECT MAX(id), COUNT(*) FROM (SELECT id FROM ref_visits WHERE id > {p} ORDER BY id LIMIT {p}) s",
+            (last_id, batch_size),
+        ).fetchone()
+        flagged = 0
+        if upper is not None:
+            flagged = _flag_ref_answerers(conn, f"id > {p} AND id <= {p}", (last_id, upper))
+        done = int(scanned or 0) < batch_size
+        _save_job_state(conn, REF_ANSWERERS_JOB, str(upper if upper is not None else last_id), done, flagged)
+        return upper, flagged, done
+
+    if USE_POSTGRES:
+        try:
+            conn = _get_pg_conn()
             try:
-                conn.execute("ALTER TABLE users ADD COLUMN app_user INTEGER DEFAULT 1")
-            except sqlite3.OperationalError:
-                pass
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS ref_visits (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    target TEXT NOT NULL,
-                    visitor_id INTEGER NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-                """
-            )
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS seen_hints (
-                    target TEXT NOT NULL,
-                    watcher_id INTEGER NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    PRIMARY KEY (target, watcher_id)
-                )
-                """
-            )
-            conn.execute(
-                """
-                CREATE UNIQUE INDEX IF NOT EXISTS idx_votes_unique
-                ON votes (target, voter_id)
-                WHERE voter_id IS NOT NULL
-                """
-            )
-            conn.execute(
-                """
-                CREATE UNIQUE INDEX IF NOT EXISTS idx_votes_unique_user
-                ON votes (target_user_id, voter_id)
-                WHERE target_user_id IS NOT NULL AND voter_id IS NOT NULL
-                """
-            )
+                upper, flagged, done = step(conn)
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception as exc:
+            logging.warning("DB backfill_ref_answerers_batch failed: %s", exc)
+            return {"job": REF_ANSWERERS_JOB, "rows": 0, "failed": True}
+    else:
+        conn = _get_sqlite_conn()
+        try:
+            with conn:
+                upper, flagged, done = step(conn)
+        finally:
+            conn.close()
+    if done:
+        _ready_jobs.add(REF_ANSWERERS_JOB)
+    return {"job": REF_ANSWERERS_JOB, "cursor": upper, "rows": flagged, "done": done}
+
+
+REF_ANSWERERS_RECOUNT_JOB = "ref_answerer_recount"
+
+
+def recount_ref_answerers_batch(batch_size: int = 1000) -> Optional[dict]:
+    """
+    Keyset pass over ref visit target users that re-checks their answered flags and rewrites
+    their ref_answerer_counts rows. Flags are only set as votes arrive, so votes relinked,
+    changed or deleted later would otherwise leave the counters too high. Returns None at
+    the end of each pass (the next call starts over) and until the backfill has finished.
+    """
+    if not get_job_state(REF_ANSWERERS_JOB)["done"]:
+        return None
+    last_id = int(get_job_state(REF_ANSWERERS_RECOUNT_JOB)["cursor"] or 0)
+    p = "%s" if USE_POSTGRES else "?"
+
+    def step(conn) -> tuple[Optional[int], int, bool]:
+        upper, scanned = conn.execute(
+            f"""
+            SELECT MAX(target_user_id), COUNT(*) FROM (
+                SELECT DISTINCT target_user_id FROM ref_visits
+                WHERE target_user_id > {p} ORDER BY target_user_id LIMIT {p}
+            ) s
+            """,
+            (last_id, batch_size),
+        ).fetchone()
+        done = int(scanned or 0) < batch_size
+        # The last batch is open-ended: it also drops counters of target users with no visits left.
+        where, params = (
+            (f"target_user_id > {p}", (last_id,)) if done
+            else (f"target_user_id > {p} AND target_user_id <= {p}", (last_id, upper))
+        )
+        cleared = conn.execute(
+            f"""
+            UPDATE ref_visits SET answered = 0
+            WHERE {where}
+              AND answered = 1
+              AND NOT EXISTS (
+                  SELECT 1 FROM votes v
+                  WHERE v.target_user_id = ref_visits.target_user_id
+                    AND v.voter_id = ref_visits.visitor_id
+                    AND v.label = 'feedback'
+              )
+            RETURNING id
+            """,
+            params,
+        ).fetchall()
+        flagged = _flag_ref_answerers(conn, where, params)
+        conn.execute(f"DELETE FROM ref_answerer_counts WHERE {where}", params)
+        conn.execute(
+            f"""
+            INSERT INTO ref_answerer_counts (target_user_id, answerers)
+            SELECT target_user_id, COUNT(*) FROM ref_visits
+            WHERE {where} AND answered = 1
+            GROUP BY target_user_id
+            """,
+            params,
+        )
+        _save_job_state(
+            conn, REF_ANSWERERS_RECOUNT_JOB, "" if done else str(upper), False, len(cleared) + flagged
+        )
+        return upper, len(cleared) + flagged, done
+
+    if USE_POSTGRES:
+        try:
+            conn = _get_pg_conn()
             try:
-                conn.execute("ALTER TABLE ref_visits ADD COLUMN target_user_id INTEGER")
-            except sqlite3.OperationalError:
-                pass
-            conn.execute(
-                """
-                CREATE UNIQUE INDEX IF NOT EXISTS idx_ref_unique
-                ON ref_visits (target, visitor_id)
-                """
-            )
-            conn.execute(
-                """
-                CREATE UNIQUE INDEX IF NOT EXISTS idx_ref_unique_user
-                ON ref_visits (target_user_id, visitor_id)
-                WHERE target_user_id IS NOT NULL
-                """
-            )
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS profile_prefs (
-                    user_id INTEGER PRIMARY KEY,
-                    note TEXT DEFAULT '',
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-                """
-            )
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS push_events (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    event_type TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-                """
-            )
-            conn.execute(
-                """
-                UPDATE votes
-                SET target_user_id = (
-                    SELECT u.user_id FROM users u
-                    WHERE LOWER(u.username) = LOWER(votes.target)
-                    LIMIT 1
-                )
-                WHERE target_user_id IS NULL
-                """
-            )
-            conn.execute(
-                """
-                UPDATE ref_visits
-                SET target_user_id = (
-                    SELECT u.user_id FROM users u
-                    WHERE LOWER(u.username) = LOWER(ref_visits.target)
-                    LIMIT 1
-                )
-                WHERE target_user_id IS NULL
-                """
-            )
+                upper, changed, done = step(conn)
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception as exc:
+            logging.warning("DB recount_ref_answerers_batch failed: %s", exc)
+            return {"job": REF_ANSWERERS_RECOUNT_JOB, "rows": 0, "failed": True}
+    else:
+        conn = _get_sqlite_conn()
+        try:
+            with conn:
+                upper, changed, done = step(conn)
+        finally:
+            conn.close()
+    if done:
+        return None
+    return {"job": REF_ANSWERERS_RECOUNT_JOB, "cursor": upper, "rows": changed, "done": False}
+
+
+# Feedback votes of partitioned months that vote_rollups does not cover yet.
+_HOT_VOTES = "created_at >= (SELECT archived_before FROM vote_archive WHERE id = 1)"
+# vote_rollups columns in count vector order.
+_ROLLUP_SLOT_COLUMNS = tuple(f"{axis.name}_{side}" for axis in AXES for side in ("left", "right"))
+
+
+def _roll_up_vote_month(conn, hot_from: datetime) -> Optional[dict]:
+    """Sum the oldest hot month into vote_rollups if it is older than hot_from, and move the cutoff past it."""
+    # FOR UPDATE waits for in-flight _add_vote calls (FOR SHARE) and holds new ones until commit.
+    row = conn.execute("SELECT archived_before FROM vote_archive WHERE id = 1 FOR UPDATE").fetchone()
+    if not row or row[0] is None or row[0] >= hot_from:
+        return None
+    month = row[0]
+    sums = ", ".join(f"SUM((mask >> {position}) & 1)" for position in range(COUNT_VECTOR_SIZE))
+    cur = conn.execute(
+        f"""
+        INSERT INTO vote_rollups (target, target_user_id, month, answers, {", ".join(_ROLLUP_SLOT_COLUMNS)})
+        SELECT target, target_user_id, %s, COUNT(*), {sums}
+        FROM (
+            SELECT target, target_user_id, {_packed_mask_expression()} AS mask
+            FROM votes
+            WHERE label = 'feedback' AND created_at >= %s AND created_at < %s
+        ) month_votes
+        GROUP BY target, target_user_id
+        """,
+        (month, month, _add_months(month, 1)),
+    )
+    conn.execute("UPDATE vote_archive SET archived_before = %s WHERE id = 1", (_add_months(month, 1),))
+    return {"month": f"{month:%Y-%m}", "targets": max(cur.rowcount, 0)}
+
+
+def maintain_partitions() -> Optional[dict]:
+    """
+    One maintenance step for the partitioned tables: create this and next month's partitions,
+    drop push_events partitions past PUSH_EVENTS_RETENTION_MONTHS and roll up the oldest vote
+    month outside VOTES_HOT_MONTHS. Votes are never dropped. Returns None when nothing was due,
+    which is always the case on SQLite or before init_db converted the tables.
+    """
+    if not USE_POSTGRES:
+        return None
+    try:
+        conn = _get_pg_conn()
+        try:
+            partitioned = _partitioned_tables(conn)
+            if not partitioned:
+                return None
+            current = _current_month(conn)
+            created = []
+            for table in sorted(partitioned):
+                for month in (current, _add_months(current, 1)):
+                    name = _attach_month_partition(conn, table, month)
+                    if name:
+                        created.append(name)
+            dropped = []
+            if "push_events" in partitioned:
+                keep_from = _add_months(current, 1 - PUSH_EVENTS_RETENTION_MONTHS)
+                for name, month in _month_partitions(conn, "push_events"):
+                    if month < keep_from:
+                        conn.execute(f"DROP TABLE {name}")
+                        dropped.append(name)
+            rolled_up = None
+            if "votes" in partitioned:
+                rolled_up = _roll_up_vote_month(conn, _add_months(current, 1 - VOTES_HOT_MONTHS))
             conn.commit()
         finally:
             conn.close()
-        return True
-
+    except Exception as exc:
+        logging.warning("DB maintain_partitions failed: %s", exc)
+        return None
+    if not (created or dropped or rolled_up):
+        return None
+    return {
+        "created": created,
+        "dropped": dropped,
+        "rolled_up": rolled_up,
+        "rows": len(created) + len(dropped) + (1 if rolled_up else 0),
+    }
+
+
+VOTE_COOLDOWN = timedelta(hours=24)
+# Answers are stored packed in answers_mask; the TEXT answer columns are written as NULL.
+_VOTE_WRITE_COLUMNS = ("target", "target_user_id", "label", "answers_mask", *AXIS_NAMES)
+_CLEARED_ANSWERS = (None,) * len(AXIS_NAMES)
+
+
+def _parse_db_timestamp(value) -> datetime:
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return datetime.strptime(str(value), "%Y-%m-%d %H:%M:%S")
+
+
+def _subtract_archived_vote(conn, target: str, target_user_id: Optional[int], created_at, mask: int) -> None:
+    """Take a replaced vote out of its month's rollup; the vote moves to the hot partitions."""
+    placeholders = ", ".join("%s" for _ in range(COUNT_VECTOR_SIZE))
+    conn.execute(
+        f"""
+        INSERT INTO vote_rollups (target, target_user_id, month, answers, {", ".join(_ROLLUP_SLOT_COLUMNS)})
+        VALUES (%s, %s, date_trunc('month', %s::timestamp), -1, {placeholders})
+        """,
+        (target, target_user_id, created_at, *(-change for change in mask_vector(mask))),
+    )
+
+
+def _add_vote(
+    conn, target: str, label: str, voter_id: Optional[int], target_user_id: Optional[int], values: tuple[str, ...]
+) -> tuple[str, Optional[int]]:
+    """Returns the result and, when an existing feedback vote was replaced, its answers mask."""
+    p = "%s" if USE_POSTGRES else "?"
+    row = None
+    archived_before = None
+    if voter_id is not None:
+        key_column, key = ("target_user_id", target_user_id) if target_user_id is not None else ("target", target)
+        if "votes" in _partitioned:
+            # vote_keys would fail the second of two concurrent inserts, so writers of one
+            # (target, voter) take turns. FOR SHARE waits for a running rollup: the archive
+            # cutoff cannot move under this vote.
+            archive = conn.execute(
+                "SELECT archived_before, pg_advisory_xact_lock(hashtextextended(%s, 0)) FROM vote_archive WHERE id = 1 FOR SHARE",
+                (f"votes:{key_column}:{key}:{voter_id}",),
+            ).fetchone()
+            archived_before = archive[0] if archive else None
+        row = conn.execute(
+            f"""
+            SELECT id, created_at, label, {_packed_mask_expression()}, target, target_user_id
+            FROM votes
+            WHERE {key_column} = {p} AND voter_id = {p}
+            ORDER BY id DESC
+            LIMIT 1
+            """,
+            (key, voter_id),
+        ).fetchone()
+    if not row:
+        columns = ", ".join((*_VOTE_WRITE_COLUMNS, "voter_id"))
+        placeholders = ", ".join([p] * (len(_VOTE_WRITE_COLUMNS) + 1))
+        conn.execute(
+            f"INSERT INTO votes ({columns}) VALUES ({placeholders})",
+            (target, target_user_id, label, encode_answers(values), *_CLEARED_ANSWERS, voter_id),
+        )
+        if label == "feedback" and voter_id is not None and target_user_id is not None:
+            _flag_ref_answerers(conn, f"target_user_id = {p} AND visitor_id = {p}", (target_user_id, voter_id))
+        return "inserted", None
+
+    old_label = str(row[2]) if row[2] is not None else ""
+    previous_mask = None
+    if old_label != "feedback":
+        new_label, result = "feedback", "inserted"
+    elif datetime.utcnow() - _parse_db_timestamp(row[1]) >= VOTE_COOLDOWN:
+        new_label, result = label, "updated"
+        previous_mask = int(row[3])
+        if archived_before is not None and _parse_db_timestamp(row[1]) < _parse_db_timestamp(archived_before):
+            _subtract_archived_vote(conn, row[4], row[5], row[1], previous_mask)
+    else:
+        return "duplicate_recent", None
+    assignments = ", ".join(f"{column} = {p}" for column in _VOTE_WRITE_COLUMNS)
+    conn.execute(
+        f"UPDATE votes SET {assignments}, created_at = CURRENT_TIMESTAMP WHERE id = {p}",
+        (target, target_user_id, new_label, encode_answers(values), *_CLEARED_ANSWERS, int(row[0])),
+    )
+    if result == "inserted" and target_user_id is not None:
+        _flag_ref_answerers(conn, f"target_user_id = {p} AND visitor_id = {p}", (target_user_id, voter_id))
+    return result, previous_mask
+
+
+def _store_vote(
+    name: str,
+    target: str,
+    label: str,
+    voter_id: Optional[int],
+    target_user_id: Optional[int],
+    answers: Optional[Mapping[str, str]],
+) -> tuple[Optional[str], Optional[int]]:
+    values = answer_values(answers)
+    if USE_POSTGRES:
+        try:
+            conn = _get_pg_conn()
+            try:
+                result = _add_vote(conn, target, label, voter_id, target_user_id, values)
+                conn.commit()
+                _written(target, target_user_id, voter_id)
+                return result
+            finally:
+                conn.close()
+        except Exception as exc:
+            logging.warning("DB %s failed: %s", name, exc)
+            return None, None
+    conn = _get_sqlite_conn()
+    try:
+        with conn:
+            result = _add_vote(conn, target, label, voter_id, target_user_id, values)
+    except sqlite3.IntegrityError:
+        return "duplicate_recent", None
+    finally:
+        conn.close()
+    _written(target, target_user_id, voter_id)
+    return result
+
+
+def add_vote(
+    target: str,
+    label: str,
+    voter_id: Optional[int],
+    target_user_id: Optional[int] = None,
+    answers: Optional[Mapping[str, str]] = None,
+) -> Optional[str]:
+    """answers maps axis name -> option (see app.axes); missing or unknown values get the axis default."""
+    return _store_vote("add_vote", target, label, voter_id, target_user_id, answers)[0]
+
+
+def add_vote_with_previous(
+    target: str,
+    label: str,
+    voter_id: Optional[int],
+    target_user_id: Optional[int] = None,
+    answers: Optional[Mapping[str, str]] = None,
+) -> tuple[Optional[str], Optional[int]]:
+    """
+    add_vote that also returns the answers mask of the feedback vote it replaced ("updated"),
+    so callers can tell how the aggregate changed without reading it twice.
+    """
+    return _store_vote("add_vote_with_previous", target, label, voter_id, target_user_id, answers)
+
+
+def _enqueue_relink_sql() -> str:
+    """Queue (user_id, alias) for process_relink_batch; an alias already queued for the user is not added again."""
+    p = "%s" if USE_POSTGRES else "?"
+    queued = (
+        "POSITION(',' || excluded.aliases || ',' IN ',' || relink_queue.aliases || ',') > 0"
+        if USE_POSTGRES
+        else "INSTR(',' || relink_queue.aliases || ',', ',' || excluded.aliases || ',') > 0"
+    )
+    return f"""
+        INSERT INTO relink_queue (user_id, aliases, enqueued_at)
+        VALUES ({p}, {p}, CURRENT_TIMESTAMP)
+        ON CONFLICT(user_id) DO UPDATE SET
+            aliases = CASE WHEN {queued} THEN relink_queue.aliases ELSE relink_queue.aliases || ',' || excluded.aliases END,
+            enqueued_at = CURRENT_TIMESTAMP
+    """
+
+
+def _upsert_user_pg(cur, user_id: int, username: str, first_name: str, last_name: str, photo_url: str, app_user: bool) -> bool:
+    cur.execute("SELECT username FROM users WHERE user_id = %s LIMIT 1", (user_id,))
+    prev_row = cur.fetchone()
+    existed = prev_row is not None
+    prev_username = str(prev_row[0]).lower() if prev_row and prev_row[0] else ""
+    cur.execute(
+        "DELETE FROM users WHERE LOWER(username) = LOWER(%s) AND user_id <> %s",
+        (username, user_id),
+    )
+    cur.execute(
+        """
+        INSERT INTO users (user_id, username, first_name, last_name, photo_url, app_user, updated_at)
+        VALUES (%s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+        ON CONFLICT(user_id) DO UPDATE SET
+            username = EXCLUDED.username,
+            first_name = EXCLUDED.first_name,
+            last_name = EXCLUDED.last_name,
+            photo_url = EXCLUDED.photo_url,
+            app_user = users.app_user OR EXCLUDED.app_user,
+            updated_at = CURRENT_TIMESTAMP
+        """,
+        (user_id, username, first_name, last_name, photo_url, app_user),
+    )
+    if not existed or prev_username != username:
+        for alias in (username, prev_username):
+            if alias:
+                cur.execute(_enqueue_relink_sql(), (user_id, alias))
+    return existed
+
+
+def _upsert_user_sqlite(
+    conn: sqlite3.Connection,
+    user_id: int,
+    username: str,
+    first_name: str,
+    last_name: str,
+    photo_url: str,
+    app_user: bool,
+) -> bool:
+    cur = conn.execute("SELECT username FROM users WHERE user_id = ? LIMIT 1", (user_id,))
+    prev_row = cur.fetchone()
+    existed = prev_row is not None
+    prev_username = str(prev_row[0]).lower() if prev_row and prev_row[0] else ""
+    conn.execute(
+        "DELETE FROM users WHERE LOWER(username) = LOWER(?) AND user_id <> ?",
+        (username, user_id),
+    )
+    conn.execute(
+        """
+        INSERT INTO users (user_id, username, first_name, last_name, photo_url, app_user, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(user_id) DO UPDATE SET
+            username = excluded.username,
+            first_name = excluded.first_name,
+            last_name = excluded.last_name,
+            photo_url = excluded.photo_url,
+            app_user = CASE
+                WHEN users.app_user = 1 OR excluded.app_user = 1 THEN 1
+                ELSE 0
+            END,
+            updated_at = CURRENT_TIMESTAMP
+        """,
+        (user_id, username, first_name, last_name, photo_url, 1 if app_user else 0),
+    )
+    if not existed or prev_username != username:
+        for alias in (username, prev_username):
+            if alias:
+                conn.execute(_enqueue_relink_sql(), (user_id, alias))
+    return existed
+
+
+def upsert_user_with_flag(
+    user_id: int,
+    username: str,
+    first_name: str = "",
+    last_name: str = "",
+    photo_url: str = "",
+    app_user: bool = True,
+) -> bool:
+    username = username.lower()
+    if USE_POSTGRES:
+        try:
+            conn = _get_pg_conn()
+            try:
+                with conn.cursor() as cur:
+                    existed = _upsert_user_pg(cur, user_id, username, first_name, last_name, photo_url, app_user)
+                    conn.commit()
+                    _written(user_id, username)
+                    return not existed
+            finally:
+                conn.close()
+        except Exception as exc:
+            logging.warning("DB upsert_user failed: %s", exc)
+            return False
+    else:
+        conn = _get_sqlite_conn()
+        try:
+            with conn:
+                existed = _upsert_user_sqlite(conn, user_id, username, first_name, last_name, photo_url, app_user)
+        finally:
+            conn.close()
+        _written(user_id, username)
+        return not existed
 
-def add_vote(
-    target: str,
-    label: str,
-    voter_id: Optional[int],
-    target_user_id: Optional[int] = None,
-    tone: str = "serious",
-    speed: str = "slow",
-    contact_format: str = "text",
-    caution: str = "false",
-    initiative: str = "wait",
-    start_context: str = "topic",
-    attention_reaction: str = "careful",
-    frequency: str = "rare",
-    comm_format: str = "reserved",
-    emotion_tone: str = "neutral",
-    feedback_style: str = "soft",
-    uncertainty: str = "high",
-) -> Optional[str]:
-    cooldown = timedelta(hours=24)
 
+def upsert_users_batch(rows: List[Tuple[int, str, str, str, str, bool]]) -> Optional[List[int]]:
+    """
+    Upsert many users in one transaction.
+    rows: (user_id, username, first_name, last_name, photo_url, app_user)
+    Returns ids of users that did not exist before, or None if the batch failed.
+    """
+    if not rows:
+        return []
+    new_ids: List[int] = []
     if USE_POSTGRES:
         try:
             conn = _get_pg_conn()
             try:
                 with conn.cursor() as cur:
-                    if voter_id is None:
-                        cur.execute(
-                            "INSERT INTO votes (target, target_user_id, label, tone, speed, contact_format, caution, initiative, start_context, attention_reaction, frequency, comm_format, emotion_tone, feedback_style, uncertainty, voter_id) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
-                            (target, target_user_id, label, tone, speed, contact_format, caution, initiative, start_context, attention_reaction, frequency, comm_format, emotion_tone, feedback_style, uncertainty, voter_id),
-                        )
-                        conn.commit()
-                        return "inserted"
-
-                    if target_user_id is not None:
-                        cur.execute(
-                            """
-                            SELECT id, created_at, label
-                            FROM votes
-                            WHERE target_user_id = %s AND voter_id = %s
-                            ORDER BY id DESC
-                            LIMIT 1
-                            """,
-                            (target_user_id, voter_id),
-                        )
-                    else:
-                        cur.execute(
-                            """
-                            SELECT id, created_at, label
-                            FROM votes
-                            WHERE target = %s AND voter_id = %s
-                            ORDER BY id DESC
-                            LIMIT 1
-                            """,
-                            (target, voter_id),
-                        )
-                    row = cur.fetchone()
-                    if not row:
-                        cur.execute(
-                            "INSERT INTO votes (target, target_user_id, label, tone, speed, contact_format, caution, initiative, start_context, attention_reaction, frequency, comm_format, emotion_tone, feedback_style, uncertainty, voter_id) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
-                            (target, target_user_id, label, tone, speed, contact_format, caution, initiative, start_context, attention_reaction, frequency, comm_format, emotion_tone, feedback_style, uncertainty, voter_id),
-                        )
-                        conn.commit()
-                        return "inserted"
-
-                    vote_id = int(row[0])
-                    last_ts = row[1]
-                    old_label = str(row[2]) if row[2] is not None else ""
-                    if old_label != "feedback":
-                        cur.execute(
-                            """
-                            UPDATE votes
-                            SET label = %s,
-                                target = %s,
-                                target_user_id = %s,
-                                tone = %s,
-                                speed = %s,
-                                contact_format = %s,
-                                caution = %s,
-                                initiative = %s,
-                                start_context = %s,
-                                attention_reaction = %s,
-                                frequency = %s,
-                                comm_format = %s,
-                                emotion_tone = %s,
-                                feedback_style = %s,
-                                uncertainty = %s,
-                                created_at = CURRENT_TIMESTAMP
-                            WHERE id = %s
-                            """,
-                            ("feedback", target, target_user_id, tone, speed, contact_format, caution, initiative, start_context, attention_reaction, frequency, comm_format, emotion_tone, feedback_style, uncertainty, vote_id),
-                        )
-                        conn.commit()
-                        return "inserted"
-
-                    if isinstance(last_ts, datetime) and datetime.utcnow() - last_ts.replace(tzinfo=None) >= cooldown:
-                        cur.execute(
-                            """
-                            UPDATE votes
-                            SET label = %s,
-                                target = %s,
-                                target_user_id = %s,
-                                tone = %s,
-                                speed = %s,
-                                contact_format = %s,
-                                caution = %s,
-                                initiative = %s,
-                                start_context = %s,
-                                attention_reaction = %s,
-                                frequency = %s,
-                                comm_format = %s,
-                                emotion_tone = %s,
-                                feedback_style = %s,
-                                uncertainty = %s,
-                                created_at = CURRENT_TIMESTAMP
-                            WHERE id = %s
-                            """,
-                            (label, target, target_user_id, tone, speed, contact_format, caution, initiative, start_context, attention_reaction, frequency, comm_format, emotion_tone, feedback_style, uncertainty, vote_id),
-                        )
-                        conn.commit()
-                        return "updated"
-
-                    return "duplicate_recent"
+                    for user_id, username, first_name, last_name, photo_url, app_user in rows:
+                        existed = _upsert_user_pg(cur, user_id, username.lower(), first_name, last_name, photo_url, app_user)
+                        if not existed:
+                            new_ids.append(user_id)
+                    conn.commit()
             finally:
                 conn.close()
         except Exception as exc:
-            logging.warning("DB add_vote failed: %s", exc)
+            logging.warning("DB upsert_users_batch failed: %s", exc)
             return None
+        for user_id, username, *_ in rows:
+            _written(user_id, username.lower())
     else:
         conn = _get_sqlite_conn()
         try:
             with conn:
-                if voter_id is None:
-                    conn.execute(
-                        "INSERT INTO votes (target, target_user_id, label, tone, speed, contact_format, caution, initiative, start_context, attention_reaction, frequency, comm_format, emotion_tone, feedback_style, uncertainty, voter_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                        (target, target_user_id, label, tone, speed, contact_format, caution, initiative, start_context, attention_reaction, frequency, comm_format, emotion_tone, feedback_style, uncertainty, voter_id),
-                    )
-                    return "inserted"
-
-                if target_user_id is not None:
-                    cur = conn.execute(
-                        """
-                        SELECT id, created_at, label
-                        FROM votes
-                        WHERE target_user_id = ? AND voter_id = ?
-                        ORDER BY id DESC
-                        LIMIT 1
-                        """,
-                        (target_user_id, voter_id),
-                    )
-                else:
-                    cur = conn.execute(
-                        """
-                        SELECT id, created_at, label
-                        FROM votes
-                        WHERE target = ? AND voter_id = ?
-                        ORDER BY id DESC
-                        LIMIT 1
-                        """,
-                        (target, voter_id),
-                    )
-                row = cur.fetchone()
-                if not row:
-                    conn.execute(
-                        "INSERT INTO votes (target, target_user_id, label, tone, speed, contact_format, caution, initiative, start_context, attention_reaction, frequency, comm_format, emotion_tone, feedback_style, uncertainty, voter_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                        (target, target_user_id, label, tone, speed, contact_format, caution, initiative, start_context, attention_reaction, frequency, comm_format, emotion_tone, feedback_style, uncertainty, voter_id),
-                    )
-                    return "inserted"
-
-                vote_id = int(row[0])
-                ts_raw = row[1]
-                old_label = str(row[2]) if row[2] is not None else ""
-                if old_label != "feedback":
-                    conn.execute(
-                        """
-                        UPDATE votes
-                        SET label = ?,
-                            target = ?,
-                            target_user_id = ?,
-                            tone = ?,
-                            speed = ?,
-                            contact_format = ?,
-                            caution = ?,
-                            initiative = ?,
-                            start_context = ?,
-                            attention_reaction = ?,
-                            frequency = ?,
-                            comm_format = ?,
-                            emotion_tone = ?,
-                            feedback_style = ?,
-                            uncertainty = ?,
-                            created_at = CURRENT_TIMESTAMP
-                        WHERE id = ?
-                        """,
-                        ("feedback", target, target_user_id, tone, speed, contact_format, caution, initiative, start_context, attention_reaction, frequency, comm_format, emotion_tone, feedback_style, uncertainty, vote_id),
-                    )
-                    return "inserted"
-
-                try:
-                    last_ts = datetime.fromisoformat(str(ts_raw))
-                except ValueError:
-                    last_ts = datetime.strptime(str(ts_raw), "%Y-%m-%d %H:%M:%S")
-
-                if datetime.utcnow() - last_ts >= cooldown:
-                    conn.execute(
-                        """
-                        UPDATE votes
-                        SET label = ?,
-                            target = ?,
-                            target_user_id = ?,
-                            tone = ?,
-                            speed = ?,
-                            contact_format = ?,
-                            caution = ?,
-                            initiative = ?,
-                            start_context = ?,
-                            attention_reaction = ?,
-                            frequency = ?,
-                            comm_format = ?,
-                            emotion_tone = ?,
-                            feedback_style = ?,
-                            uncertainty = ?,
-                            created_at = CURRENT_TIMESTAMP
-                        WHERE id = ?
-                        """,
-                        (label, target, target_user_id, tone, speed, contact_format, caution, initiative, start_context, attention_reaction, frequency, comm_format, emotion_tone, feedback_style, uncertainty, vote_id),
-                    )
-                    return "updated"
-
-                return "duplicate_recent"
-        except sqlite3.IntegrityError:
-            return "duplicate_recent"
+                for user_id, username, first_name, last_name, photo_url, app_user in rows:
+                    existed = _upsert_user_sqlite(conn, user_id, username.lower(), first_name, last_name, photo_url, app_user)
+                    if not existed:
+                        new_ids.append(user_id)
+        except sqlite3.Error as exc:
+            logging.warning("DB upsert_users_batch failed: %s", exc)
+            return None
         finally:
             conn.close()
+        for user_id, username, *_ in rows:
+            _written(user_id, username.lower())
+    return new_ids
 
 
-def upsert_user_with_flag(
+def upsert_user(
     user_id: int,
     username: str,
     first_name: str = "",
     last_name: str = "",
     photo_url: str = "",
     app_user: bool = True,
-) -> bool:
-    username = username.lower()
+) -> None:
+    upsert_user_with_flag(user_id, username, first_name, last_name, photo_url, app_user)
+
+
+# job_state rows counting finished relink jobs and the rows they linked; the queue row is deleted.
+RELINK_DONE_JOBS = ("relink_done", "relink_votes", "relink_refs")
+
+
+def _record_relink_done(conn, votes_linked: int, refs_linked: int) -> None:
+    for name, rows in zip(RELINK_DONE_JOBS, (1, votes_linked, refs_linked)):
+        _save_job_state(conn, name, "", False, rows)
+
+
+def process_relink_batch(batch_size: int = 500) -> Optional[dict]:
+    """
+    Link up to batch_size votes and ref_visits rows of the oldest queued user.
+    Returns progress of the processed job, or None when the queue is empty.
+    """
     if USE_POSTGRES:
         try:
             conn = _get_pg_conn()
             try:
                 with conn.cursor() as cur:
-                    cur.execute("SELECT username FROM users WHERE user_id = %s LIMIT 1", (user_id,))
-                    prev_row = cur.fetchone()
-                    existed = prev_row is not None
-                    prev_username = str(prev_row[0]).lower() if prev_row and prev_row[0] else ""
                     cur.execute(
-                        "DELETE FROM users WHERE LOWER(username) = LOWER(%s) AND user_id <> %s",
-                        (username, user_id),
+                        """
+                        SELECT user_id, aliases, votes_linked, refs_linked
+                        FROM relink_queue
+                        ORDER BY enqueued_at
+                        LIMIT 1
+                        FOR UPDATE SKIP LOCKED
+                        """
                     )
+                    row = cur.fetchone()
+                    if not row:
+                        conn.commit()
+                        return None
+                    user_id = int(row[0])
+                    aliases = sorted({a for a in str(row[1]).split(",") if a})
                     cur.execute(
                         """
-                        INSERT INTO users (user_id, username, first_name, last_name, photo_url, app_user, updated_at)
-                        VALUES (%s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
-                        ON CONFLICT(user_id) DO UPDATE SET
-                            username = EXCLUDED.username,
-                            first_name = EXCLUDED.first_name,
-                            last_name = EXCLUDED.last_name,
-                            photo_url = EXCLUDED.photo_url,
-                            app_user = users.app_user OR EXCLUDED.app_user,
-                            updated_at = CURRENT_TIMESTAMP
+                        UPDATE votes SET target_user_id = %s
+                        WHERE id IN (
+                            SELECT id FROM votes
+                            WHERE LOWER(target) = ANY(%s) AND target_user_id IS NULL
+                            LIMIT %s
+                        )
                         """,
-                        (user_id, username, first_name, last_name, photo_url, app_user),
+                        (user_id, aliases, batch_size),
                     )
-                    aliases = [username]
-                    if prev_username and prev_username not in aliases:
-                        aliases.append(prev_username)
+                    votes_linked = max(cur.rowcount, 0)
                     cur.execute(
-                        """
-                        UPDATE votes
-                        SET target_user_id = %s
-                        WHERE LOWER(target) = ANY(%s)
-                          AND (target_user_id IS NULL OR target_user_id = %s)
-                        """,
-                        (user_id, aliases, user_id),
+                        "UPDATE vote_rollups SET target_user_id = %s WHERE LOWER(target) = ANY(%s) AND target_user_id IS NULL",
+                        (user_id, aliases),
                     )
                     cur.execute(
                         """
-                        UPDATE ref_visits
-                        SET target_user_id = %s
-                        WHERE LOWER(target) = ANY(%s)
-                          AND (target_user_id IS NULL OR target_user_id = %s)
+                        UPDATE ref_visits SET target_user_id = %s
+                        WHERE id IN (
+                            SELECT id FROM ref_visits
+                            WHERE LOWER(target) = ANY(%s) AND target_user_id IS NULL
+                            LIMIT %s
+                        )
                         """,
-                        (user_id, aliases, user_id),
+                        (user_id, aliases, batch_size),
                     )
-                    conn.commit()
-                    return not existed
+                    refs_linked = max(cur.rowcount, 0)
+                    if votes_linked or refs_linked:
+                        _flag_ref_answerers(conn, "target_user_id = %s", (user_id,))
+                    done = votes_linked < batch_size and refs_linked < batch_size
+                    if done:
+                        cur.execute("DELETE FROM relink_queue WHERE user_id = %s", (user_id,))
+                        _record_relink_done(conn, int(row[2] or 0) + votes_linked, int(row[3] or 0) + refs_linked)
+                    else:
+                        cur.execute(
+                            """
+                            UPDATE relink_queue
+                            SET votes_linked = votes_linked + %s,
+                                refs_linked = refs_linked + %s
+                            WHERE user_id = %s
+                            """,
+                            (votes_linked, refs_linked, user_id),
+                        )
+                conn.commit()
             finally:
                 conn.close()
         except Exception as exc:
-            logging.warning("DB upsert_user failed: %s", exc)
-            return False
+            logging.warning("DB process_relink_batch failed: %s", exc)
+            return None
     else:
         conn = _get_sqlite_conn()
         try:
             with conn:
-                cur = conn.execute("SELECT username FROM users WHERE user_id = ? LIMIT 1", (user_id,))
-                prev_row = cur.fetchone()
-                existed = prev_row is not None
-                prev_username = str(prev_row[0]).lower() if prev_row and prev_row[0] else ""
-                conn.execute(
-                    "DELETE FROM users WHERE LOWER(username) = LOWER(?) AND user_id <> ?",
-                    (username, user_id),
-                )
-                conn.execute(
-                    """
-                    INSERT INTO users (user_id, username, first_name, last_name, photo_url, app_user, updated_at)
-                    VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-                    ON CONFLICT(user_id) DO UPDATE SET
-                        username = excluded.username,
-                        first_name = excluded.first_name,
-                        last_name = excluded.last_name,
-                        photo_url = excluded.photo_url,
-                        app_user = CASE
-                            WHEN users.app_user = 1 OR excluded.app_user = 1 THEN 1
-                            ELSE 0
-                        END,
-                        updated_at = CURRENT_TIMESTAMP
-                    """,
-                    (user_id, username, first_name, last_name, photo_url, 1 if app_user else 0),
-                )
-                aliases = [username]
-                if prev_username and prev_username not in aliases:
-                    aliases.append(prev_username)
+                row = conn.execute(
+                    "SELECT user_id, aliases, votes_linked, refs_linked FROM relink_queue ORDER BY enqueued_at LIMIT 1"
+                ).fetchone()
+                if not row:
+                    return None
+                user_id = int(row[0])
+                aliases = sorted({a for a in str(row[1]).split(",") if a})
                 alias_marks = ",".join("?" for _ in aliases)
-                conn.execute(
+                cur = conn.execute(
                     f"""
-                    UPDATE votes
-                    SET target_user_id = ?
-                    WHERE LOWER(target) IN ({alias_marks})
-                      AND (target_user_id IS NULL OR target_user_id = ?)
+                    UPDATE votes SET target_user_id = ?
+                    WHERE id IN (
+                        SELECT id FROM votes
+                        WHERE LOWER(target) IN ({alias_marks}) AND target_user_id IS NULL
+                        LIMIT ?
+                    )
                     """,
-                    (user_id, *aliases, user_id),
+                    (user_id, *aliases, batch_size),
                 )
+                votes_linked = max(cur.rowcount, 0)
                 conn.execute(
+                    f"UPDATE vote_rollups SET target_user_id = ? WHERE LOWER(target) IN ({alias_marks}) AND target_user_id IS NULL",
+                    (user_id, *aliases),
+                )
+                cur = conn.execute(
                     f"""
-                    UPDATE ref_visits
-                    SET target_user_id = ?
-                    WHERE LOWER(target) IN ({alias_marks})
-                      AND (target_user_id IS NULL OR target_user_id = ?)
+                    UPDATE ref_visits SET target_user_id = ?
+                    WHERE id IN (
+                        SELECT id FROM ref_visits
+                        WHERE LOWER(target) IN ({alias_marks}) AND target_user_id IS NULL
+                        LIMIT ?
+                    )
                     """,
-                    (user_id, *aliases, user_id),
+                    (user_id, *aliases, batch_size),
                 )
-                return not existed
+                refs_linked = max(cur.rowcount, 0)
+                if votes_linked or refs_linked:
+                    _flag_ref_answerers(conn, "target_user_id = ?", (user_id,))
+                done = votes_linked < batch_size and refs_linked < batch_size
+                if done:
+                    conn.execute("DELETE FROM relink_queue WHERE user_id = ?", (user_id,))
+                    _record_relink_done(conn, int(row[2] or 0) + votes_linked, int(row[3] or 0) + refs_linked)
+                else:
+                    conn.execute(
+                        """
+                        UPDATE relink_queue
+                        SET votes_linked = votes_linked + ?,
+                            refs_linked = refs_linked + ?
+                        WHERE user_id = ?
+                        """,
+                        (votes_linked, refs_linked, user_id),
+                    )
         finally:
             conn.close()
+    _written(user_id, *aliases)
+    return {
+        "user_id": user_id,
+        "votes": votes_linked,
+        "refs": refs_linked,
+        "rows": votes_linked + refs_linked,
+        "done": done,
+    }
 
 
-def upsert_user(
-    user_id: int,
-    username: str,
-    first_name: str = "",
-    last_name: str = "",
-    photo_url: str = "",
-    app_user: bool = True,
-) -> None:
-    upsert_user_with_flag(user_id, username, first_name, last_name, photo_url, app_user)
+def get_relink_progress() -> dict:
+    """Queued jobs with the rows linked so far, and the totals of finished jobs."""
+    p = "%s" if USE_POSTGRES else "?"
+    sql = f"""
+        SELECT COUNT(*), COALESCE(SUM(votes_linked), 0), COALESCE(SUM(refs_linked), 0),
+               (SELECT rows_processed FROM job_state WHERE name = {p}),
+               (SELECT rows_processed FROM job_state WHERE name = {p}),
+               (SELECT rows_processed FROM job_state WHERE name = {p})
+        FROM relink_queue
+    """
+    if USE_POSTGRES:
+        try:
+            conn = _get_pg_conn()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql, RELINK_DONE_JOBS)
+                    row = cur.fetchone()
+            finally:
+                conn.close()
+        except Exception as exc:
+            logging.warning("DB get_relink_progress failed: %s", exc)
+            row = (0,) * 6
+    else:
+        conn = _get_sqlite_conn()
+        try:
+            row = conn.execute(sql, RELINK_DONE_JOBS).fetchone()
+        finally:
+            conn.close()
+    return {
+        "pending": int(row[0]),
+        "votes_linked": int(row[1]),
+        "refs_linked": int(row[2]),
+        "done": int(row[3] or 0),
+        "done_votes_linked": int(row[4] or 0),
+        "done_refs_linked": int(row[5] or 0),
+    }
 
 
 def get_user_public_by_username(username: str) -> Optional[dict]:
     if USE_POSTGRES:
         try:
-            conn = _get_pg_conn()
+            conn = _get_pg_read_conn(username)
             try:
                 with conn.cursor() as cur:
                     cur.execute(
@@ -795,7 +2245,7 @@ def get_user_public_by_username(username: str) -> Optional[dict]:
 def get_profile_note(user_id: int) -> str:
     if USE_POSTGRES:
         try:
-            conn = _get_pg_conn()
+            conn = _get_pg_read_conn(user_id)
             try:
                 with conn.cursor() as cur:
                     cur.execute("SELECT note FROM profile_prefs WHERE user_id = %s LIMIT 1", (user_id,))
@@ -833,6 +2283,7 @@ def set_profile_note(user_id: int, note: str) -> None:
                         (user_id, note),
                     )
                 conn.commit()
+                _written(user_id)
             finally:
                 conn.close()
         except Exception as exc:
@@ -853,136 +2304,230 @@ def set_profile_note(user_id: int, note: str) -> None:
                 )
         finally:
             conn.close()
-
-
-def normalize_case_data() -> tuple[int, int]:
+        _written(user_id)
+
+
+NORMALIZE_JOB = "normalize_case"
+NORMALIZE_PHASES = ("users_dedupe", "users", "votes", "ref_visits", "seen_hints", "vote_rollups")
+
+
+def _keyset_chunk(conn, table: str, key: str, position: int, batch_size: int) -> tuple[Optional[int], int]:
+    p = "%s" if USE_POSTGRES else "?"
+    row = conn.execute(
+        f"SELECT MAX(k), COUNT(*) FROM (SELECT {key} AS k FROM {table} WHERE {key} > {p} ORDER BY {key} LIMIT {p}) s",
+        (position, batch_size),
+    ).fetchone()
+    return (int(row[0]) if row[0] is not None else None), int(row[1] or 0)
+
+
+def _normalize_case_step(conn, phase: str, position: str, batch_size: int) -> tuple[str, int, int, bool]:
+    """Process one chunk of a phase. Returns (next_position, merged, lowercased, phase_done)."""
+    p = "%s" if USE_POSTGRES else "?"
+    if phase == "users_dedupe":
+        row = conn.execute(
+            f"""
+            SELECT MAX(k), COUNT(*) FROM (
+                SELECT LOWER(username) AS k FROM users
+                WHERE LOWER(username) > {p}
+                ORDER BY LOWER(username)
+                LIMIT {p}
+            ) s
+            """,
+            (position, batch_size),
+        ).fetchone()
+        if row[0] is None:
+            return position, 0, 0, True
+        upper = str(row[0])
+        members = conn.execute(
+            f"""
+            SELECT user_id, LOWER(username) FROM users
+            WHERE LOWER(username) > {p} AND LOWER(username) <= {p}
+            ORDER BY LOWER(username), updated_at DESC, user_id DESC
+            """,
+            (position, upper),
+        ).fetchall()
+        seen: set[str] = set()
+        drop_ids: list[int] = []
+        for uid, key in members:
+            if key in seen:
+                drop_ids.append(int(uid))
+            else:
+                seen.add(key)
+        if drop_ids:
+            marks = ",".join(p for _ in drop_ids)
+            conn.execute(f"DELETE FROM users WHERE user_id IN ({marks})", tuple(drop_ids))
+        return upper, len(drop_ids), 0, int(row[1]) < batch_size
+
+    if phase in ("users", "votes", "ref_visits", "vote_rollups"):
+        table, key, column = {
+            "users": ("users", "user_id", "username"),
+            "votes": ("votes", "id", "target"),
+            "ref_visits": ("ref_visits", "id", "target"),
+            "vote_rollups": ("vote_rollups", "id", "target"),
+        }[phase]
+        start = int(position or 0)
+        upper, scanned = _keyset_chunk(conn, table, key, start, batch_size)
+        if upper is None:
+            return str(start), 0, 0, True
+        # Rows whose lowercase form would collide with a unique index are left as is.
+        guard = {
+            "users": "",
+            "vote_rollups": "",
+            "votes": (
+                "AND NOT EXISTS (SELECT 1 FROM votes o WHERE o.target = LOWER(votes.target)"
+                " AND o.voter_id = votes.voter_id AND o.id <> votes.id)"
+            ),
+            "ref_visits": (
+                "AND NOT EXISTS (SELECT 1 FROM ref_visits o WHERE o.target = LOWER(ref_visits.target)"
+                " AND o.visitor_id = ref_visits.visitor_id AND o.id <> ref_visits.id)"
+            ),
+        }[phase]
+        cur = conn.execute(
+            f"""
+            UPDATE {table} SET {column} = LOWER({column})
+            WHERE {key} > {p} AND {key} <= {p}
+              AND {column} <> LOWER({column})
+              {guard}
+            """,
+            (start, upper),
+        )
+        return str(upper), 0, max(cur.rowcount, 0), scanned < batch_size
+
+    if phase == "seen_hints":
+        last_target, _, last_watcher = position.rpartition("|")
+        last_watcher_id = int(last_watcher or 0)
+        rows = conn.execute(
+            f"""
+            SELECT target, watcher_id FROM seen_hints
+            WHERE target > {p} OR (target = {p} AND watcher_id > {p})
+            ORDER BY target, watcher_id
+            LIMIT {p}
+            """,
+            (last_target, last_target, last_watcher_id, batch_size),
+        ).fetchall()
+        if not rows:
+            return position, 0, 0, True
+        upper_target, upper_watcher = str(rows[-1][0]), int(rows[-1][1])
+        in_range = (
+            f"(target > {p} OR (target = {p} AND watcher_id > {p})) "
+            f"AND (target < {p} OR (target = {p} AND watcher_id <= {p}))"
+        )
+        range_params = (last_target, last_target, last_watcher_id, upper_target, upper_target, upper_watcher)
+        conn.execute(
+            f"""
+            DELETE FROM seen_hints
+            WHERE {in_range}
+              AND target <> LOWER(target)
+              AND EXISTS (
+                  SELECT 1 FROM seen_hints o
+                  WHERE o.target = LOWER(seen_hints.target) AND o.watcher_id = seen_hints.watcher_id
+              )
+            """,
+            range_params,
+        )
+        cur = conn.execute(
+            f"UPDATE seen_hints SET target = LOWER(target) WHERE {in_range} AND target <> LOWER(target)",
+            range_params,
+        )
+        return f"{upper_target}|{upper_watcher}", 0, max(cur.rowcount, 0), len(rows) < batch_size
+
+    raise ValueError(f"unknown normalize phase: {phase}")
+
+
+def normalize_case_batch(batch_size: int = 1000) -> Optional[dict]:
     """
-    Lowercase usernames/targets and collapse users duplicates by case.
-    Returns: (users_merged, rows_lowercased)
+    Run one chunk of the resumable case normalization job and commit it.
+    Returns None once every phase has finished.
     """
-    users_merged = 0
-    rows_lowercased = 0
+    state = get_job_state(NORMALIZE_JOB)
+    if state["done"]:
+        return None
+    phase, _, position = state["cursor"].partition(":")
+    if phase not in NORMALIZE_PHASES:
+        phase, position = NORMALIZE_PHASES[0], ""
+
+    def step(conn) -> dict:
+        next_position, merged, lowercased, phase_done = _normalize_case_step(conn, phase, position, batch_size)
+        done = False
+        if not phase_done:
+            cursor = f"{phase}:{next_position}"
+        elif phase == NORMALIZE_PHASES[-1]:
+            cursor, done = "", True
+        else:
+            cursor = f"{NORMALIZE_PHASES[NORMALIZE_PHASES.index(phase) + 1]}:"
+        _save_job_state(conn, NORMALIZE_JOB, cursor, done, merged + lowercased)
+        return {
+            "phase": phase,
+            "merged": merged,
+            "lowercased": lowercased,
+            "rows": merged + lowercased,
+            "done": done,
+        }
 
     if USE_POSTGRES:
         try:
             conn = _get_pg_conn()
             try:
-                with conn.cursor() as cur:
-                    cur.execute(
-                        """
-                        WITH ranked AS (
-                            SELECT user_id,
-                                   ROW_NUMBER() OVER (
-                                       PARTITION BY LOWER(username)
-                                       ORDER BY updated_at DESC, user_id DESC
-                                   ) AS rn
-                            FROM users
-                        )
-                        DELETE FROM users u
-                        USING ranked r
-                        WHERE u.user_id = r.user_id AND r.rn > 1
-                        """
-                    )
-                    users_merged += max(cur.rowcount, 0)
-
-                    cur.execute("UPDATE users SET username = LOWER(username) WHERE username <> LOWER(username)")
-                    rows_lowercased += max(cur.rowcount, 0)
-                    cur.execute("UPDATE votes SET target = LOWER(target) WHERE target <> LOWER(target)")
-                    rows_lowercased += max(cur.rowcount, 0)
-                    cur.execute("UPDATE ref_visits SET target = LOWER(target) WHERE target <> LOWER(target)")
-                    rows_lowercased += max(cur.rowcount, 0)
-                    cur.execute("UPDATE seen_hints SET target = LOWER(target) WHERE target <> LOWER(target)")
-                    rows_lowercased += max(cur.rowcount, 0)
+                progress = step(conn)
                 conn.commit()
             finally:
                 conn.close()
         except Exception as exc:
-            logging.warning("DB normalize_case_data failed: %s", exc)
+            logging.warning("DB normalize_case_batch failed: %s", exc)
+            return {"job": NORMALIZE_JOB, "rows": 0, "failed": True}
     else:
         conn = _get_sqlite_conn()
         try:
             with conn:
-                try:
-                    cur = conn.execute(
-                        "SELECT user_id, username FROM users ORDER BY updated_at DESC, user_id DESC"
-                    )
-                    keep_by_lower: dict[str, int] = {}
-                    drop_ids: list[int] = []
-                    for row in cur.fetchall():
-                        uid = int(row[0])
-                        uname = str(row[1])
-                        key = uname.lower()
-                        if key in keep_by_lower:
-                            drop_ids.append(uid)
-                        else:
-                            keep_by_lower[key] = uid
-                    for uid in drop_ids:
-                        conn.execute("DELETE FROM users WHERE user_id = ?", (uid,))
-                    users_merged += len(drop_ids)
-                except sqlite3.OperationalError:
-                    pass
-
-                try:
-                    cur = conn.execute("UPDATE users SET username = LOWER(username) WHERE username <> LOWER(username)")
-                    rows_lowercased += max(cur.rowcount, 0)
-                except sqlite3.OperationalError:
-                    pass
-                try:
-                    cur = conn.execute("UPDATE votes SET target = LOWER(target) WHERE target <> LOWER(target)")
-                    rows_lowercased += max(cur.rowcount, 0)
-                except sqlite3.OperationalError:
-                    pass
-                try:
-                    cur = conn.execute("UPDATE ref_visits SET target = LOWER(target) WHERE target <> LOWER(target)")
-                    rows_lowercased += max(cur.rowcount, 0)
-                except sqlite3.OperationalError:
-                    pass
-                try:
-                    cur = conn.execute("UPDATE seen_hints SET target = LOWER(target) WHERE target <> LOWER(target)")
-                    rows_lowercased += max(cur.rowcount, 0)
-                except sqlite3.OperationalError:
-                    pass
+                progress = step(conn)
         finally:
             conn.close()
-
-    return users_merged, rows_lowercased
+    return progress
 
 
 def add_ref_visit(target: str, visitor_id: int, target_user_id: Optional[int] = None) -> bool:
+    p = "%s" if USE_POSTGRES else "?"
+    conflict = "ON CONFLICT DO NOTHING" if USE_POSTGRES else ""
+    verb = "INSERT" if USE_POSTGRES else "INSERT OR IGNORE"
+
+    def insert(conn) -> bool:
+        cur = conn.execute(
+            f"{verb} INTO ref_visits (target, target_user_id, visitor_id) VALUES ({p}, {p}, {p}) {conflict}",
+            (target, target_user_id, visitor_id),
+        )
+        inserted = (cur.rowcount or 0) > 0
+        if inserted and target_user_id is not None:
+            # The visitor may have answered before following the link.
+            _flag_ref_answerers(conn, f"target_user_id = {p} AND visitor_id = {p}", (target_user_id, visitor_id))
+        return inserted
+
     if USE_POSTGRES:
         try:
             conn = _get_pg_conn()
             try:
-                with conn.cursor() as cur:
-                    cur.execute(
-                        "INSERT INTO ref_visits (target, target_user_id, visitor_id) VALUES (%s, %s, %s) ON CONFLICT DO NOTHING",
-                        (target, target_user_id, visitor_id),
-                    )
-                    inserted = cur.rowcount > 0
-                    conn.commit()
-                    return inserted
+                inserted = insert(conn)
+                conn.commit()
+                _written(target, target_user_id)
+                return inserted
             finally:
                 conn.close()
         except Exception as exc:
             logging.warning("DB add_ref_visit failed: %s", exc)
             return False
-    else:
-        conn = _get_sqlite_conn()
-        try:
-            with conn:
-                cur = conn.execute(
-                    "INSERT OR IGNORE INTO ref_visits (target, target_user_id, visitor_id) VALUES (?, ?, ?)",
-                    (target, target_user_id, visitor_id),
-                )
-                return (cur.rowcount or 0) > 0
-        finally:
-            conn.close()
+    conn = _get_sqlite_conn()
+    try:
+        with conn:
+            inserted = insert(conn)
+    finally:
+        conn.close()
+    _written(target, target_user_id)
+    return inserted
 
 
 def count_ref_visitors(target: str, target_user_id: Optional[int] = None) -> int:
     if USE_POSTGRES:
         try:
-            conn = _get_pg_conn()
+            conn = _get_pg_read_conn(target, target_user_id)
             try:
                 with conn.cursor() as cur:
                     if target_user_id is not None:
@@ -993,96 +2538,64 @@ def count_ref_visitors(target: str, target_user_id: Optional[int] = None) -> int
             finally:
                 conn.close()
         except Exception as exc:
-            logging.warning("DB count_ref_visitors failed: %s", exc)
-            return 0
-    else:
-        conn = _get_sqlite_conn()
-        try:
-            if target_user_id is not None:
-                cur = conn.execute("SELECT COUNT(*) FROM ref_visits WHERE target_user_id = ?", (target_user_id,))
-            else:
-                cur = conn.execute("SELECT COUNT(*) FROM ref_visits WHERE target = ?", (target,))
-            total = cur.fetchone()[0]
-        finally:
-            conn.close()
-    return int(total)
-
-
-def count_ref_answerers(target: str, target_user_id: Optional[int] = None) -> int:
-    if USE_POSTGRES:
-        try:
-            conn = _get_pg_conn()
-            try:
-                with conn.cursor() as cur:
-                    if target_user_id is not None:
-                        cur.execute(
-                            """
-                            SELECT COUNT(DISTINCT v.voter_id)
-                            FROM votes v
-                            JOIN ref_visits r
-                              ON r.target_user_id = v.target_user_id
-                             AND r.visitor_id = v.voter_id
-                            WHERE v.target_user_id = %s
-                              AND v.label = 'feedback'
-                              AND v.voter_id IS NOT NULL
-                            """,
-                            (target_user_id,),
-                        )
-                    else:
-                        cur.execute(
-                            """
-                            SELECT COUNT(DISTINCT v.voter_id)
-                            FROM votes v
-                            JOIN ref_visits r
-                              ON r.target = v.target
-                             AND r.visitor_id = v.voter_id
-                            WHERE v.target = %s
-                              AND v.label = 'feedback'
-                              AND v.voter_id IS NOT NULL
-                            """,
-                            (target,),
-                        )
-                    total = cur.fetchone()[0]
-            finally:
-                conn.close()
-        except Exception as exc:
-            logging.warning("DB count_ref_answerers failed: %s", exc)
+            logging.warning("DB count_ref_visitors failed: %s", exc)
             return 0
     else:
         conn = _get_sqlite_conn()
         try:
             if target_user_id is not None:
-                cur = conn.execute(
-                    """
-                    SELECT COUNT(DISTINCT v.voter_id)
-                    FROM votes v
-                    JOIN ref_visits r
-                      ON r.target_user_id = v.target_user_id
-                     AND r.visitor_id = v.voter_id
-                    WHERE v.target_user_id = ?
-                      AND v.label = 'feedback'
-                      AND v.voter_id IS NOT NULL
-                    """,
-                    (target_user_id,),
-                )
+                cur = conn.execute("SELECT COUNT(*) FROM ref_visits WHERE target_user_id = ?", (target_user_id,))
             else:
-                cur = conn.execute(
-                    """
-                    SELECT COUNT(DISTINCT v.voter_id)
-                    FROM votes v
-                    JOIN ref_visits r
-                      ON r.target = v.target
-                     AND r.visitor_id = v.voter_id
-                    WHERE v.target = ?
-                      AND v.label = 'feedback'
-                      AND v.voter_id IS NOT NULL
-                    """,
-                    (target,),
-                )
+                cur = conn.execute("SELECT COUNT(*) FROM ref_visits WHERE target = ?", (target,))
             total = cur.fetchone()[0]
         finally:
             conn.close()
-    return int(total or 0)
+    return int(total)
+
+
+def _count_ref_answerers(conn, target: str, target_user_id: Optional[int]) -> int:
+    p = "%s" if USE_POSTGRES else "?"
+    if target_user_id is not None and _job_ready(conn, REF_ANSWERERS_JOB):
+        row = conn.execute(
+            f"SELECT answerers FROM ref_answerer_counts WHERE target_user_id = {p}", (target_user_id,)
+        ).fetchone()
+        return int(row[0]) if row else 0
+    # Visitors are unique per target, so a semi-join counts distinct answerers without DISTINCT.
+    key_column, key = ("target_user_id", target_user_id) if target_user_id is not None else ("target", target)
+    row = conn.execute(
+        f"""
+        SELECT COUNT(*)
+        FROM ref_visits r
+        WHERE r.{key_column} = {p}
+          AND EXISTS (
+              SELECT 1 FROM votes v
+              WHERE v.{key_column} = r.{key_column}
+                AND v.voter_id = r.visitor_id
+                AND v.label = 'feedback'
+          )
+        """,
+        (key,),
+    ).fetchone()
+    return int(row[0] or 0)
+
+
+def count_ref_answerers(target: str, target_user_id: Optional[int] = None) -> int:
+    """Distinct visitors from the target's ref link who left feedback for the target."""
+    if USE_POSTGRES:
+        try:
+            conn = _get_pg_read_conn(target, target_user_id)
+            try:
+                return _count_ref_answerers(conn, target, target_user_id)
+            finally:
+                conn.close()
+        except Exception as exc:
+            logging.warning("DB count_ref_answerers failed: %s", exc)
+            return 0
+    conn = _get_sqlite_conn()
+    try:
+        return _count_ref_answerers(conn, target, target_user_id)
+    finally:
+        conn.close()
 
 
 def count_pushes_today(user_id: int) -> int:
@@ -1096,7 +2609,8 @@ def count_pushes_today(user_id: int) -> int:
                         SELECT COUNT(*)
                         FROM push_events
                         WHERE user_id = %s
-                          AND created_at::date = CURRENT_DATE
+                          AND created_at >= CURRENT_DATE
+                          AND created_at < CURRENT_DATE + 1
                         """,
                         (user_id,),
                     )
@@ -1154,7 +2668,7 @@ def add_push_event(user_id: int, event_type: str) -> None:
 def get_user_id_by_username(username: str) -> Optional[int]:
     if USE_POSTGRES:
         try:
-            conn = _get_pg_conn()
+            conn = _get_pg_read_conn(username)
             try:
                 with conn.cursor() as cur:
                     cur.execute("SELECT user_id FROM users WHERE LOWER(username) = LOWER(%s)", (username,))
@@ -1177,16 +2691,27 @@ def get_user_id_by_username(username: str) -> Optional[int]:
     return int(row[0])
 
 
+def _feedback_count_sql(where: str) -> str:
+    """
+    COUNT of feedback votes matching where (a filter on target columns). With partitioned votes
+    only months after the archive cutoff are scanned and where is used twice.
+    """
+    if "votes" not in _partitioned:
+        return f"SELECT COUNT(*) FROM votes WHERE {where} AND label = 'feedback'"
+    return f"""
+        SELECT (SELECT COUNT(*) FROM votes WHERE {where} AND label = 'feedback' AND {_HOT_VOTES})
+             + COALESCE((SELECT SUM(answers) FROM vote_rollups WHERE {where}), 0)
+    """
+
+
 def get_total(target: str, target_user_id: Optional[int] = None) -> int:
     if USE_POSTGRES:
         try:
-            conn = _get_pg_conn()
+            conn = _get_pg_read_conn(target, target_user_id)
             try:
                 with conn.cursor() as cur:
-                    if target_user_id is not None:
-                        cur.execute("SELECT COUNT(*) FROM votes WHERE target_user_id = %s AND label = 'feedback'", (target_user_id,))
-                    else:
-                        cur.execute("SELECT COUNT(*) FROM votes WHERE target = %s AND label = 'feedback'", (target,))
+                    where, key = ("target_user_id = %s", target_user_id) if target_user_id is not None else ("target = %s", target)
+                    cur.execute(_feedback_count_sql(where), (key,) * (2 if "votes" in _partitioned else 1))
                     total = cur.fetchone()[0]
             finally:
                 conn.close()
@@ -1209,7 +2734,7 @@ def get_total(target: str, target_user_id: Optional[int] = None) -> int:
 def count_users() -> int:
     if USE_POSTGRES:
         try:
-            conn = _get_pg_conn()
+            conn = _get_pg_read_conn()
             try:
                 with conn.cursor() as cur:
                     cur.execute("SELECT COUNT(*) FROM users")
@@ -1232,10 +2757,10 @@ def count_users() -> int:
 def count_votes() -> int:
     if USE_POSTGRES:
         try:
-            conn = _get_pg_conn()
+            conn = _get_pg_read_conn()
             try:
                 with conn.cursor() as cur:
-                    cur.execute("SELECT COUNT(*) FROM votes WHERE label = 'feedback'")
+                    cur.execute(_feedback_count_sql("TRUE"))
                     total = cur.fetchone()[0]
             finally:
                 conn.close()
@@ -1255,7 +2780,7 @@ def count_votes() -> int:
 def top_voters(limit: int = 10) -> List[Tuple[Optional[str], int]]:
     if USE_POSTGRES:
         try:
-            conn = _get_pg_conn()
+            conn = _get_pg_read_conn()
             try:
                 with conn.cursor() as cur:
                     cur.execute(
@@ -1300,20 +2825,23 @@ def top_voters(limit: int = 10) -> List[Tuple[Optional[str], int]]:
 def top_targets(limit: int = 10) -> List[Tuple[str, int]]:
     if USE_POSTGRES:
         try:
-            conn = _get_pg_conn()
+            conn = _get_pg_read_conn()
             try:
                 with conn.cursor() as cur:
-                    cur.execute(
+                    if "votes" in _partitioned:
+                        source = f"""
+                            SELECT target, SUM(cnt) AS cnt FROM (
+                                SELECT target, COUNT(id) AS cnt FROM votes
+                                WHERE label = 'feedback' AND {_HOT_VOTES}
+                                GROUP BY target
+                                UNION ALL
+                                SELECT target, SUM(answers) FROM vote_rollups GROUP BY target
+                            ) counts
+                            GROUP BY target
                         """
-                    SELECT target, COUNT(id) as cnt
-                    FROM votes
-                    WHERE label = 'feedback'
-                    GROUP BY target
-                        ORDER BY cnt DESC
-                        LIMIT %s
-                        """,
-                        (limit,),
-                    )
+                    else:
+                        source = "SELECT target, COUNT(id) AS cnt FROM votes WHERE label = 'feedback' GROUP BY target"
+                    cur.execute(f"{source} ORDER BY cnt DESC LIMIT %s", (limit,))
                     rows = cur.fetchall()
             finally:
                 conn.close()
@@ -1340,10 +2868,195 @@ def top_targets(limit: int = 10) -> List[Tuple[str, int]]:
     return [(row[0], int(row[1])) for row in rows]
 
 
-def list_users(limit: int = 100) -> List[str]:
+PROFILE_VIEWS_LOCK_ID = 7240529
+PROFILE_VIEWS_CHUNK = 200
+
+
+def _write_profile_views(conn, rows: Sequence[tuple]) -> None:
+    p = "%s" if USE_POSTGRES else "?"
+    for start in range(0, len(rows), PROFILE_VIEWS_CHUNK):
+        chunk = rows[start : start + PROFILE_VIEWS_CHUNK]
+        stored = dict(
+            conn.execute(
+                f"SELECT target, sketch FROM profile_views WHERE target IN ({', '.join([p] * len(chunk))})",
+                [target for target, _, _ in chunk],
+            ).fetchall()
+        )
+        params: list = []
+        for target, views, sketch in chunk:
+            if stored.get(target):
+                merged = ViewerSketch.from_bytes(stored[target])
+                merged.merge(sketch)
+                sketch = merged
+            params += (target, views, sketch.estimate(), sketch.to_bytes())
+        values = ", ".join(f"({p}, {p}, {p}, {p}, CURRENT_TIMESTAMP)" for _ in chunk)
+        conn.execute(
+            f"""
+            INSERT INTO profile_views (target, views, viewers, sketch, updated_at)
+            VALUES {values}
+            ON CONFLICT(target) DO UPDATE SET
+                views = profile_views.views + excluded.views,
+                viewers = excluded.viewers,
+                sketch = excluded.sketch,
+                updated_at = CURRENT_TIMESTAMP
+            """,
+            params,
+        )
+
+
+def add_profile_views(rows: Sequence[tuple]) -> bool:
+    """
+    Add a batch of (target, views, app.views.ViewerSketch) to profile_views in one
+    transaction: counts are summed and sketches merged with the stored ones, one multi-row
+    upsert per chunk. Flushes take turns (advisory lock / BEGIN IMMEDIATE) so no process
+    overwrites a sketch it did not merge. Cached profiles are left alone: view counts refresh
+    on the payload TTL. Returns False when the batch was not written.
+    """
+    if not rows:
+        return True
+    if USE_POSTGRES:
+        try:
+            conn = _get_pg_conn()
+            try:
+                conn.execute("SELECT pg_advisory_xact_lock(%s)", (PROFILE_VIEWS_LOCK_ID,))
+                _write_profile_views(conn, rows)
+                conn.commit()
+                return True
+            finally:
+                conn.close()
+        except Exception as exc:
+            logging.warning("DB add_profile_views failed: %s", exc)
+            return False
+    conn = _get_sqlite_conn()
+    try:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            _write_profile_views(conn, rows)
+        return True
+    except sqlite3.Error as exc:
+        logging.warning("DB add_profile_views failed: %s", exc)
+        return False
+    finally:
+        conn.close()
+
+
+POPULAR_SAMPLE_ROWS = 50000
+
+
+def popular_targets(limit: int = 100, sample: int = POPULAR_SAMPLE_ROWS) -> List[Tuple[str, int]]:
+    """
+    Targets with the most feedback and ref visits among the latest `sample` rows of each.
+    Reading recent rows by primary key keeps the cost flat however large the tables grow.
+    """
+    p = "%s" if USE_POSTGRES else "?"
+    sql = f"""
+        SELECT target, COUNT(*) AS score
+        FROM (
+            SELECT * FROM (
+                SELECT LOWER(target) AS target FROM votes WHERE label = 'feedback' ORDER BY id DESC LIMIT {p}
+            ) recent_votes
+            UNION ALL
+            SELECT * FROM (
+                SELECT LOWER(target) AS target FROM ref_visits ORDER BY id DESC LIMIT {p}
+            ) recent_visits
+        ) recent
+        GROUP BY target
+        ORDER BY score DESC, target
+        LIMIT {p}
+    """
+    params = (sample, sample, limit)
+    if USE_POSTGRES:
+        try:
+            conn = _get_pg_read_conn()
+            try:
+                rows = conn.execute(sql, params).fetchall()
+            finally:
+                conn.close()
+        except Exception as exc:
+            logging.warning("DB popular_targets failed: %s", exc)
+            return []
+    else:
+        conn = _get_sqlite_conn()
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+    return [(row[0], int(row[1])) for row in rows]
+
+
+def save_stats_snapshot(name: str, payload: dict) -> None:
+    data = json.dumps(payload, ensure_ascii=False)
     if USE_POSTGRES:
         try:
             conn = _get_pg_conn()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        """
+                        INSERT INTO stats_snapshot (name, payload, computed_at)
+                        VALUES (%s, %s, CURRENT_TIMESTAMP)
+                        ON CONFLICT(name) DO UPDATE SET
+                            payload = EXCLUDED.payload,
+                            computed_at = CURRENT_TIMESTAMP
+                        """,
+                        (name, data),
+                    )
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception as exc:
+            logging.warning("DB save_stats_snapshot failed: %s", exc)
+    else:
+        conn = _get_sqlite_conn()
+        try:
+            with conn:
+                conn.execute(
+                    """
+                    INSERT INTO stats_snapshot (name, payload, computed_at)
+                    VALUES (?, ?, CURRENT_TIMESTAMP)
+                    ON CONFLICT(name) DO UPDATE SET
+                        payload = excluded.payload,
+                        computed_at = CURRENT_TIMESTAMP
+                    """,
+                    (name, data),
+                )
+        finally:
+            conn.close()
+
+
+def get_stats_snapshot(name: str) -> Optional[dict]:
+    if USE_POSTGRES:
+        try:
+            conn = _get_pg_read_conn()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT payload FROM stats_snapshot WHERE name = %s", (name,))
+                    row = cur.fetchone()
+            finally:
+                conn.close()
+        except Exception as exc:
+            logging.warning("DB get_stats_snapshot failed: %s", exc)
+            return None
+    else:
+        conn = _get_sqlite_conn()
+        try:
+            cur = conn.execute("SELECT payload FROM stats_snapshot WHERE name = ?", (name,))
+            row = cur.fetchone()
+        finally:
+            conn.close()
+    if not row:
+        return None
+    try:
+        payload = json.loads(row[0])
+    except (TypeError, ValueError):
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+def list_users(limit: int = 100) -> List[str]:
+    if USE_POSTGRES:
+        try:
+            conn = _get_pg_read_conn()
             try:
                 with conn.cursor() as cur:
                     cur.execute(
@@ -1369,6 +3082,90 @@ def list_users(limit: int = 100) -> List[str]:
     return [row[0] for row in rows]
 
 
+def list_users_page(
+    limit: int = 50,
+    cursor: Optional[Tuple[str, int]] = None,
+) -> Tuple[List[dict], Optional[Tuple[str, int]]]:
+    """
+    Users ordered by (updated_at, user_id) descending, starting after cursor.
+    Returns the page and the cursor for the next one (None on the last page).
+    """
+    if USE_POSTGRES:
+        try:
+            conn = _get_pg_read_conn()
+            try:
+                with conn.cursor() as cur:
+                    if cursor is None:
+                        cur.execute(
+                            """
+                            SELECT user_id, username, first_name, last_name, app_user, updated_at
+                            FROM users
+                            ORDER BY updated_at DESC, user_id DESC
+                            LIMIT %s
+                            """,
+                            (limit + 1,),
+                        )
+                    else:
+                        cur.execute(
+                            """
+                            SELECT user_id, username, first_name, last_name, app_user, updated_at
+                            FROM users
+                            WHERE (updated_at, user_id) < (%s::timestamp, %s)
+                            ORDER BY updated_at DESC, user_id DESC
+                            LIMIT %s
+                            """,
+                            (cursor[0], cursor[1], limit + 1),
+                        )
+                    rows = cur.fetchall()
+            finally:
+                conn.close()
+        except Exception as exc:
+            logging.warning("DB list_users_page failed: %s", exc)
+            return [], None
+    else:
+        conn = _get_sqlite_conn()
+        try:
+            if cursor is None:
+                cur = conn.execute(
+                    """
+                    SELECT user_id, username, first_name, last_name, app_user, updated_at
+                    FROM users
+                    ORDER BY updated_at DESC, user_id DESC
+                    LIMIT ?
+                    """,
+                    (limit + 1,),
+                )
+            else:
+                cur = conn.execute(
+                    """
+                    SELECT user_id, username, first_name, last_name, app_user, updated_at
+                    FROM users
+                    WHERE (updated_at, user_id) < (?, ?)
+                    ORDER BY updated_at DESC, user_id DESC
+                    LIMIT ?
+                    """,
+                    (cursor[0], cursor[1], limit + 1),
+                )
+            rows = cur.fetchall()
+        finally:
+            conn.close()
+    items = [
+        {
+            "id": int(row[0]),
+            "username": str(row[1]),
+            "first_name": str(row[2] or ""),
+            "last_name": str(row[3] or ""),
+            "app_user": bool(row[4]),
+            "updated_at": str(row[5] or ""),
+        }
+        for row in rows[:limit]
+    ]
+    next_cursor = None
+    if len(rows) > limit and items:
+        next_cursor = (items[-1]["updated_at"], items[-1]["id"])
+    return items, next_cursor
+
+
 def search_users(query: str, limit: int = 20) -> List[str]:
     q = query.strip().lower().lstrip("@")
     if not q:
@@ -1376,7 +3173,7 @@ def search_users(query: str, limit: int = 20) -> List[str]:
     pattern = f"@{q}%"
     if USE_POSTGRES:
         try:
-            conn = _get_pg_conn()
+            conn = _get_pg_read_conn()
             try:
                 with conn.cursor() as cur:
                     cur.execute(
@@ -1417,7 +3214,7 @@ def search_users(query: str, limit: int = 20) -> List[str]:
 def get_username_by_user_id(user_id: int) -> Optional[str]:
     if USE_POSTGRES:
         try:
-            conn = _get_pg_conn()
+            conn = _get_pg_read_conn(user_id)
             try:
                 with conn.cursor() as cur:
                     cur.execute("SELECT username FROM users WHERE user_id = %s", (user_id,))
@@ -1447,6 +3244,7 @@ def delete_user_by_user_id(user_id: int) -> None:
                 with conn.cursor() as cur:
                     cur.execute("DELETE FROM users WHERE user_id = %s", (user_id,))
                     conn.commit()
+                    _written(user_id)
             finally:
                 conn.close()
         except Exception as exc:
@@ -1458,69 +3256,293 @@ def delete_user_by_user_id(user_id: int) -> None:
                 conn.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
         finally:
             conn.close()
+        _written(user_id)
+
+
+def _contact_counts(conn, target: str, target_user_id: Optional[int], with_visitors: bool = False) -> tuple[int, list[int], int]:
+    """
+    Answer total, the axes count vector and (optionally) ref visitors in one aggregate statement.
+    With partitioned votes only months after the archive cutoff are scanned; earlier months
+    come from vote_rollups.
+    """
+    p = "%s" if USE_POSTGRES else "?"
+    if target_user_id is not None:
+        where, key = f"target_user_id = {p}", target_user_id
+    else:
+        where, key = f"target = {p}", target
+    # One bit test per slot; rows whose answers are no options keep answers_mask without those bits.
+    sums = ", ".join(f"SUM((answers_mask >> {position}) & 1)" for position in range(COUNT_VECTOR_SIZE))
+    votes = "votes"
+    if not _job_ready(conn, ANSWERS_MASK_JOB):
+        # Rows not reached by the backfill may hold TEXT answers or a mask in the old layout.
+        votes = f"""(
+            SELECT target, target_user_id, label, created_at, {_packed_mask_expression()} AS answers_mask FROM votes
+        ) votes"""
+    visitors_sql = f", (SELECT COUNT(*) FROM ref_visits WHERE {where})" if with_visitors else ""
+    archived = "votes" in _partitioned
+    if archived:
+        rollup_sums = ", ".join(f"SUM({column})" for column in _ROLLUP_SLOT_COLUMNS)
+        sql = f"""
+            SELECT hot.*, archive.*{visitors_sql}
+            FROM (
+                SELECT COUNT(*), {sums} FROM {votes}
+                WHERE {where} AND label = 'feedback' AND {_HOT_VOTES}
+            ) hot
+            CROSS JOIN (SELECT SUM(answers), {rollup_sums} FROM vote_rollups WHERE {where}) archive
+        """
+        params = (key,) * (3 if with_visitors else 2)
+    else:
+        sql = f"SELECT COUNT(*), {sums}{visitors_sql} FROM {votes} WHERE {where} AND label = 'feedback'"
+        params = (key, key) if with_visitors else (key,)
+    row = conn.execute(sql, params).fetchone()
+    total = int(row[0] or 0)
+    counts = [int(value or 0) for value in row[1 : 1 + COUNT_VECTOR_SIZE]]
+    if archived:
+        archive = row[1 + COUNT_VECTOR_SIZE : 2 + 2 * COUNT_VECTOR_SIZE]
+        total += int(archive[0] or 0)
+        counts = [count + int(value or 0) for count, value in zip(counts, archive[1:])]
+    visitors = int(row[-1] or 0) if with_visitors else 0
+    return total, counts, visitors
 
 
 def get_contact_dimensions(target: str, target_user_id: Optional[int] = None) -> dict[str, dict[str, int]]:
-    fields = {
-        "tone": ("easy", "serious"),
-        "speed": ("fast", "slow"),
-        "contact_format": ("text", "live"),
-        "initiative": ("self", "wait"),
-        "start_context": ("topic", "direct"),
-        "attention_reaction": ("likes", "careful"),
-        "caution": ("true", "false"),
-        "frequency": ("often", "rare"),
-        "comm_format": ("informal", "reserved"),
-        "emotion_tone": ("warm", "neutral"),
-        "feedback_style": ("direct", "soft"),
-        "uncertainty": ("low", "high"),
-    }
-    result: dict[str, dict[str, int]] = {
-        key: {option: 0 for option in options} for key, options in fields.items()
+    if USE_POSTGRES:
+        try:
+            conn = _get_pg_read_conn(target, target_user_id)
+            try:
+                return counts_to_dimensions(_contact_counts(conn, target, target_user_id)[1])
+            finally:
+                conn.close()
+        except Exception as exc:
+            logging.warning("DB get_contact_dimensions failed: %s", exc)
+            return counts_to_dimensions([0] * COUNT_VECTOR_SIZE)
+    conn = _get_sqlite_conn()
+    try:
+        return counts_to_dimensions(_contact_counts(conn, target, target_user_id)[1])
+    finally:
+        conn.close()
+
+
+def _read_profile_counts(conn, target: str) -> dict:
+    p = "%s" if USE_POSTGRES else "?"
+    row = conn.execute(
+        f"""
+        SELECT (SELECT user_id FROM users WHERE LOWER(username) = LOWER({p}) LIMIT 1),
+               (SELECT viewers FROM profile_views WHERE target = LOWER({p}))
+        """,
+        (target, target),
+    ).fetchone()
+    target_user_id = int(row[0]) if row[0] is not None else None
+    total, counts, visitors = _contact_counts(conn, target, target_user_id, with_visitors=True)
+    return {
+        "target_user_id": target_user_id,
+        "total": total,
+        "visitors": visitors,
+        "viewers": int(row[1] or 0),
+        "counts": counts,
     }
 
+
+def get_profile_counts(target: str) -> dict:
+    """
+    Everything a profile evaluation reads: target user id, answer total, ref visitors,
+    estimated unique viewers, axes count vector.
+    """
+    if USE_POSTGRES:
+        try:
+            conn = _get_pg_read_conn(target)
+            try:
+                return _read_profile_counts(conn, target)
+            finally:
+                conn.close()
+        except Exception as exc:
+            logging.warning("DB get_profile_counts failed: %s", exc)
+            return {
+                "target_user_id": None,
+                "total": 0,
+                "visitors": 0,
+                "viewers": 0,
+                "counts": [0] * COUNT_VECTOR_SIZE,
+            }
+    conn = _get_sqlite_conn()
+    try:
+        return _read_profile_counts(conn, target)
+    finally:
+        conn.close()
+
+
+def read_feedback_masks_page(after_id: int = 0, limit: int = 50000) -> Tuple[List[tuple], Optional[int]]:
+    """
+    Feedback votes by id after after_id, as (target_user_id or 0, target when target_user_id
+    is NULL, answers_mask). Returns the page and the cursor for the next one (None on the last page).
+    """
+    p = "%s" if USE_POSTGRES else "?"
+    sql = f"""
+        SELECT id, COALESCE(target_user_id, 0),
+               CASE WHEN target_user_id IS NULL THEN target END,
+               {_packed_mask_expression()}
+        FROM votes
+        WHERE id > {p} AND label = 'feedback'
+        ORDER BY id
+        LIMIT {p}
+    """
     if USE_POSTGRES:
         try:
             conn = _get_pg_conn()
             try:
-                with conn.cursor() as cur:
-                    for field, options in fields.items():
-                        if target_user_id is not None:
-                            cur.execute(
-                                f"SELECT {field}, COUNT(*) FROM votes WHERE target_user_id = %s AND label = 'feedback' GROUP BY {field}",
-                                (target_user_id,),
-                            )
-                        else:
-                            cur.execute(
-                                f"SELECT {field}, COUNT(*) FROM votes WHERE target = %s AND label = 'feedback' GROUP BY {field}",
-                                (target,),
-                            )
-                        for value, cnt in cur.fetchall():
-                            if value in options:
-                                result[field][str(value)] = int(cnt)
+                rows = conn.execute(sql, (after_id, limit)).fetchall()
             finally:
                 conn.close()
         except Exception as exc:
-            logging.warning("DB get_contact_dimensions failed: %s", exc)
-            return result
+            logging.warning("DB read_feedback_masks_page failed: %s", exc)
+            return [], None
     else:
         conn = _get_sqlite_conn()
         try:
-            for field, options in fields.items():
-                if target_user_id is not None:
-                    cur = conn.execute(
-                        f"SELECT {field}, COUNT(*) FROM votes WHERE target_user_id = ? AND label = 'feedback' GROUP BY {field}",
-                        (target_user_id,),
-                    )
-                else:
-                    cur = conn.execute(
-                        f"SELECT {field}, COUNT(*) FROM votes WHERE target = ? AND label = 'feedback' GROUP BY {field}",
-                        (target,),
-                    )
-                for value, cnt in cur.fetchall():
-                    if value in options:
-                        result[field][str(value)] = int(cnt)
+            rows = conn.execute(sql, (after_id, limit)).fetchall()
         finally:
             conn.close()
+    next_cursor = int(rows[-1][0]) if len(rows) == limit else None
+    return [tuple(row[1:]) for row in rows], next_cursor
 
-    return result
+
+def count_ref_visitors_by_target() -> List[tuple]:
+    """(target_user_id or 0, target when target_user_id is NULL, visits) for every ref link target."""
+    sql = """
+        SELECT COALESCE(target_user_id, 0), CASE WHEN target_user_id IS NULL THEN target END, COUNT(*)
+        FROM ref_visits
+        GROUP BY 1, 2
+    """
+    if USE_POSTGRES:
+        try:
+            conn = _get_pg_conn()
+            try:
+                return [tuple(row) for row in conn.execute(sql).fetchall()]
+            finally:
+                conn.close()
+        except Exception as exc:
+            logging.warning("DB count_ref_visitors_by_target failed: %s", exc)
+            return []
+    conn = _get_sqlite_conn()
+    try:
+        return [tuple(row) for row in conn.execute(sql).fetchall()]
+    finally:
+        conn.close()
+
+
+def list_usernames_by_user_id() -> List[Tuple[int, str]]:
+    """(user_id, lowercased username) for every user with a username."""
+    sql = "SELECT user_id, LOWER(username) FROM users WHERE username IS NOT NULL AND username <> ''"
+    if USE_POSTGRES:
+        try:
+            conn = _get_pg_conn()
+            try:
+                return [(int(row[0]), str(row[1])) for row in conn.execute(sql).fetchall()]
+            finally:
+                conn.close()
+        except Exception as exc:
+            logging.warning("DB list_usernames_by_user_id failed: %s", exc)
+            return []
+    conn = _get_sqlite_conn()
+    try:
+        return [(int(row[0]), str(row[1])) for row in conn.execute(sql).fetchall()]
+    finally:
+        conn.close()
+
+
+PROFILE_RESULT_COLUMNS = (
+    "target",
+    "target_user_id",
+    "answers",
+    "visitors",
+    "enough",
+    "caution_ratio",
+    "picks",
+    "hints",
+    "result_rows",
+)
+
+
+def replace_profile_results(rows: Sequence[tuple]) -> int:
+    """Replace the whole profile_results table in one transaction; rows follow PROFILE_RESULT_COLUMNS."""
+    p = "%s" if USE_POSTGRES else "?"
+    sql = (
+        f"INSERT INTO profile_results ({', '.join(PROFILE_RESULT_COLUMNS)}) "
+        f"VALUES ({', '.join([p] * len(PROFILE_RESULT_COLUMNS))})"
+    )
+    if USE_POSTGRES:
+        try:
+            conn = _get_pg_conn()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("DELETE FROM profile_results")
+                    cur.executemany(sql, rows)
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception as exc:
+            logging.warning("DB replace_profile_results failed: %s", exc)
+            return 0
+        return len(rows)
+    conn = _get_sqlite_conn()
+    try:
+        with conn:
+            conn.execute("DELETE FROM profile_results")
+            conn.executemany(sql, rows)
+    finally:
+        conn.close()
+    return len(rows)
+
+
+_CALL_OBSERVERS: List[Callable[[str, float, bool], None]] = []
+
+
+def add_call_observer(observer: Callable[[str, float, bool], None]) -> None:
+    """Register observer(function_name, seconds, ok) for every public db function call."""
+    _CALL_OBSERVERS.append(observer)
+
+
+def _observed(func: Callable) -> Callable:
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _CURRENT_FUNCTION.set(name)
+        started = time.perf_counter()
+        ok = False
+        try:
+            result = func(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            _CURRENT_FUNCTION.reset(token)
+            elapsed = time.perf_counter() - started
+            for observer in _CALL_OBSERVERS:
+                try:
+                    observer(name, elapsed, ok)
+                except Exception:
+                    pass
+
+    return wrapper
+
+
+def _observe_public_functions() -> None:
+    skip = {
+        "add_call_observer",
+        "add_query_observer",
+        "add_write_observer",
+        "start_query_stats",
+        "get_query_stats",
+        "stop_query_stats",
+        "sql_fingerprint",
+        "database_available",
+        "failures_in_context",
+    }
+    for name, value in list(globals().items()):
+        if name.startswith("_") or name in skip:
+            continue
+        if inspect.isfunction(value) and value.__module__ == __name__:
+            globals()[name] = _observed(value)
+
+
+_observe_public_functions()
@@ -1,39 +1,80 @@
 import asyncio
+import base64
+import csv
+import io
 import logging
 import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
 from typing import Optional
 
 from aiogram import Bot, Dispatcher, F, Router, types
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.filters import Command, CommandStart
 from aiogram.filters.command import CommandObject
 from dotenv import load_dotenv
-from flask import Flask, Response, jsonify, render_template, request
+from flask import Flask, Response, g, jsonify, render_template, request, stream_with_context
 
 import db
+from app.admin_stats import AdminStatsSnapshot, format_computed_at
+from app.axes import normalize_answers
+from app.cache import PayloadCache, create_cache
+from app.jobs import BatchWorker
+from app.metrics import (
+    HTTP_LATENCY,
+    HTTP_REQUESTS,
+    REGISTRY,
+    CallbackMetric,
+    InFlight,
+    TelegramMetricsMiddleware,
+    observe_db_call,
+    observe_db_query,
+)
 from app.profile import (
-    build_contact_insight_text,
     build_profile_payload,
-    normalize_feedback_value,
+    evaluate_profile,
     normalize_username,
 )
 from app.push import PushManager
+from app.ratelimit import ConcurrencyGate, RateLimiter, retry_after_header
+from app.recompute import recompute_profiles
 from app.telegram_profile import (
     fetch_avatar_from_telegram,
     fetch_public_user_from_telegram,
     fetch_user_bio_from_telegram,
 )
-from app.ui import build_launch_kb
-from app.webapp_auth import build_avatar_proxy_url, get_webapp_user
+from app.ui import (
+    USERS_PAGE_CALLBACK_PREFIX,
+    build_launch_kb,
+    build_users_page_kb,
+    decode_users_cursor,
+)
+from app.user_sync import UserSyncer
+from app.views import ProfileViews
+from app.warmup import ProfileWarmer
+from app.webapp_auth import INIT_DATA_CACHE, build_avatar_proxy_url, derive_webapp_secret, get_webapp_user
 
 load_dotenv()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 if not BOT_TOKEN:
     raise SystemExit("BOT_TOKEN is not set. Put it in .env or environment.")
+derive_webapp_secret(BOT_TOKEN)
 PORT = int(os.getenv("PORT", "8080"))
 ADMIN_USERNAME = os.getenv("ADMIN_USERNAME", "bulushew").lstrip("@").lower()
 MINI_APP_URL = os.getenv("MINI_APP_URL", "").strip()
 BOT_PUBLIC_USERNAME = os.getenv("BOT_USERNAME", "getxposedbot").lstrip("@")
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "").strip()
+# Alternative Bot API server (local Bot API server, or bench/fake_telegram.py for load tests).
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "").strip()
+# Shared cache server (redis://host:port/db, or bench/fake_cache.py); caches stay in-process when empty.
+CACHE_URL = os.getenv("CACHE_URL", "").strip()
+PAYLOAD_CACHE_SECONDS = float(os.getenv("PAYLOAD_CACHE_SECONDS", "30"))
+# How many of the most active targets the warmer keeps cached; 0 turns it off.
+WARMUP_TARGETS = int(os.getenv("WARMUP_TARGETS", "100"))
 
 logging.basicConfig(level=logging.WARNING)
 
@@ -45,6 +86,211 @@ APP_BOT: Optional[Bot] = None
 APP_LOOP: Optional[asyncio.AbstractEventLoop] = None
 INITDATA_MAX_AGE_SECONDS = 86400
 PUSH_TIMEOUT_SECONDS = 15.0
+USER_SYNC_TTL_SECONDS = 900.0
+RELINK_BATCH_SIZE = 500
+BACKFILL_BATCH_SIZE = 1000
+NORMALIZE_BATCH_SIZE = 1000
+REF_ANSWERERS_RECOUNT_SECONDS = 3600.0
+ADMIN_STATS_REFRESH_SECONDS = 300.0
+USERS_PAGE_SIZE = 50
+USERS_EXPORT_PAGE_SIZE = 1000
+DB_THREAD_POOL_SIZE = 32
+QUERIES_PER_REQUEST_WARN = 12
+CHAT_INFO_TTL_SECONDS = 3600
+CHAT_INFO_MISS_TTL_SECONDS = 600
+AVATAR_CACHE_SIZE = 500
+WARMUP_PER_SECOND = 5.0
+WARMUP_PAUSE_SECONDS = 30.0
+VIEWS_FLUSH_SECONDS = 10.0
+VIEWS_POLL_SECONDS = 1.0
+
+
+# Per-endpoint token buckets: (requests per second, burst), keyed by Telegram user id.
+RATE_LIMIT_BUDGETS = {
+    "me": (1.0, 5),
+    "profile": (3.0, 10),
+    "profile_note": (0.2, 3),
+    "avatar": (10.0, 30),
+    "insight": (2.0, 5),
+    "search_users": (5.0, 10),
+    "feedback": (0.5, 3),
+    "admin_export": (0.05, 1),
+}
+TELEGRAM_CONCURRENCY_LIMIT = 16
+RATE_LIMITER = RateLimiter(RATE_LIMIT_BUDGETS)
+TELEGRAM_GATE = ConcurrencyGate(TELEGRAM_CONCURRENCY_LIMIT)
+# Telegram slots the cache warmer leaves to requests.
+WARMUP_GATE_RESERVE = TELEGRAM_CONCURRENCY_LIMIT // 2
+
+
+def rate_limited(endpoint: str, calls_telegram: bool = False):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            user = get_webapp_user(request, BOT_TOKEN, INITDATA_MAX_AGE_SECONDS)
+            key = f"user:{user.get('id')}" if user else f"ip:{request.remote_addr}"
+            retry_after = RATE_LIMITER.acquire(endpoint, key)
+            if retry_after > 0:
+                resp = jsonify({"ok": False, "error": "Слишком много запросов, попробуй позже", "code": "rate_limited"})
+                resp.status_code = 429
+                resp.headers["Retry-After"] = retry_after_header(retry_after)
+                return resp
+            if not calls_telegram:
+                return view(*args, **kwargs)
+            if not TELEGRAM_GATE.try_enter():
+                resp = jsonify({"ok": False, "error": "service_overloaded"})
+                resp.status_code = 503
+                resp.headers["Retry-After"] = "1"
+                return resp
+            try:
+                return view(*args, **kwargs)
+            finally:
+                TELEGRAM_GATE.leave()
+
+        return wrapper
+
+    return decorator
+
+
+HTTP_IN_FLIGHT = InFlight()
+DB_CALLS_IN_FLIGHT = InFlight()
+PUSH_QUEUE = InFlight()
+
+
+def runtime_samples() -> list[tuple[tuple[str, ...], float]]:
+    return [
+        (("http_requests", "in_flight"), HTTP_IN_FLIGHT.value),
+        (("db_thread_pool", "in_flight"), DB_CALLS_IN_FLIGHT.value),
+        (("db_thread_pool", "capacity"), DB_THREAD_POOL_SIZE),
+        (("telegram_gate", "in_flight"), TELEGRAM_GATE.in_flight),
+        (("telegram_gate", "capacity"), TELEGRAM_GATE.limit),
+        (("push_queue", "depth"), PUSH_QUEUE.value),
+        (("user_sync", "pending"), get_user_syncer().pending_count()),
+        (("profile_views", "pending"), PROFILE_VIEWS.pending_count()),
+    ]
+
+
+def rejection_samples() -> list[tuple[tuple[str, ...], float]]:
+    return [
+        (("rate_limit",), RATE_LIMITER.rejected),
+        (("telegram_gate",), TELEGRAM_GATE.rejected),
+    ]
+
+
+REGISTRY.register(CallbackMetric("app_runtime", "Concurrency and queue levels.", ("component", "kind"), runtime_samples))
+REGISTRY.register(
+    CallbackMetric(
+        "http_rejected_total",
+        "Requests rejected by admission control.",
+        ("reason",),
+        rejection_samples,
+        metric_type="counter",
+    )
+)
+# Mini App payloads and Telegram bios; with CACHE_URL set, shared by every process.
+CACHE = create_cache(CACHE_URL)
+# Avatars are images: a small cache of their own so they don't evict everything else in-process.
+AVATAR_CACHE = create_cache(CACHE_URL, AVATAR_CACHE_SIZE)
+# Mini App payloads: served from cache while fresh, and (marked stale) while the database circuit breaker is open.
+PAYLOADS = PayloadCache(CACHE, db.database_available, db.failures_in_context, PAYLOAD_CACHE_SECONDS)
+
+
+def invalidate_written(keys: tuple) -> None:
+    """Drop cached payloads showing data that a committed write changed: targets and user ids."""
+    cache_keys = []
+    for key in keys:
+        if isinstance(key, str):
+            target = f"@{key.lstrip('@').lower()}"
+            cache_keys += [f"profile:{target}:0", f"profile:{target}:1", f"insight:{target}"]
+        else:
+            cache_keys.append(f"me:{key}")
+    PAYLOADS.invalidate(*cache_keys)
+
+
+def db_breaker_samples() -> list[tuple[tuple[str, ...], float]]:
+    return [
+        (("open",), 1.0 if db.DB_BREAKER.state != "closed" else 0.0),
+        (("trips",), db.DB_BREAKER.trips),
+        (("rejected",), db.DB_BREAKER.rejected),
+    ]
+
+
+def db_unavailable_response() -> Response:
+    resp = jsonify({"ok": False, "error": "db_unavailable"})
+    resp.status_code = 503
+    resp.headers["Retry-After"] = str(int(db.BREAKER_RESET_SECONDS))
+    return resp
+
+
+REGISTRY.register(CallbackMetric("db_circuit", "Database circuit breaker state and counters.", ("kind",), db_breaker_samples))
+REGISTRY.register(
+    CallbackMetric(
+        "profile_warmer_total",
+        "Popular targets the cache warmer rebuilt, skipped as still cached, deferred for Telegram capacity, or failed on.",
+        ("result",),
+        lambda: [
+            (("warmed",), PROFILE_WARMER.warmed),
+            (("skipped",), PROFILE_WARMER.skipped),
+            (("deferred",), PROFILE_WARMER.deferred),
+            (("failed",), PROFILE_WARMER.failed),
+        ],
+        metric_type="counter",
+    )
+)
+REGISTRY.register_cache("initdata", INIT_DATA_CACHE)
+REGISTRY.register_cache("payloads", PAYLOADS)
+REGISTRY.register_cache("cache_backend", CACHE)
+REGISTRY.register_cache("avatars", AVATAR_CACHE)
+db.add_call_observer(observe_db_call)
+db.add_query_observer(observe_db_query)
+db.add_write_observer(invalidate_written)
+
+
+@health_app.before_request
+def metrics_before_request() -> None:
+    g.request_started = time.perf_counter()
+    g.query_stats_token = db.start_query_stats()
+    HTTP_IN_FLIGHT.inc()
+
+
+@health_app.teardown_request
+def metrics_teardown_request(exc) -> None:
+    if "request_started" in g:
+        HTTP_IN_FLIGHT.dec()
+    token = g.pop("query_stats_token", None)
+    if token is not None:
+        db.stop_query_stats(token)
+
+
+@health_app.after_request
+def metrics_after_request(resp: Response) -> Response:
+    started = g.get("request_started")
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        HTTP_REQUESTS.inc(route, request.method, str(resp.status_code))
+        HTTP_LATENCY.observe(time.perf_counter() - started, route)
+    stats = db.get_query_stats()
+    if stats is not None:
+        resp.headers["X-DB-Queries"] = str(stats.count)
+        if stats.count > QUERIES_PER_REQUEST_WARN:
+            repeated = "; ".join(f"{fn} x{n}: {fp[:120]}" for fn, fp, n in stats.repeated()[:5])
+            logging.warning(
+                "%s %s ran %d queries (%.1fms), by function %s. Repeated: %s",
+                request.method,
+                request.path,
+                stats.count,
+                stats.seconds * 1000,
+                stats.by_function,
+                repeated or "none",
+            )
+    return resp
+
+
+@health_app.get("/metrics")
+def metrics():
+    if METRICS_TOKEN and request.headers.get("Authorization", "") != f"Bearer {METRICS_TOKEN}":
+        return Response(status=401)
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
 
 
 @health_app.get("/health")
@@ -63,6 +309,7 @@ def miniapp_index():
 
 
 @health_app.get("/api/miniapp/me")
+@rate_limited("me", calls_telegram=True)
 def api_miniapp_me():
     user = get_webapp_user(request, BOT_TOKEN, INITDATA_MAX_AGE_SECONDS)
     if not user:
@@ -72,19 +319,38 @@ def api_miniapp_me():
     if not username:
         return jsonify({"ok": False, "error": "Укажи @username в Telegram профиле"}), 400
 
+    user_id = int(user.get("id"))
+    # On every request, cached payload or not: the syncer skips unchanged users.
+    observe_app_user(user, username)
+    payload = PAYLOADS.serve(f"me:{user_id}", lambda: build_me_payload(user, username))
+    if payload is None:
+        return db_unavailable_response()
+    return jsonify({"ok": True, "data": payload})
+
+
+def observe_app_user(user: dict, username: str) -> None:
+    """Register the Mini App user through USER_SYNCER, which lives on the bot loop."""
+    row = (
+        int(user.get("id")),
+        f"@{username}",
+        str(user.get("first_name") or ""),
+        str(user.get("last_name") or ""),
+        str(user.get("photo_url") or ""),
+    )
+    if APP_LOOP is None:
+        is_new = db.upsert_user_with_flag(*row)
+        if is_new and APP_BOT:
+            queue_coroutine(notify_admin_new_user(APP_BOT, row[0], row[1], "miniapp"))
+        return
+    APP_LOOP.call_soon_threadsafe(get_user_syncer().observe, *row, "miniapp")
+
+
+def build_me_payload(user: dict, username: str) -> dict:
+    """Read-only: the user is registered by observe_app_user before the cache is consulted."""
     user_id = int(user.get("id"))
     first_name = str(user.get("first_name") or "")
     last_name = str(user.get("last_name") or "")
     init_photo_url = str(user.get("photo_url") or "")
-    is_new = db.upsert_user_with_flag(
-        user_id,
-        f"@{username}",
-        first_name,
-        last_name,
-        init_photo_url,
-    )
-    if is_new and APP_BOT:
-        queue_coroutine(notify_admin_new_user(APP_BOT, user_id, f"@{username}", "miniapp"))
     target = f"@{username}"
     payload = build_profile_payload(target)
     bot_username = get_bot_public_username()
@@ -108,17 +374,48 @@ def api_miniapp_me():
         "photo_url": init_photo_url,
         }
     payload["user"]["avatar_url"] = build_avatar_proxy_url(payload["user"]["username"])
-    note = db.get_profile_note(user_id)
-    if not note and APP_LOOP and APP_BOT:
-        try:
-            note = asyncio.run_coroutine_threadsafe(
-                fetch_user_bio_from_telegram(APP_BOT, user_id),
-                APP_LOOP,
-            ).result(timeout=4)
-        except Exception:
-            note = ""
-    payload["profile_note"] = note
-    return jsonify({"ok": True, "data": payload})
+    payload["profile_note"] = db.get_profile_note(user_id) or fetch_bio(user_id)
+    return payload
+
+
+def fetch_bio(user_id: int) -> str:
+    """Telegram bio through CACHE; empty results (no bio, or Telegram failed) are kept for less time."""
+    key = f"bio:{user_id}"
+    bio = CACHE.get(key)
+    if bio is not None:
+        return bio
+    if not APP_LOOP or not APP_BOT:
+        return ""
+    try:
+        bio = asyncio.run_coroutine_threadsafe(
+            fetch_user_bio_from_telegram(APP_BOT, user_id),
+            APP_LOOP,
+        ).result(timeout=4)
+    except Exception:
+        return ""
+    CACHE.set(key, bio, CHAT_INFO_TTL_SECONDS if bio else CHAT_INFO_MISS_TTL_SECONDS)
+    return bio
+
+
+def fetch_avatar(username: str) -> Optional[tuple[bytes, str]]:
+    """(content, content type) through AVATAR_CACHE, None when the user has no avatar. Raises if Telegram can't be asked."""
+    key = f"avatar:{username}"
+    cached = AVATAR_CACHE.get(key)
+    if cached is not None:
+        # [] marks a user without an avatar.
+        return (base64.b64decode(cached[0]), cached[1]) if cached else None
+    if APP_LOOP is None or APP_BOT is None:
+        raise RuntimeError("bot is not running")
+    result = asyncio.run_coroutine_threadsafe(
+        fetch_avatar_from_telegram(APP_BOT, username),
+        APP_LOOP,
+    ).result(timeout=8)
+    if result:
+        content, content_type = result
+        AVATAR_CACHE.set(key, [base64.b64encode(content).decode("ascii"), content_type], CHAT_INFO_TTL_SECONDS)
+    else:
+        AVATAR_CACHE.set(key, [], CHAT_INFO_MISS_TTL_SECONDS)
+    return result
 
 
 @health_app.get("/api/miniapp/preview")
@@ -164,6 +461,7 @@ def api_miniapp_preview():
 
 
 @health_app.get("/api/miniapp/profile")
+@rate_limited("profile", calls_telegram=True)
 def api_miniapp_profile():
     user = get_webapp_user(request, BOT_TOKEN, INITDATA_MAX_AGE_SECONDS)
     if not user:
@@ -174,6 +472,20 @@ def api_miniapp_profile():
     if not target:
         return jsonify({"ok": False, "error": "Нужен корректный @username"}), 400
 
+    if target.lstrip("@") != str(user.get("username") or "").lower():
+        PROFILE_VIEWS.record(target, int(user.get("id")))
+    # ?insight=1 embeds the insight card, saving the client a request to /api/miniapp/insight.
+    with_insight = request.args.get("insight") in {"1", "true"}
+    payload = PAYLOADS.serve(
+        f"profile:{target}:{int(with_insight)}",
+        lambda: build_miniapp_profile_payload(target, with_insight),
+    )
+    if payload is None:
+        return db_unavailable_response()
+    return jsonify({"ok": True, "data": payload})
+
+
+def build_miniapp_profile_payload(target: str, with_insight: bool) -> dict:
     user_payload = db.get_user_public_by_username(target)
     target_is_app_user = bool(user_payload and user_payload.get("app_user"))
     # If profile data isn't in DB yet, try resolving basic public user info from Telegram.
@@ -196,7 +508,10 @@ def api_miniapp_profile():
             )
             user_payload = db.get_user_public_by_username(target)
 
-    payload = build_profile_payload(target)
+    profile = evaluate_profile(target)
+    payload = profile.payload()
+    if with_insight:
+        payload["insight"] = profile.insight()
     bot_username = get_bot_public_username()
     payload["link"] = f"https://t.me/{bot_username}?start=ref_{target.lstrip('@')}"
     payload["invite_link"] = f"https://t.me/{bot_username}"
@@ -212,19 +527,42 @@ def api_miniapp_profile():
     payload["is_app_user"] = bool(payload["user"].get("app_user") or target_is_app_user)
     target_user_id = int(payload["user"].get("id") or 0)
     note = db.get_profile_note(target_user_id)
-    if not note and target_user_id and APP_LOOP and APP_BOT:
+    if not note and target_user_id:
+        note = fetch_bio(target_user_id)
+    payload["profile_note"] = note
+    return payload
+
+
+def warm_profile(raw_target: str) -> Optional[bool]:
+    """
+    Cache what viewers of a target ask for: the profile with and without the insight card, the insight
+    and the avatar. Runs only with spare Telegram capacity (None when there is none, see ProfileWarmer).
+    """
+    target = normalize_username(raw_target)
+    if not target:
+        return False
+
+    def build() -> dict[str, dict]:
+        payload = build_miniapp_profile_payload(target, True)
+        plain = {key: value for key, value in payload.items() if key != "insight"}
+        return {f"profile:{target}:1": payload, f"profile:{target}:0": plain, f"insight:{target}": payload["insight"]}
+
+    if not TELEGRAM_GATE.try_enter(reserve=WARMUP_GATE_RESERVE):
+        return None
+    try:
+        if not PAYLOADS.prefill(f"profile:{target}:1", build):
+            return False
         try:
-            note = asyncio.run_coroutine_threadsafe(
-                fetch_user_bio_from_telegram(APP_BOT, target_user_id),
-                APP_LOOP,
-            ).result(timeout=4)
+            fetch_avatar(target.lstrip("@"))
         except Exception:
-            note = ""
-    payload["profile_note"] = note
-    return jsonify({"ok": True, "data": payload})
+            pass
+        return True
+    finally:
+        TELEGRAM_GATE.leave()
 
 
 @health_app.post("/api/miniapp/profile-note")
+@rate_limited("profile_note")
 def api_miniapp_profile_note():
     user = get_webapp_user(request, BOT_TOKEN, INITDATA_MAX_AGE_SECONDS)
     if not user:
@@ -242,21 +580,22 @@ def api_miniapp_profile_note():
     ):
         return jsonify({"ok": False, "error": "Ссылки в описании запрещены"}), 400
     db.set_profile_note(int(user.get("id")), note)
+    if user.get("username"):
+        # The note shows on the public profile too, not only on the owner's /me.
+        invalidate_written((str(user["username"]),))
     return jsonify({"ok": True, "note": note})
 
 
 @health_app.get("/api/miniapp/avatar")
+@rate_limited("avatar", calls_telegram=True)
 def api_miniapp_avatar():
     username = str(request.args.get("username") or "").strip().lstrip("@").lower()
     if not username:
         return Response(status=400)
-    if APP_LOOP is None or APP_BOT is None:
-        return Response(status=503)
     try:
-        result = asyncio.run_coroutine_threadsafe(
-            fetch_avatar_from_telegram(APP_BOT, username),
-            APP_LOOP,
-        ).result(timeout=8)
+        result = fetch_avatar(username)
+    except RuntimeError:
+        return Response(status=503)
     except Exception:
         return Response(status=504)
     if not result:
@@ -268,6 +607,7 @@ def api_miniapp_avatar():
 
 
 @health_app.get("/api/miniapp/insight")
+@rate_limited("insight")
 def api_miniapp_insight():
     user = get_webapp_user(request, BOT_TOKEN, INITDATA_MAX_AGE_SECONDS)
     if not user:
@@ -278,10 +618,10 @@ def api_miniapp_insight():
     if not target:
         return jsonify({"ok": False, "error": "Нужен корректный @username"}), 400
 
-    insight_text = build_contact_insight_text(target)
-    if not insight_text:
-        return jsonify({"ok": True, "enough": False})
-    return jsonify({"ok": True, "enough": True, "text": insight_text})
+    insight = PAYLOADS.serve(f"insight:{target}", lambda: evaluate_profile(target).insight())
+    if insight is None:
+        return db_unavailable_response()
+    return jsonify({"ok": True, **insight})
 
 
 @health_app.get("/api/miniapp/preview-insight")
@@ -299,6 +639,7 @@ def api_miniapp_preview_insight():
 
 
 @health_app.get("/api/miniapp/search-users")
+@rate_limited("search_users")
 def api_miniapp_search_users():
     user = get_webapp_user(request, BOT_TOKEN, INITDATA_MAX_AGE_SECONDS)
     if not user:
@@ -308,6 +649,42 @@ def api_miniapp_search_users():
     return jsonify({"ok": True, "items": items})
 
 
+@health_app.get("/api/admin/users.csv")
+@rate_limited("admin_export")
+def api_admin_users_export():
+    user = get_webapp_user(request, BOT_TOKEN, INITDATA_MAX_AGE_SECONDS)
+    if not user:
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    if str(user.get("username") or "").lower() != ADMIN_USERNAME:
+        return jsonify({"ok": False, "error": "forbidden"}), 403
+
+    def generate():
+        yield "user_id,username,first_name,last_name,app_user,updated_at\n"
+        cursor = None
+        while True:
+            items, cursor = db.list_users_page(USERS_EXPORT_PAGE_SIZE, cursor)
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            for item in items:
+                writer.writerow(
+                    [
+                        item["id"],
+                        item["username"],
+                        item["first_name"],
+                        item["last_name"],
+                        int(item["app_user"]),
+                        item["updated_at"],
+                    ]
+                )
+            yield buf.getvalue()
+            if cursor is None:
+                break
+
+    resp = Response(stream_with_context(generate()), mimetype="text/csv")
+    resp.headers["Content-Disposition"] = "attachment; filename=users.csv"
+    return resp
+
+
 @health_app.get("/api/miniapp/preview-users")
 def api_miniapp_preview_users():
     return jsonify(
@@ -325,6 +702,7 @@ def api_miniapp_preview_users():
 
 
 @health_app.post("/api/miniapp/feedback")
+@rate_limited("feedback", calls_telegram=True)
 def api_miniapp_feedback():
     user = get_webapp_user(request, BOT_TOKEN, INITDATA_MAX_AGE_SECONDS)
     if not user:
@@ -346,18 +724,7 @@ def api_miniapp_feedback():
     if not allowed:
         return jsonify({"ok": False, "error": reason}), 400
 
-    tone = normalize_feedback_value(str(data.get("tone") or ""), {"easy", "serious"}, "serious")
-    speed = normalize_feedback_value(str(data.get("speed") or ""), {"fast", "slow"}, "slow")
-    contact_format = normalize_feedback_value(str(data.get("contact_format") or ""), {"text", "live"}, "text")
-    initiative = normalize_feedback_value(str(data.get("initiative") or ""), {"self", "wait"}, "wait")
-    start_context = normalize_feedback_value(str(data.get("start_context") or ""), {"topic", "direct"}, "topic")
-    attention_reaction = normalize_feedback_value(str(data.get("attention_reaction") or ""), {"likes", "careful"}, "careful")
-    caution = normalize_feedback_value(str(data.get("caution") or ""), {"true", "false"}, "false")
-    frequency = normalize_feedback_value(str(data.get("frequency") or ""), {"often", "rare"}, "rare")
-    comm_format = normalize_feedback_value(str(data.get("comm_format") or ""), {"informal", "reserved"}, "reserved")
-    emotion_tone = normalize_feedback_value(str(data.get("emotion_tone") or ""), {"warm", "neutral"}, "neutral")
-    feedback_style = normalize_feedback_value(str(data.get("feedback_style") or ""), {"direct", "soft"}, "soft")
-    uncertainty = normalize_feedback_value(str(data.get("uncertainty") or ""), {"low", "high"}, "high")
+    answers = normalize_answers(data)
     voter_id = int(user.get("id"))
     username = str(user.get("username") or "").strip().lower()
     if username:
@@ -372,23 +739,7 @@ def api_miniapp_feedback():
             queue_coroutine(notify_admin_new_user(APP_BOT, voter_id, f"@{username}", "miniapp"))
 
     future = asyncio.run_coroutine_threadsafe(
-        get_push_manager().process_feedback_submission(
-            APP_BOT,
-            target,
-            voter_id,
-            tone,
-            speed,
-            contact_format,
-            initiative,
-            start_context,
-            attention_reaction,
-            caution,
-            frequency,
-            comm_format,
-            emotion_tone,
-            feedback_style,
-            uncertainty,
-        ),
+        get_push_manager().process_feedback_submission(APP_BOT, target, voter_id, answers),
         APP_LOOP,
     )
     try:
@@ -424,44 +775,26 @@ async def notify_admin_new_user(bot: Bot, user_id: int, username: str, source: s
         pass
 
 
-async def upsert_user_and_maybe_notify(
-    bot: Bot,
-    user_id: int,
-    username: str,
-    first_name: str = "",
-    last_name: str = "",
-    photo_url: str = "",
-    source: str = "bot",
-) -> None:
-    is_new = await db_call(
-        db.upsert_user_with_flag,
-        user_id,
-        username,
-        first_name,
-        last_name,
-        photo_url,
-    )
-    if is_new:
-        await notify_admin_new_user(bot, user_id, username, source)
+async def notify_admin_synced_user(user_id: int, username: str, source: str) -> None:
+    if APP_BOT:
+        await notify_admin_new_user(APP_BOT, user_id, username, source)
 
 
 def register_user(message: types.Message) -> None:
-    if message.from_user and message.from_user.id and message.from_user.username and message.bot:
-        asyncio.create_task(
-            upsert_user_and_maybe_notify(
-                message.bot,
-                message.from_user.id,
-                f"@{message.from_user.username.lower()}",
-                str(message.from_user.first_name or ""),
-                str(message.from_user.last_name or ""),
-                "",
-                "bot",
-            )
+    if message.from_user and message.from_user.id and message.from_user.username:
+        get_user_syncer().observe(
+            message.from_user.id,
+            f"@{message.from_user.username.lower()}",
+            str(message.from_user.first_name or ""),
+            str(message.from_user.last_name or ""),
+            "",
+            "bot",
         )
 
 
 async def db_call(func, *args):
-    return await asyncio.to_thread(func, *args)
+    with DB_CALLS_IN_FLIGHT:
+        return await asyncio.to_thread(func, *args)
 
 
 async def get_bot_username(bot: Bot) -> str:
@@ -477,13 +810,19 @@ def get_bot_public_username() -> str:
     return BOT_USERNAME_CACHE or BOT_PUBLIC_USERNAME
 
 
+async def _tracked_push(coro) -> None:
+    with PUSH_QUEUE:
+        await coro
+
+
 def queue_coroutine(coro) -> None:
     if APP_LOOP is None:
+        coro.close()
         return
     try:
-        asyncio.run_coroutine_threadsafe(coro, APP_LOOP)
+        asyncio.run_coroutine_threadsafe(_tracked_push(coro), APP_LOOP)
     except Exception:
-        pass
+        coro.close()
 
 
 PUSH_MANAGER: Optional[PushManager] = None
@@ -495,12 +834,103 @@ def get_push_manager() -> PushManager:
         PUSH_MANAGER = PushManager(
             db_call=db_call,
             queue_coroutine=queue_coroutine,
-            build_profile_payload=build_profile_payload,
             admin_username=ADMIN_USERNAME,
             push_timeout_seconds=PUSH_TIMEOUT_SECONDS,
         )
     return PUSH_MANAGER
 
+
+USER_SYNCER: Optional[UserSyncer] = None
+
+
+def get_user_syncer() -> UserSyncer:
+    global USER_SYNCER
+    if USER_SYNCER is None:
+        USER_SYNCER = UserSyncer(
+            db_call=db_call,
+            on_new_user=notify_admin_synced_user,
+            ttl_seconds=USER_SYNC_TTL_SECONDS,
+        )
+    return USER_SYNCER
+
+
+RELINK_WORKER = BatchWorker(
+    "relink",
+    db_call=db_call,
+    step=lambda: db.process_relink_batch(RELINK_BATCH_SIZE),
+)
+BACKFILL_WORKERS = [
+    BatchWorker(
+        f"backfill_{table}",
+        db_call=db_call,
+        step=lambda table=table: db.backfill_target_user_ids_batch(table, BACKFILL_BATCH_SIZE),
+        until_done=True,
+    )
+    for table in db.BACKFILL_TABLES
+]
+ANSWERS_MASK_WORKER = BatchWorker(
+    "answers_mask",
+    db_call=db_call,
+    step=lambda: db.backfill_answers_mask_batch(BACKFILL_BATCH_SIZE),
+    until_done=True,
+)
+REF_ANSWERERS_WORKER = BatchWorker(
+    "ref_answerers",
+    db_call=db_call,
+    step=lambda: db.backfill_ref_answerers_batch(BACKFILL_BATCH_SIZE),
+    until_done=True,
+)
+# Answered flags only ever get set as votes arrive; a periodic pass recounts them from votes.
+REF_ANSWERERS_RECOUNT_WORKER = BatchWorker(
+    "ref_answerers_recount",
+    db_call=db_call,
+    step=lambda: db.recount_ref_answerers_batch(BACKFILL_BATCH_SIZE),
+    idle_seconds=REF_ANSWERERS_RECOUNT_SECONDS,
+)
+PARTITIONS_WORKER = BatchWorker(
+    "partitions",
+    db_call=db_call,
+    step=db.maintain_partitions,
+    idle_seconds=3600,
+)
+# Views are counted in memory and written to profile_views in one batch per VIEWS_FLUSH_SECONDS,
+# or sooner once enough targets are pending; the worker checks every VIEWS_POLL_SECONDS.
+PROFILE_VIEWS = ProfileViews(db.add_profile_views, interval_seconds=VIEWS_FLUSH_SECONDS)
+VIEWS_WORKER = BatchWorker(
+    "profile_views",
+    db_call=db_call,
+    step=PROFILE_VIEWS.flush,
+    batch_pause_seconds=VIEWS_POLL_SECONDS,
+    idle_seconds=VIEWS_POLL_SECONDS,
+)
+
+
+def popular_targets(limit: int) -> list[tuple[str, float]]:
+    """Most active targets: recent votes and ref visits (db) plus views in recent flushes (this process)."""
+    scores: Counter = Counter(dict(db.popular_targets(limit)))
+    for target, views in PROFILE_VIEWS.top(limit):
+        scores[target] += views
+    return scores.most_common(limit)
+
+
+PROFILE_WARMER = ProfileWarmer(popular_targets, warm_profile, WARMUP_TARGETS)
+WARMUP_WORKER = BatchWorker(
+    "warmup",
+    db_call=db_call,
+    step=PROFILE_WARMER.step,
+    batch_pause_seconds=1 / WARMUP_PER_SECOND,
+    idle_seconds=WARMUP_PAUSE_SECONDS,
+)
+ADMIN_STATS = AdminStatsSnapshot(db_call, ADMIN_STATS_REFRESH_SECONDS)
+RECOMPUTE_LOCK = asyncio.Lock()
+NORMALIZE_WORKER = BatchWorker(
+    "normalize_case",
+    db_call=db_call,
+    step=lambda: db.normalize_case_batch(NORMALIZE_BATCH_SIZE),
+    until_done=True,
+)
+
+
 @router.message(CommandStart())
 async def cmd_start(message: types.Message, command: CommandObject):
     register_user(message)
@@ -546,15 +976,20 @@ async def cmd_admin_stats(message: types.Message):
     if username != ADMIN_USERNAME:
         return
 
-    users_total = await db_call(db.count_users)
-    votes_total = await db_call(db.count_votes)
-    top_voters = await db_call(db.top_voters, 10)
-    top_targets = await db_call(db.top_targets, 10)
+    snapshot = await ADMIN_STATS.get()
+    users_total = snapshot.get("users_total", 0)
+    votes_total = snapshot.get("votes_total", 0)
+    top_voters = snapshot.get("top_voters") or []
+    top_targets = snapshot.get("top_targets") or []
+    relink = await db_call(db.get_relink_progress)
 
     lines = [
         "Админ статистика:",
         f"Пользователей (/start): {users_total}",
         f"Всего оценок: {votes_total}",
+        f"Очередь перепривязки: {relink['pending']} (привязано {relink['votes_linked'] + relink['refs_linked']})",
+        f"Перепривязано: {relink['done']} (строк {relink['done_votes_linked'] + relink['done_refs_linked']})",
+        f"Посчитано: {format_computed_at(snapshot)}",
         "",
         "Топ 10 кто больше всех оставил оценок:",
     ]
@@ -576,6 +1011,11 @@ async def cmd_admin_stats(message: types.Message):
     await message.answer("\n".join(lines))
 
 
+def format_users_page(items: list[dict], is_first_page: bool) -> str:
+    title = "Пользователи (последние):" if is_first_page else "Пользователи (дальше):"
+    return title + "\n" + "\n".join(item["username"] for item in items)
+
+
 @router.message(Command("users"))
 async def cmd_users(message: types.Message):
     register_user(message)
@@ -583,24 +1023,88 @@ async def cmd_users(message: types.Message):
     if username != ADMIN_USERNAME:
         return
 
-    users = await db_call(db.list_users, 100)
-    if not users:
+    items, next_cursor = await db_call(db.list_users_page, USERS_PAGE_SIZE, None)
+    if not items:
         await message.answer("Список пуст.")
         return
 
-    text = "Пользователи (последние 100):\n" + "\n".join(users)
-    await message.answer(text)
+    await message.answer(
+        format_users_page(items, True),
+        reply_markup=build_users_page_kb(next_cursor, True),
+    )
+
+
+@router.callback_query(F.data.startswith(USERS_PAGE_CALLBACK_PREFIX))
+async def on_users_page(callback: types.CallbackQuery):
+    username = (callback.from_user.username or "").lower() if callback.from_user else ""
+    if username != ADMIN_USERNAME:
+        await callback.answer()
+        return
+    cursor = decode_users_cursor(callback.data or "")
+    items, next_cursor = await db_call(db.list_users_page, USERS_PAGE_SIZE, cursor)
+    await callback.answer()
+    if not items or not isinstance(callback.message, types.Message):
+        return
+    is_first_page = cursor is None
+    try:
+        await callback.message.edit_text(
+            format_users_page(items, is_first_page),
+            reply_markup=build_users_page_kb(next_cursor, is_first_page),
+        )
+    except Exception:
+        pass
 
 
 @router.message(Command("normalize_case"))
-async def cmd_normalize_case(message: types.Message):
+async def cmd_normalize_case(message: types.Message, command: CommandObject):
+    register_user(message)
+    username = (message.from_user.username or "").lower() if message.from_user else ""
+    if username != ADMIN_USERNAME:
+        return
+    action = (command.args or "").strip().lower()
+    if action == "cancel":
+        stopped = NORMALIZE_WORKER.cancel()
+        await message.answer("Нормализация остановится после текущей пачки." if stopped else "Нормализация не запущена.")
+        return
+    if action == "restart":
+        NORMALIZE_WORKER.cancel()
+        await db_call(db.reset_job_state, db.NORMALIZE_JOB)
+    state = await db_call(db.get_job_state, db.NORMALIZE_JOB)
+    if state["done"]:
+        await message.answer(
+            f"Нормализация уже выполнена.\nИзменено строк: {state['rows']}\n"
+            "Запустить заново: /normalize_case restart",
+        )
+        return
+    started = NORMALIZE_WORKER.start()
+    phase = state["cursor"].partition(":")[0] or db.NORMALIZE_PHASES[0]
+    await message.answer(
+        ("Нормализация запущена в фоне." if started else "Нормализация уже идёт.")
+        + f"\nЭтап: {phase}\nИзменено строк: {state['rows']}\n"
+        "Прогресс: /normalize_case, остановить: /normalize_case cancel",
+    )
+
+
+@router.message(Command("recompute_profiles"))
+async def cmd_recompute_profiles(message: types.Message):
     register_user(message)
     username = (message.from_user.username or "").lower() if message.from_user else ""
     if username != ADMIN_USERNAME:
         return
-    merged, lowercased = await db_call(db.normalize_case_data)
+    if RECOMPUTE_LOCK.locked():
+        await message.answer("Пересчёт уже идёт.")
+        return
+    async with RECOMPUTE_LOCK:
+        await message.answer("Пересчёт профилей запущен.")
+        try:
+            result = await db_call(recompute_profiles)
+        except RuntimeError as exc:
+            await message.answer(f"Пересчёт недоступен: {exc}")
+            return
     await message.answer(
-        f"Нормализация выполнена.\nСхлопнуто дублей users: {merged}\nПриведено к lower-case: {lowercased}",
+        f"Пересчитано профилей: {result['profiles']} (с рекомендацией: {result['enough']})\n"
+        f"Оценок: {result['votes']}\n"
+        f"Время: {result['total_seconds']} с"
     )
 
 
@@ -620,19 +1124,45 @@ async def main():
     global APP_BOT, APP_LOOP
     # Run minimal HTTP server for platform health checks.
     loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=DB_THREAD_POOL_SIZE))
     APP_LOOP = loop
     loop.run_in_executor(
-        None,
+        ThreadPoolExecutor(max_workers=1, thread_name_prefix="http"),
         lambda: health_app.run(host="0.0.0.0", port=PORT, debug=False, use_reloader=False),
     )
     db.init_db()
-    db.normalize_case_data()
-    bot = Bot(BOT_TOKEN)
+    if TELEGRAM_API_URL:
+        bot = Bot(BOT_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)))
+    else:
+        bot = Bot(BOT_TOKEN)
+    bot.session.middleware(TelegramMetricsMiddleware())
     APP_BOT = bot
+    asyncio.create_task(get_user_syncer().run())
+    RELINK_WORKER.start()
+    for worker in BACKFILL_WORKERS:
+        worker.start()
+    ANSWERS_MASK_WORKER.start()
+    REF_ANSWERERS_WORKER.start()
+    REF_ANSWERERS_RECOUNT_WORKER.start()
+    NORMALIZE_WORKER.start()
+    VIEWS_WORKER.start()
+    if db.USE_POSTGRES:
+        PARTITIONS_WORKER.start()
+    asyncio.create_task(ADMIN_STATS.run())
     await get_bot_username(bot)
+    if WARMUP_TARGETS > 0:
+        # After the bot username is known: warmed payloads carry t.me links.
+        WARMUP_WORKER.start()
     dp = Dispatcher()
     dp.include_router(router)
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        # Users and views recorded since the last flush.
+        syncer = get_user_syncer()
+        while await syncer.flush() >= syncer.batch_size:
+            pass
+        await db_call(PROFILE_VIEWS.flush, True)
 
 
 if __name__ == "__main__":